@@ -0,0 +1,374 @@
+"""
+Local stand-in for api.music.apple.com serving a synthetic library.
+
+Run on its own with `python -m bench.mock_api --port 8080`, or start it in-process with MockAppleMusicAPI.
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+PLAYLISTS_PATH = "/v1/me/library/playlists"
+LIBRARY_SONGS_PATH = "/v1/me/library/songs"
+STOREFRONT_PATH = "/v1/me/storefront"
+LARGE_PLAYLIST_ID = "p.large"
+PLAYLIST_PAGE_LIMIT = (25, 100)  # (default, maximum) page size of the playlist listing
+TRACK_PAGE_LIMIT = (100, 100)  # (default, maximum) page size of a playlist's tracks
+LIBRARY_SONG_PAGE_LIMIT = (25, 100)  # (default, maximum) page size of the library songs
+GENRES = ("Rock", "Pop", "Jazz", "Hip-Hop/Rap", "Electronic", "Classical", "Country")
+
+_PLAYLIST_RE = re.compile(r"^/v1/me/library/playlists/([^/]+)$")
+_TRACKS_RE = re.compile(r"^/v1/me/library/playlists/([^/]+)/tracks$")
+_CATALOG_SONGS_RE = re.compile(r"^/v1/catalog/([a-z]{2})/songs$")
+CATALOG_ID_OFFSET = 1_000_000_000
+CATALOG_BATCH_LIMIT = 300
+
+
+class SyntheticLibrary:
+    """
+    Deterministic library of `playlists` playlists with `tracks` tracks each, plus one playlist (LARGE_PLAYLIST_ID)
+    with `large_tracks` tracks. Every playlist starts with the same songs, so the library songs are the largest
+    playlist's. Resources are generated on demand, so large libraries cost no memory up front.
+    """
+
+    def __init__(
+        self, playlists: int = 200, tracks: int = 50, large_tracks: int = 10000
+    ) -> None:
+        self.playlists = playlists
+        self.tracks = tracks
+        self.large_tracks = large_tracks
+
+    @property
+    def playlist_count(self) -> int:
+        return self.playlists + 1
+
+    @property
+    def song_count(self) -> int:
+        return max(self.tracks if self.playlists else 0, self.large_tracks)
+
+    def playlist_id(self, index: int) -> str:
+        return LARGE_PLAYLIST_ID if index == self.playlists else f"p.{index:06d}"
+
+    def playlist(self, index: int) -> Dict[str, Any]:
+        return {
+            "id": self.playlist_id(index),
+            "type": "library-playlists",
+            "attributes": {
+                "name": f"Playlist {index}",
+                "dateAdded": "2024-01-{:02d}T12:00:00Z".format(index % 28 + 1),
+                "lastModifiedDate": "2026-01-01T00:00:00Z",
+                "canEdit": True,
+            },
+        }
+
+    def track_count(self, playlist_id: str) -> int | None:
+        if playlist_id == LARGE_PLAYLIST_ID:
+            return self.large_tracks
+        if (
+            re.fullmatch(r"p\.\d{6}", playlist_id)
+            and int(playlist_id[2:]) < self.playlists
+        ):
+            return self.tracks
+        return None
+
+    @staticmethod
+    def track(index: int) -> Dict[str, Any]:
+        return {
+            "id": f"i.{index:08d}",
+            "type": "library-songs",
+            "attributes": {
+                "name": f"Song {index}",
+                "artistName": f"Artist {index % 997}",
+                "albumName": f"Album {index % 4999}",
+                "genreNames": [GENRES[index % len(GENRES)], "Music"],
+                "releaseDate": "{}-{:02d}-{:02d}".format(
+                    1960 + index % 66, index % 12 + 1, index % 28 + 1
+                ),
+                "durationInMillis": 180000 + index % 120000,
+                "trackNumber": index % 20 + 1,
+                "hasLyrics": index % 3 == 0,
+                "artwork": {
+                    "width": 1200,
+                    "height": 1200,
+                    "url": f"https://is1-ssl.mzstatic.com/image/thumb/Music/{index % 4999:04d}/{{w}}x{{h}}bb.jpg",
+                },
+                "playParams": {
+                    "id": f"i.{index:08d}",
+                    "kind": "song",
+                    "isLibrary": True,
+                    "catalogId": str(CATALOG_ID_OFFSET + index),
+                },
+            },
+        }
+
+    @staticmethod
+    def catalog_song(catalog_id: str) -> Dict[str, Any] | None:
+        """
+        The catalog song behind a synthetic track; track i has catalog ID CATALOG_ID_OFFSET + i.
+        """
+        if not catalog_id.isdigit() or int(catalog_id) < CATALOG_ID_OFFSET:
+            return None
+        index = int(catalog_id) - CATALOG_ID_OFFSET
+        return {
+            "id": catalog_id,
+            "type": "songs",
+            "attributes": {
+                "name": f"Song {index}",
+                "isrc": f"USBEN{index:07d}",
+                "durationInMillis": 180000 + index % 120000,
+                "composerName": f"Composer {index % 389}",
+            },
+        }
+
+
+class MockAppleMusicAPI:
+    """
+    Threaded HTTP server answering the library playlists, library songs, storefront and catalog songs endpoints the
+    CLI uses. Pages honour `offset`, `limit` and `fields[library-songs]`, carry a `next` cursor and `meta.total`, and
+    every `throttle_every`-th request is answered with a 429. Playlists requested with `include=tracks` carry the
+    first page of their tracks under `relationships`.
+    """
+
+    def __init__(
+        self,
+        library: SyntheticLibrary,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        throttle_every: int = 0,
+    ) -> None:
+        """
+        :param library: Library to serve.
+        :param port: Port to listen on; 0 picks a free one.
+        :param latency: Seconds each response is delayed by, to simulate the network.
+        :param throttle_every: Answer every n-th request with 429 Too Many Requests; 0 disables throttling.
+        """
+        self.library = library
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.requests = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockAppleMusicAPI":
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, args=(0.05,), daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "MockAppleMusicAPI":
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+    def _should_throttle(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            throttle = (
+                bool(self.throttle_every) and self.requests % self.throttle_every == 0
+            )
+            if throttle:
+                self.throttled += 1
+            return throttle
+
+    def respond(self, target: str) -> Tuple[int, Dict[str, Any], Dict[str, str]]:
+        """
+        Build the (status, body, headers) answer for a request target.
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        if self._should_throttle():
+            return 429, {"errors": [{"status": "429"}]}, {"Retry-After": "0"}
+
+        url = urlparse(target)
+        query = parse_qs(url.query)
+        if url.path == PLAYLISTS_PATH:
+            offset, limit = _page(query, PLAYLIST_PAGE_LIMIT)
+            total = self.library.playlist_count
+            data = [
+                self._playlist(i, query)
+                for i in range(offset, min(offset + limit, total))
+            ]
+            return 200, page_body(url.path, data, offset, limit, total), {}
+
+        if url.path == LIBRARY_SONGS_PATH:
+            offset, limit = _page(query, LIBRARY_SONG_PAGE_LIMIT)
+            total = self.library.song_count
+            data = [
+                self.library.track(i) for i in range(offset, min(offset + limit, total))
+            ]
+            if "fields[library-songs]" in query:
+                data = sparse_fieldset(
+                    data, query["fields[library-songs]"][0].split(",")
+                )
+            return 200, page_body(url.path, data, offset, limit, total), {}
+
+        if url.path == STOREFRONT_PATH:
+            return 200, {"data": [{"id": "us", "type": "storefronts"}]}, {}
+
+        match = _CATALOG_SONGS_RE.match(url.path)
+        if match:
+            ids = [i for i in query.get("ids", [""])[0].split(",") if i]
+            if not ids or len(ids) > CATALOG_BATCH_LIMIT:
+                return 400, {"errors": [{"status": "400"}]}, {}
+            songs = [self.library.catalog_song(i) for i in ids]
+            return 200, {"data": [song for song in songs if song is not None]}, {}
+
+        match = _TRACKS_RE.match(url.path)
+        if match:
+            body = self._tracks(match.group(1), query)
+            if body is None:
+                return 404, {"errors": [{"status": "404"}]}, {}
+            return 200, body, {}
+
+        match = _PLAYLIST_RE.match(url.path)
+        if match:
+            playlist_id = match.group(1)
+            if self.library.track_count(playlist_id) is None:
+                return 404, {"errors": [{"status": "404"}]}, {}
+            index = (
+                self.library.playlists
+                if playlist_id == LARGE_PLAYLIST_ID
+                else int(playlist_id[2:])
+            )
+            return 200, {"data": [self._playlist(index, query)]}, {}
+
+        return 404, {"errors": [{"status": "404"}]}, {}
+
+    def _playlist(self, index: int, query: Dict[str, List[str]]) -> Dict[str, Any]:
+        playlist = self.library.playlist(index)
+        if "tracks" in query.get("include", [""])[0].split(","):
+            # Included relationships start at the first page, whatever the offset of the request.
+            first_page = {
+                k: v for k, v in query.items() if k not in ("offset", "limit")
+            }
+            playlist["relationships"] = {
+                "tracks": self._tracks(playlist["id"], first_page)
+            }
+        return playlist
+
+    def _tracks(
+        self, playlist_id: str, query: Dict[str, List[str]]
+    ) -> Dict[str, Any] | None:
+        total = self.library.track_count(playlist_id)
+        if total is None:
+            return None
+        offset, limit = _page(query, TRACK_PAGE_LIMIT)
+        data = [
+            self.library.track(i) for i in range(offset, min(offset + limit, total))
+        ]
+        if "fields[library-songs]" in query:
+            data = sparse_fieldset(data, query["fields[library-songs]"][0].split(","))
+        path = f"{PLAYLISTS_PATH}/{playlist_id}/tracks"
+        return page_body(path, data, offset, limit, total)
+
+
+def _page(query: Dict[str, List[str]], limits: Tuple[int, int]) -> Tuple[int, int]:
+    default, maximum = limits
+    offset = max(0, int(query.get("offset", ["0"])[0]))
+    limit = min(maximum, max(1, int(query.get("limit", [str(default)])[0])))
+    return offset, limit
+
+
+def sparse_fieldset(
+    resources: List[Dict[str, Any]], fields: List[str]
+) -> List[Dict[str, Any]]:
+    """
+    Apply a sparse fieldset: keep only the listed attributes of each resource.
+    """
+    for resource in resources:
+        attributes = resource["attributes"]
+        resource["attributes"] = {
+            field: attributes[field] for field in fields if field in attributes
+        }
+    return resources
+
+
+def page_body(
+    path: str, data: List[Dict[str, Any]], offset: int, limit: int, total: int
+) -> Dict[str, Any]:
+    """
+    Wrap one offset window of resources in a paginated response, with the total and the next page's cursor.
+    """
+    body: Dict[str, Any] = {"data": data, "meta": {"total": total}}
+    if offset + limit < total:
+        body["next"] = f"{path}?offset={offset + limit}"
+    return body
+
+
+def _make_handler(api: MockAppleMusicAPI) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+        # Headers and body are written separately; without TCP_NODELAY every response would stall on delayed ACKs.
+        disable_nagle_algorithm = True
+
+        def do_GET(self) -> None:
+            status, body, headers = api.respond(self.path)
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Serve a synthetic Apple Music library."
+    )
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--playlists", type=int, default=200)
+    parser.add_argument("--tracks", type=int, default=50)
+    parser.add_argument("--large-tracks", type=int, default=10000)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds per response"
+    )
+    parser.add_argument("--throttle-every", type=int, default=0)
+    args = parser.parse_args()
+
+    library = SyntheticLibrary(args.playlists, args.tracks, args.large_tracks)
+    api = MockAppleMusicAPI(
+        library,
+        port=args.port,
+        latency=args.latency,
+        throttle_every=args.throttle_every,
+    )
+    print(f"Serving a synthetic library on {api.url} (Ctrl+C to stop).")
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
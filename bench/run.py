@@ -0,0 +1,554 @@
+"""
+Benchmarks for the playlist listing, playlist pagination, catalog enrichment, export-all (on threads and on the asyncio
+pipeline), library-export, batch and file writers against a local mock API, and a microbenchmark of each JSON decoding
+backend.
+
+    python -m bench.run                   # run, write bench/results.json and compare with bench/baseline.json
+    python -m bench.run --save-baseline   # run and record the results as the new baseline
+
+Every scenario runs in its own interpreter so that its peak RSS is not inflated by the scenarios before it.
+"""
+
+import argparse
+import importlib.util
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from bench.mock_api import (
+    LARGE_PLAYLIST_ID,
+    MockAppleMusicAPI,
+    SyntheticLibrary,
+    page_body,
+    sparse_fieldset,
+)
+
+BENCH_DIR = Path(__file__).parent
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+DEFAULT_RESULTS = BENCH_DIR / "results.json"
+SCENARIOS = (
+    "get_all_playlists",
+    "get_songs_in_playlist",
+    "get_songs_in_playlist_concurrent",
+    "export_enriched",
+    "export_all",
+    "export_all_async",
+    "export_library",
+    "export_accounts",
+    "decode_songs_json",
+    "decode_songs_orjson",
+    "decode_songs_msgspec",
+    "write_json",
+    "write_csv",
+)
+# Accounts exported by the export_accounts scenario; the mock API serves every account the same library.
+BATCH_ACCOUNTS = 4
+# Metrics where a higher value is better; every other compared metric is better when lower.
+HIGHER_IS_BETTER = {"throughput"}
+
+Measurement = Tuple[int, List[float]]
+
+
+def _make_client(
+    args: argparse.Namespace,
+    user_token: str = "bench-user-token",
+    rate_limiter: Any = None,
+    latencies: List[float] | None = None,
+) -> Tuple[Any, List[float]]:
+    from cli.client import AppleMusicClient
+    from cli.ratelimit import RateLimiter, RetryPolicy
+
+    client = AppleMusicClient(
+        "bench-developer-token",
+        user_token,
+        base_url=args.url,
+        pool_maxsize=max(16, args.concurrency),
+        rate_limiter=rate_limiter or RateLimiter(rate=args.rate),
+        retry_policy=RetryPolicy(base_delay=0.01),
+    )
+    samples: List[float] = [] if latencies is None else latencies
+    client.session.hooks["response"].append(
+        lambda response, *_, **__: samples.append(response.elapsed.total_seconds())
+    )
+    return client, samples
+
+
+def _prepare(name: str, args: argparse.Namespace) -> Callable[[], Measurement]:
+    """
+    Set up a scenario and return a callable that runs it once, returning (items processed, request latencies).
+    """
+    from cli.decoding import parse_songs
+    from cli.export import SONG_FIELDS, get_all_playlists, get_songs_in_playlist
+    from cli.file_output import write_songs_to_csv, write_songs_to_json
+
+    if name.startswith("decode_songs_"):
+        from cli.decoding import get_decoder
+        from cli.export import song_params
+
+        decoder = get_decoder(name.rsplit("_", 1)[1])
+        fields = song_params()["fields[library-songs]"].split(",")
+        path = f"/v1/me/library/playlists/{LARGE_PLAYLIST_ID}/tracks"
+        # Pages as the mock API serves them to the CLI, so only decoding and projection are timed.
+        bodies = [
+            json.dumps(
+                page_body(
+                    path,
+                    sparse_fieldset(
+                        [
+                            SyntheticLibrary.track(i)
+                            for i in range(offset, min(offset + 100, args.large_tracks))
+                        ],
+                        fields,
+                    ),
+                    offset,
+                    100,
+                    args.large_tracks,
+                )
+            ).encode()
+            for offset in range(0, args.large_tracks, 100)
+        ]
+
+        def _decode() -> Measurement:
+            count = 0
+            for body in bodies:
+                page = decoder.page(body, "songs")
+                if page is None:
+                    raise RuntimeError(f"{name} failed to decode a page")
+                count += len(page.records)
+            return count, []
+
+        return _decode
+
+    if name.startswith("write_"):
+        rows = parse_songs(
+            [SyntheticLibrary.track(i) for i in range(args.large_tracks)]
+        )
+        output = Path(tempfile.mkdtemp(prefix="bench-")) / "output"
+
+        def _write() -> Measurement:
+            if name == "write_json":
+                return write_songs_to_json(iter(rows), str(output) + ".json"), []
+            return write_songs_to_csv(iter(rows), str(output) + ".csv", SONG_FIELDS), []
+
+        return _write
+
+    if name == "export_accounts":
+        from cli.batch import Account
+        from cli.export import export_accounts
+        from cli.ratelimit import RateLimiter
+
+        output_dir = Path(tempfile.mkdtemp(prefix="bench-"))
+        accounts = [
+            Account(f"account{i}", output_dir / f"token{i}", output_dir / f"account{i}")
+            for i in range(BATCH_ACCOUNTS)
+        ]
+        # One developer token budget shared by every account's limiter, as in the batch command.
+        shared = RateLimiter(rate=args.rate)
+        samples: List[float] = []
+        clients = {
+            account.name: _make_client(
+                args,
+                f"bench-user-token-{account.name}",
+                RateLimiter(rate=args.rate, parent=shared),
+                samples,
+            )[0]
+            for account in accounts
+        }
+
+        def _export_accounts() -> Measurement:
+            samples.clear()
+            summaries = export_accounts(
+                clients, accounts, "jsonl", workers=args.concurrency
+            )
+            if any(summary["status"] != "ok" for summary in summaries):
+                raise RuntimeError(f"{name} failed against the mock API")
+            return sum(summary["tracks"] for summary in summaries), list(samples)
+
+        return _export_accounts
+
+    if name == "export_all_async":
+        import asyncio
+
+        from cli.async_api import AsyncAppleMusicClient, export_all_playlists_async
+        from cli.ratelimit import RateLimiter, RetryPolicy
+
+        directory = tempfile.mkdtemp(prefix="bench-")
+        samples = []
+
+        async def _sent(request: Any) -> None:
+            request.extensions["bench_started"] = time.perf_counter()
+
+        async def _received(response: Any) -> None:
+            # Time until the response headers arrive, like requests' Response.elapsed in the blocking scenarios.
+            samples.append(
+                time.perf_counter() - response.request.extensions["bench_started"]
+            )
+
+        async def _export_all_async() -> List[Dict[str, Any]] | None:
+            # httpx clients are bound to their event loop, so every run opens its own.
+            async with AsyncAppleMusicClient(
+                "bench-developer-token",
+                "bench-user-token",
+                base_url=args.url,
+                max_connections=max(16, args.concurrency),
+                rate_limiter=RateLimiter(rate=args.rate),
+                retry_policy=RetryPolicy(base_delay=0.01),
+            ) as client:
+                client.client.event_hooks = {
+                    "request": [_sent],
+                    "response": [_received],
+                }
+                return await export_all_playlists_async(
+                    client, directory, "jsonl", max_playlists=args.concurrency
+                )
+
+        def _run_async() -> Measurement:
+            samples.clear()
+            manifest = asyncio.run(_export_all_async())
+            if manifest is None or any(e["status"] != "ok" for e in manifest):
+                raise RuntimeError(f"{name} failed against the mock API")
+            return sum(entry["tracks"] for entry in manifest), list(samples)
+
+        return _run_async
+
+    client, latencies = _make_client(args)
+
+    if name == "export_enriched":
+        from cli.enrich import CatalogEnricher
+        from cli.export import export_songs
+
+        output = Path(tempfile.mkdtemp(prefix="bench-")) / "output.jsonl"
+
+        def _export() -> Measurement:
+            latencies.clear()
+            # A fresh enricher per run, so every run fetches the catalog songs again.
+            with CatalogEnricher(client, workers=args.concurrency) as enricher:
+                count = export_songs(
+                    client, LARGE_PLAYLIST_ID, "jsonl", str(output), enricher=enricher
+                )
+            if count is None:
+                raise RuntimeError(f"{name} failed against the mock API")
+            return count, list(latencies)
+
+        return _export
+
+    if name == "export_all":
+        from cli.export import export_all_playlists
+
+        output_dir = tempfile.mkdtemp(prefix="bench-")
+
+        def _export_all() -> Measurement:
+            latencies.clear()
+            manifest = export_all_playlists(
+                client, output_dir, "jsonl", workers=args.concurrency
+            )
+            if manifest is None or any(e["status"] != "ok" for e in manifest):
+                raise RuntimeError(f"{name} failed against the mock API")
+            return sum(entry["tracks"] for entry in manifest), list(latencies)
+
+        return _export_all
+
+    if name == "export_library":
+        from cli.export import export_library
+
+        database = str(Path(tempfile.mkdtemp(prefix="bench-")) / "library.sqlite")
+
+        def _export_library() -> Measurement:
+            latencies.clear()
+            summary = export_library(
+                client, database, args.concurrency, args.concurrency
+            )
+            if summary is None or any(
+                entry["status"] != "ok" for entry in summary["playlists"]
+            ):
+                raise RuntimeError(f"{name} failed against the mock API")
+            # Playlist tracks, like export_all, so the throughputs compare.
+            return sum(e["tracks"] for e in summary["playlists"]), list(latencies)
+
+        return _export_library
+
+    def _fetch() -> Measurement:
+        latencies.clear()
+        if name == "get_all_playlists":
+            result = get_all_playlists(client)
+        else:
+            concurrency = args.concurrency if name.endswith("_concurrent") else 1
+            result = get_songs_in_playlist(client, LARGE_PLAYLIST_ID, concurrency)
+        if result is None:
+            raise RuntimeError(f"{name} failed against the mock API")
+        return len(result), list(latencies)
+
+    return _fetch
+
+
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_child(args: argparse.Namespace) -> None:
+    """
+    Run one scenario `repeat` times after a warm-up run and print the raw samples as JSON.
+    """
+    run = _prepare(args.child, args)
+    run()
+    seconds: List[float] = []
+    latencies: List[float] = []
+    items = 0
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        items, request_latencies = run()
+        seconds.append(time.perf_counter() - started)
+        latencies.extend(request_latencies)
+    print(
+        json.dumps(
+            {
+                "items": items,
+                "seconds": seconds,
+                "latencies": latencies,
+                "peak_rss_mb": _peak_rss_mb(),
+            }
+        )
+    )
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float] | None:
+    if len(samples) < 2:
+        return None
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "p50": round(cuts[49] * 1000, 3),
+        "p95": round(cuts[94] * 1000, 3),
+        "p99": round(cuts[98] * 1000, 3),
+    }
+
+
+def run_scenario(name: str, args: argparse.Namespace, url: str) -> Dict[str, Any]:
+    command = [
+        sys.executable,
+        "-m",
+        "bench.run",
+        "--child",
+        name,
+        "--url",
+        url,
+        "--repeat",
+        str(args.repeat),
+        "--large-tracks",
+        str(args.large_tracks),
+        "--concurrency",
+        str(args.concurrency),
+        "--rate",
+        str(args.rate),
+    ]
+    completed = subprocess.run(
+        command, capture_output=True, text=True, cwd=BENCH_DIR.parent
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Scenario {name} failed:\n{completed.stderr}")
+    sample = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    seconds = statistics.median(sample["seconds"])
+    return {
+        "items": sample["items"],
+        "seconds": round(seconds, 4),
+        "throughput": round(sample["items"] / seconds, 1) if seconds else None,
+        "latency_ms": _percentiles(sample["latencies"]),
+        "peak_rss_mb": (
+            round(sample["peak_rss_mb"], 1) if sample["peak_rss_mb"] else None
+        ),
+    }
+
+
+def _metrics(result: Dict[str, Any]) -> Dict[str, float]:
+    metrics = {
+        "throughput": result.get("throughput"),
+        "peak_rss_mb": result.get("peak_rss_mb"),
+    }
+    latency = result.get("latency_ms") or {}
+    metrics["p95_ms"] = latency.get("p95")
+    return {key: value for key, value in metrics.items() if value}
+
+
+def compare(
+    results: Dict[str, Any], baseline: Dict[str, Any], threshold: float
+) -> List[str]:
+    """
+    Print how each metric moved relative to the baseline.
+
+    :param threshold: Relative change in the wrong direction that counts as a regression, e.g. 0.1 for 10%.
+    :return: Descriptions of the regressions found.
+    """
+    if results["config"] != baseline.get("config"):
+        print("Warning: the baseline was recorded with a different configuration.")
+
+    regressions: List[str] = []
+    print(
+        f"\n{'scenario':<34}{'metric':<14}{'baseline':>12}{'current':>12}{'change':>10}"
+    )
+    for name, result in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        before_metrics = _metrics(previous)
+        for metric, current in _metrics(result).items():
+            before = before_metrics.get(metric)
+            if not before:
+                continue
+            change = (current - before) / before
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            flag = " !" if worse > threshold else ""
+            if flag:
+                regressions.append(f"{name} {metric}: {before} -> {current}")
+            print(
+                f"{name:<34}{metric:<14}{before:>12}{current:>12}{change:>+10.1%}{flag}"
+            )
+    return regressions
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m bench.run",
+        description="Benchmark the CLI against a local mock Apple Music API.",
+    )
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=SCENARIOS,
+        help="scenario to run; may be repeated (default: all)",
+    )
+    parser.add_argument("--playlists", type=int, default=500)
+    parser.add_argument("--tracks", type=int, default=50)
+    parser.add_argument(
+        "--large-tracks",
+        type=int,
+        default=20000,
+        help="tracks in the playlist used by the pagination and writer scenarios",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=10000,
+        help="requests per second allowed by the client's rate limiter",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.005, help="mock API latency in seconds"
+    )
+    parser.add_argument(
+        "--throttle-every",
+        type=int,
+        default=200,
+        help="answer every n-th request with a 429 (0 disables)",
+    )
+    parser.add_argument("--output", type=Path, default=DEFAULT_RESULTS)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="write the results to the baseline file instead of comparing",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative slowdown reported as a regression (default: 0.1)",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="exit with status 1 if any regression is found",
+    )
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    if args.child:
+        run_child(args)
+        return 0
+
+    config = {
+        key: getattr(args, key)
+        for key in (
+            "playlists",
+            "tracks",
+            "large_tracks",
+            "repeat",
+            "concurrency",
+            "rate",
+            "latency",
+            "throttle_every",
+        )
+    }
+    library = SyntheticLibrary(args.playlists, args.tracks, args.large_tracks)
+    scenarios: Dict[str, Any] = {}
+    with MockAppleMusicAPI(
+        library, latency=args.latency, throttle_every=args.throttle_every
+    ) as api:
+        for name in args.scenario or SCENARIOS:
+            if name.startswith("decode_songs_"):
+                from cli.decoding import available_backends
+
+                backend = name.rsplit("_", 1)[1]
+                if backend not in available_backends():
+                    print(f"{name:<34}skipped: {backend} is not installed")
+                    continue
+            if name == "export_all_async" and importlib.util.find_spec("httpx") is None:
+                print(f"{name:<34}skipped: httpx is not installed")
+                continue
+            result = run_scenario(name, args, api.url)
+            scenarios[name] = result
+            latency = " ".join(
+                f"{key} {value}ms"
+                for key, value in (result["latency_ms"] or {}).items()
+            )
+            print(
+                f"{name:<34}{result['items']:>8} items {result['seconds']:>9.3f}s "
+                f"{result['throughput']:>12,.0f}/s  rss {result['peak_rss_mb']}MB  "
+                f"{latency}".rstrip()
+            )
+        print(f"Mock API served {api.requests} requests ({api.throttled} throttled).")
+
+    results = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "scenarios": scenarios,
+    }
+    target = args.baseline if args.save_baseline else args.output
+    target.write_text(json.dumps(results, indent=2) + "\n")
+    print(f"Wrote {target}")
+
+    if args.save_baseline:
+        return 0
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; record one with --save-baseline.")
+        return 0
+    regressions = compare(
+        results, json.loads(args.baseline.read_text()), args.threshold
+    )
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}.")
+        return 1 if args.check else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,505 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Sequence,
+)
+
+from cli.client import (
+    BASE_URL,
+    DEFAULT_POOL_MAXSIZE,
+    DEFAULT_TIMEOUT,
+    TokenProvider,
+    _report_http_error,
+)
+from cli.decoding import Decoder, Page, get_decoder
+from cli.export import (
+    PAGE_LIMIT,
+    SONG_FIELDS,
+    PlaylistFetchError,
+    manifest_entry,
+    open_writers,
+    output_files,
+    parse_formats,
+    playlist_files,
+    record_export,
+    song_params,
+)
+from cli.file_output import write_fanout
+from cli.metrics import Metrics
+from cli.ratelimit import RateLimiter, RetryPolicy, parse_retry_after
+from cli.records import Playlist, Track
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - optional dependency
+    httpx = None  # type: ignore[assignment]
+
+PAGE_QUEUE_SIZE = 8
+
+
+class AsyncAppleMusicClient:
+    """
+    asyncio counterpart of AppleMusicClient, built on httpx.AsyncClient.
+
+    A single event loop can keep up to max_connections requests in flight over pooled keep-alive connections. Requests
+    share the same RateLimiter, RetryPolicy and 401 token refresh behaviour as the blocking client, with waits done
+    through asyncio.sleep so they never block the loop.
+
+    Requires the optional httpx dependency: pip install "apple-music-cli[async]".
+    """
+
+    def __init__(
+        self,
+        developer_token: str | TokenProvider,
+        music_user_token: str | None = None,
+        base_url: str = BASE_URL,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_connections: int = DEFAULT_POOL_MAXSIZE,
+        rate_limiter: RateLimiter | None = None,
+        retry_policy: RetryPolicy | None = None,
+        transport: Any = None,
+        metrics: Metrics | None = None,
+        decoder: Decoder | None = None,
+    ) -> None:
+        """
+        :param developer_token: A developer JWT, or a TokenProvider asked for the current token before every request.
+        :param music_user_token: The Music-User-Token for requests against /v1/me endpoints.
+        :param base_url: Root URL of the Apple Music API.
+        :param timeout: Seconds to wait for the server before giving up on a request.
+        :param max_connections: Maximum number of requests in flight at once.
+        :param rate_limiter: Limiter shared by every request sent through this client.
+        :param retry_policy: How often and after how long failed requests are retried.
+        :param transport: Optional httpx transport, e.g. httpx.MockTransport in tests.
+        :param metrics: Optional recorder for request and decode timings.
+        :param decoder: JSON decoder for response bodies. Defaults to the fastest installed backend.
+        """
+        if httpx is None:
+            raise RuntimeError(
+                'The async API requires httpx: pip install "apple-music-cli[async]"'
+            )
+        self.base_url: str = base_url.rstrip("/")
+        self.rate_limiter: RateLimiter = rate_limiter or RateLimiter()
+        self.retry_policy: RetryPolicy = retry_policy or RetryPolicy()
+        self.metrics: Metrics | None = metrics
+        self.decoder: Decoder = decoder or get_decoder()
+
+        self.token_provider: TokenProvider | None = None
+        headers: Dict[str, str] = {}
+        if isinstance(developer_token, str):
+            headers["Authorization"] = "Bearer " + developer_token
+        else:
+            self.token_provider = developer_token
+        if music_user_token:
+            headers["Music-User-Token"] = music_user_token
+
+        self.client = httpx.AsyncClient(
+            headers=headers,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            transport=transport,
+        )
+
+    async def __aenter__(self) -> "AsyncAppleMusicClient":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    def url_for(self, path: str) -> str:
+        if path.startswith(("http://", "https://")):
+            return path
+        return self.base_url + path
+
+    async def get(
+        self,
+        path: str,
+        params: Dict[str, Any] | None = None,
+        description: str = "data",
+    ) -> Dict[str, Any] | None:
+        """
+        Send a rate-limited GET request and decode the JSON body, retrying like AppleMusicClient.get.
+
+        :return: The decoded response body, or None once the error is reported or the retries are exhausted.
+        """
+        return await self._get(path, params, description, self.decoder.decode)
+
+    async def get_page(
+        self,
+        path: str,
+        kind: str,
+        params: Dict[str, Any] | None = None,
+    ) -> Page | None:
+        """
+        Coroutine version of AppleMusicClient.get_page.
+        """
+        return await self._get(
+            path, params, kind, lambda body: self.decoder.page(body, kind)
+        )
+
+    async def _get(
+        self,
+        path: str,
+        params: Dict[str, Any] | None,
+        description: str,
+        decode: Callable[[bytes | str], Any],
+    ) -> Any:
+        url = self.url_for(path)
+        attempt = 0
+        reauthorised = False
+        while True:
+            wait = self.rate_limiter.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            can_retry = attempt < self.retry_policy.max_retries
+            headers: Dict[str, str] = {}
+            if self.token_provider is not None:
+                headers["Authorization"] = "Bearer " + self.token_provider.get()
+            started = time.perf_counter()
+            try:
+                response = await self.client.get(url, params=params, headers=headers)
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                self._record_request(url, 0, started, attempt)
+                if not can_retry:
+                    logging.exception("Network error while fetching %s", description)
+                    print(f"Network error while fetching {description}: {e}")
+                    return None
+                delay = self.retry_policy.delay(attempt)
+                logging.warning(
+                    "Network error fetching %s, retrying in %.1fs: %s",
+                    description,
+                    delay,
+                    e,
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            status = response.status_code
+            self._record_request(url, status, started, attempt, len(response.content))
+            if status == 401 and self.token_provider is not None and not reauthorised:
+                logging.warning("Developer token rejected, signing a new one")
+                await asyncio.to_thread(self.token_provider.refresh)
+                reauthorised = True
+                continue
+
+            if can_retry and (status == 429 or status >= 500):
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                delay = (
+                    retry_after
+                    if retry_after is not None
+                    else self.retry_policy.delay(attempt)
+                )
+                logging.warning(
+                    "HTTP %d fetching %s, retrying in %.1fs", status, description, delay
+                )
+                if status == 429:
+                    self.rate_limiter.throttle(delay)
+                else:
+                    await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            try:
+                response.raise_for_status()
+            except httpx.HTTPStatusError as e:
+                _report_http_error(status, e, description)
+                return None
+
+            self.rate_limiter.succeed()
+            if self.metrics is not None:
+                self.metrics.record_page(url)
+            started = time.perf_counter()
+            try:
+                decoded = decode(response.content)
+            except ValueError:
+                logging.exception("Failed to parse JSON response")
+                print("Invalid JSON received from Apple Music API.")
+                return None
+            finally:
+                if self.metrics is not None:
+                    self.metrics.record_span(
+                        "decode",
+                        self.decoder.name,
+                        started,
+                        time.perf_counter() - started,
+                    )
+            return decoded
+
+    def _record_request(
+        self, url: str, status: int, started: float, attempt: int, size: int = 0
+    ) -> None:
+        if self.metrics is not None:
+            self.metrics.record_request(
+                url, status, started, time.perf_counter() - started, size, attempt
+            )
+
+
+async def get_all_playlists_async(
+    client: AsyncAppleMusicClient,
+) -> List[Playlist] | None:
+    """
+    Coroutine version of cli.export.get_all_playlists.
+    """
+    path: str | None = "/v1/me/library/playlists"
+
+    output: List[Playlist] = []
+    while path:
+        page = await client.get_page(path, "playlists", params={"limit": PAGE_LIMIT})
+        if page is None:
+            return None
+        output.extend(page.records)
+        path = page.next
+    logging.info("Got all playlists")
+
+    return output
+
+
+async def get_playlist_by_id_async(
+    client: AsyncAppleMusicClient, playlist_id: str
+) -> List[Playlist] | None:
+    """
+    Coroutine version of cli.export.get_playlist_by_id.
+    """
+    page = await client.get_page(f"/v1/me/library/playlists/{playlist_id}", "playlists")
+    if page is None:
+        return None
+    return page.records
+
+
+async def iter_songs_in_playlist_async(
+    client: AsyncAppleMusicClient,
+    playlist_id: str,
+    prefetch: int = 8,
+    fields: Sequence[str] = SONG_FIELDS,
+) -> AsyncIterator[List[Track]]:
+    """
+    Async generator version of cli.export.iter_songs_in_playlist.
+
+    Once the first page reveals the page size and total, up to `prefetch` offset windows are requested at once and
+    their songs yielded in playlist order. Falls back to following the "next" cursor when the total is unknown.
+
+    :param fields: Song keys to fetch, see cli.export.song_params.
+    :raises PlaylistFetchError: If any page fails to load.
+    """
+    path = f"/v1/me/library/playlists/{playlist_id}/tracks"
+    params = song_params(fields)
+
+    page = await client.get_page(path, "songs", params=params)
+    if page is None:
+        raise PlaylistFetchError(f"Failed to fetch playlist {playlist_id}")
+
+    next_path = page.next
+    total = page.total
+    page_size = page.size
+    yield page.records
+
+    if next_path and total is not None and page_size:
+        offsets = iter(range(page_size, total, page_size))
+
+        def _schedule() -> None:
+            offset = next(offsets, None)
+            if offset is not None:
+                window.append(
+                    asyncio.ensure_future(
+                        client.get_page(
+                            path,
+                            "songs",
+                            params={**params, "offset": offset, "limit": page_size},
+                        )
+                    )
+                )
+
+        window: Deque[asyncio.Future] = deque()
+        for _ in range(max(1, prefetch)):
+            _schedule()
+        try:
+            while window:
+                page = await window.popleft()
+                if page is None:
+                    raise PlaylistFetchError(f"Failed to fetch playlist {playlist_id}")
+                _schedule()
+                yield page.records
+        finally:
+            for future in window:
+                future.cancel()
+        return
+
+    while next_path:
+        page = await client.get_page(next_path, "songs", params=params)
+        if page is None:
+            raise PlaylistFetchError(f"Failed to fetch playlist {playlist_id}")
+        next_path = page.next
+        yield page.records
+
+
+async def export_songs_async(
+    client: AsyncAppleMusicClient,
+    playlist_id: str,
+    fmt: str,
+    output_file: str,
+    prefetch: int = 8,
+    playlist_name: str | None = None,
+    compression: str | None = None,
+    fields: Sequence[str] | None = None,
+) -> int | None:
+    """
+    Coroutine version of cli.export.export_songs.
+
+    :return: The number of songs written, or None if the playlist could not be fully fetched.
+    """
+    return await export_songs_to_async(
+        client,
+        playlist_id,
+        output_files(output_file, parse_formats(fmt), compression),
+        prefetch,
+        playlist_name,
+        fields,
+    )
+
+
+async def export_songs_to_async(
+    client: AsyncAppleMusicClient,
+    playlist_id: str,
+    outputs: Mapping[str, str],
+    prefetch: int = 8,
+    playlist_name: str | None = None,
+    fields: Sequence[str] | None = None,
+) -> int | None:
+    """
+    Coroutine version of cli.export.export_songs_to.
+
+    Pages are handed through a bounded queue to the blocking file writers running on a thread of their own, so JSON
+    decoding on the event loop, file writes on the thread and the next requests on the network all overlap. The queue
+    lives on the event loop, so handing a page over never needs a thread of the default executor.
+
+    :return: The number of songs written, or None if the playlist could not be fully fetched.
+    """
+    writers = open_writers(
+        outputs, SONG_FIELDS, playlist_id, playlist_name, columns=fields
+    )
+    if not writers:
+        return None
+    loop = asyncio.get_running_loop()
+    pages: asyncio.Queue = asyncio.Queue(maxsize=PAGE_QUEUE_SIZE)
+
+    def _rows() -> Iterator[Track]:
+        while (
+            page := asyncio.run_coroutine_threadsafe(pages.get(), loop).result()
+        ) is not None:
+            yield from page
+
+    def _write_rows(rows: Iterator[Track]) -> int:
+        return write_fanout(rows, writers)[0]
+
+    def _write() -> int | None:
+        rows = _rows()
+        try:
+            if client.metrics is not None:
+                name = ", ".join(Path(path).name for path in outputs.values())
+                return client.metrics.measure_consumer("write", name, _write_rows, rows)
+            return _write_rows(rows)
+        finally:
+            # Keep draining so the producer never blocks on a writer that has stopped.
+            for _ in rows:
+                pass
+
+    # The writer blocks its thread for as long as the playlist is exported, so it must not hold one of the default
+    # executor's threads: with as many playlists exported at once as it has workers, none would be left.
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export-writer")
+    writer = loop.run_in_executor(executor, _write)
+    executor.shutdown(wait=False)
+    failed = False
+    try:
+        async for page in iter_songs_in_playlist_async(
+            client,
+            playlist_id,
+            prefetch,
+            SONG_FIELDS if fields is None or "sqlite" in outputs else fields,
+        ):
+            await pages.put(page)
+    except PlaylistFetchError:
+        logging.exception("Failed to export playlist %s", playlist_id)
+        failed = True
+    finally:
+        await pages.put(None)
+    count = await writer
+    return None if failed else count
+
+
+async def export_all_playlists_async(
+    client: AsyncAppleMusicClient,
+    output_dir: str,
+    fmt: str = "json",
+    max_playlists: int = 8,
+    prefetch: int = 4,
+    compression: str | None = None,
+    fields: Sequence[str] | None = None,
+) -> List[Dict[str, Any]] | None:
+    """
+    Coroutine version of cli.export.export_all_playlists: one output file per playlist plus a manifest.json.
+
+    :param max_playlists: Maximum number of playlists exported at the same time.
+    :param prefetch: Maximum number of pages requested at once per playlist.
+    :param fields: Columns to export, in order, see cli.export.export_songs_to.
+    :return: The manifest entries, or None if the playlist listing could not be fetched.
+    """
+    playlists = await get_all_playlists_async(client)
+    if playlists is None:
+        return None
+
+    directory = Path(output_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    slots = asyncio.Semaphore(max_playlists)
+
+    async def _export(playlist: Playlist) -> Dict[str, Any]:
+        entry = manifest_entry(playlist)
+        files = playlist_files(playlist, fmt, compression)
+        async with slots:
+            try:
+                count = await export_songs_to_async(
+                    client,
+                    playlist["id"],
+                    {kind: str(directory / name) for kind, name in files.items()},
+                    prefetch,
+                    playlist.get("name"),
+                    fields,
+                )
+            except (OSError, RuntimeError, sqlite3.Error):
+                # A failed writer only fails its own playlist instead of cancelling the gather.
+                logging.exception("Failed to export playlist %s", playlist["id"])
+                return entry
+        if count is None:
+            return entry
+        record_export(entry, files, count)
+        return entry
+
+    manifest = list(
+        await asyncio.gather(
+            *(_export(playlist) for playlist in playlists if playlist.get("id"))
+        )
+    )
+
+    (directory / "manifest.json").write_text(
+        json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8"
+    )
+    return manifest
@@ -1,20 +1,32 @@
+import json
+import logging
+import os
+import tempfile
 import threading
 import time
-import webbrowser
+from pathlib import Path
+from typing import Dict, Tuple
 
-import jwt
-import uvicorn
+from cli.config import DEVELOPER_TOKEN_PATH
 
-from cli.config import TOKEN_PATH
+# jwt (and cryptography), uvicorn and webbrowser are imported where they are used, so commands that never sign a token
+# or start the auth server do not pay for them at startup.
 
 TIMEOUT_SECONDS = 120
-POLL_INTERVAL = 0.5
+AUTH_SERVER_HOST = "127.0.0.1"
+AUTH_SERVER_PORT = 3000
+TOKEN_LIFETIME_SECONDS = 24 * 60 * 60
+REFRESH_MARGIN_SECONDS = 10 * 60
 
 
 class AuthTimeoutError(RuntimeError):
     pass
 
 
+class AuthServerError(RuntimeError):
+    pass
+
+
 class InvalidTeamIdException(Exception):
     pass
 
@@ -37,10 +49,12 @@ def generate_jwt(secret_key_file_path: str, team_id: str, key_id: str) -> str:
     if len(key_id) != 10:
         raise InvalidKeyIdException
 
+    import jwt
+
     current_unix_seconds = int(time.time())
     with open(secret_key_file_path, "rb") as f:
         jwt_payload = {
-            "exp": current_unix_seconds + (24 * 60 * 60),  # expiration time
+            "exp": current_unix_seconds + TOKEN_LIFETIME_SECONDS,  # expiration time
             "iss": team_id,  # issuer
             "iat": current_unix_seconds,  # issued at
         }
@@ -51,36 +65,216 @@ def generate_jwt(secret_key_file_path: str, team_id: str, key_id: str) -> str:
         return jwt_token
 
 
-def start_auth_flow():
-    threading.Thread(
-        target=lambda: uvicorn.run(
-            "server.app:app",
-            host="127.0.0.1",
-            port=3000,
-            log_level="error",
-        ),
-        daemon=True,
-    ).start()
+class DeveloperTokenCache:
+    """
+    Reuses a signed developer token until shortly before it expires.
+
+    Tokens are kept in memory and persisted next to TOKEN_PATH, so separate CLI invocations and the auth server share
+    one signature per day instead of reading the .p8 file and signing on every call. get() is cheap enough to call
+    before every request, which lets long-running exports pick up a fresh token before the current one expires.
+    """
+
+    def __init__(
+        self,
+        secret_key_file_path: str,
+        team_id: str,
+        key_id: str,
+        cache_path: Path | None = DEVELOPER_TOKEN_PATH,
+        refresh_margin: int = REFRESH_MARGIN_SECONDS,
+    ) -> None:
+        """
+        :param secret_key_file_path: Path to the p8 file.
+        :param team_id: The 10 character iss registered claim key.
+        :param key_id: The 10 character key identifier key.
+        :param cache_path: File the token is persisted to, or None to keep it in memory only.
+        :param refresh_margin: Seconds before expiry at which the token is re-signed.
+        """
+        self.secret_key_file_path = secret_key_file_path
+        self.team_id = team_id
+        self.key_id = key_id
+        self.cache_path = cache_path
+        self.refresh_margin = refresh_margin
+
+        self._token: str | None = None
+        self._expires_at: int = 0
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, expires_at: int) -> bool:
+        return time.time() < expires_at - self.refresh_margin
+
+    def _load(self) -> None:
+        if self.cache_path is None or not self.cache_path.exists():
+            return
+        try:
+            cached = json.loads(self.cache_path.read_text())
+        except (OSError, ValueError):
+            logging.warning("Ignoring unreadable developer token cache")
+            return
+        if cached.get("iss") == self.team_id and cached.get("kid") == self.key_id:
+            self._token = cached.get("token")
+            self._expires_at = int(cached.get("exp", 0))
+
+    def _save(self) -> None:
+        if self.cache_path is None:
+            return
+        tmp_path: str | None = None
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            # mkstemp creates the file readable by the current user only, so the signed token is never exposed; the
+            # finished file then replaces the cache in one step.
+            fd, tmp_path = tempfile.mkstemp(
+                dir=self.cache_path.parent, prefix=self.cache_path.name, suffix=".tmp"
+            )
+            with os.fdopen(fd, "w") as file:
+                json.dump(
+                    {
+                        "token": self._token,
+                        "iss": self.team_id,
+                        "kid": self.key_id,
+                        "exp": self._expires_at,
+                    },
+                    file,
+                )
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            logging.warning("Failed to persist developer token cache")
+            if tmp_path is not None:
+                Path(tmp_path).unlink(missing_ok=True)
 
-    webbrowser.open("http://localhost:3000/login")
-    wait_for_token()
+    def _sign(self) -> str:
+        import jwt
 
+        token = generate_jwt(self.secret_key_file_path, self.team_id, self.key_id)
+        self._token = token
+        self._expires_at = jwt.decode(token, options={"verify_signature": False})["exp"]
+        self._save()
+        logging.info("Signed new developer token")
+        return token
 
-def wait_for_token() -> str:
+    def get(self) -> str:
+        """
+        :return: A developer token that is valid for at least refresh_margin seconds.
+        """
+        with self._lock:
+            if self._token is None:
+                self._load()
+            if self._token is not None and self._is_fresh(self._expires_at):
+                return self._token
+            return self._sign()
+
+    def refresh(self) -> str:
+        """
+        Discard the current token and sign a new one, e.g. after the API rejects it with a 401.
+        """
+        with self._lock:
+            return self._sign()
+
+
+_token_caches: Dict[Tuple[str, str, str], DeveloperTokenCache] = {}
+
+
+def get_developer_token(secret_key_file_path: str, team_id: str, key_id: str) -> str:
+    """
+    Return a cached developer token for the given credentials, signing a new one only when needed.
     """
-    Block until the Music User Token is written by the auth server.
+    key = (secret_key_file_path, team_id, key_id)
+    cache = _token_caches.get(key)
+    if cache is None:
+        cache = _token_caches.setdefault(
+            key, DeveloperTokenCache(secret_key_file_path, team_id, key_id)
+        )
+    return cache.get()
 
-    :return: The music user token as a string.
+
+class TokenHandoff:
     """
-    start = time.monotonic()
+    Passes the Music User Token from the auth server's /callback handler to the CLI thread waiting for it.
+
+    The server runs in the same process as the CLI, so the waiting thread is woken the moment the token arrives instead
+    of polling the token file.
+    """
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+        self._token: str | None = None
 
-    while True:
-        if TOKEN_PATH.exists():
-            token: str = TOKEN_PATH.read_text().strip()
-            if token:
-                return token
+    def clear(self) -> None:
+        self._token = None
+        self._event.clear()
 
-        if time.monotonic() - start > TIMEOUT_SECONDS:
+    def deliver(self, token: str) -> None:
+        """
+        Hand over the token and wake the waiting thread.
+        """
+        self._token = token
+        self._event.set()
+
+    def close(self) -> None:
+        """
+        Wake the waiting thread without a token, e.g. because the server stopped.
+        """
+        self._event.set()
+
+    def wait(self, timeout: float = TIMEOUT_SECONDS) -> str:
+        """
+        Block until a token is delivered.
+
+        :return: The music user token as a string.
+        :raises AuthTimeoutError: If no token arrives within `timeout` seconds.
+        :raises AuthServerError: If the handoff is closed before a token arrives.
+        """
+        if not self._event.wait(timeout):
             raise AuthTimeoutError("Timed out waiting for Apple Music authorisation.")
+        if self._token is None:
+            raise AuthServerError("The authorisation server stopped unexpectedly.")
+        return self._token
+
+
+token_handoff = TokenHandoff()
+
+
+def start_auth_flow() -> str:
+    """
+    Serve the MusicKit login page, open it in the browser and wait for the user to authorise.
+
+    The server is shut down as soon as the token is received, the wait times out or the user interrupts it.
+
+    :return: The music user token as a string.
+    """
+    import webbrowser
 
-        time.sleep(POLL_INTERVAL)
+    import uvicorn
+
+    from server.app import app
+
+    token_handoff.clear()
+    server = uvicorn.Server(
+        uvicorn.Config(
+            app, host=AUTH_SERVER_HOST, port=AUTH_SERVER_PORT, log_level="error"
+        )
+    )
+
+    def _serve() -> None:
+        try:
+            server.run()
+        finally:
+            # Wake the CLI if the server exits early, e.g. because the port is taken.
+            token_handoff.close()
+
+    thread = threading.Thread(target=_serve, name="auth-server")
+    thread.start()
+    try:
+        webbrowser.open(f"http://localhost:{AUTH_SERVER_PORT}/login")
+        return wait_for_token()
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def wait_for_token(timeout: float = TIMEOUT_SECONDS) -> str:
+    """
+    Block until the auth server's /callback handler hands over the Music User Token.
+
+    :return: The music user token as a string.
+    """
+    return token_handoff.wait(timeout)
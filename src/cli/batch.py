@@ -0,0 +1,154 @@
+import json
+import logging
+import re
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Tuple,
+)
+
+
+class AccountManifestError(RuntimeError):
+    pass
+
+
+class Account(NamedTuple):
+    name: str
+    token_path: Path
+    output_dir: Path
+    rate: float | None = None
+
+
+def load_accounts(path: str | Path, default_output: str = "output") -> List[Account]:
+    """
+    Read the accounts manifest of a batch run: a JSON list with one object per user account, e.g.
+
+        [{"name": "alice", "token": "tokens/alice", "output": "exports/alice", "rate": 5}]
+
+    "token" is the file holding the account's Music-User-Token, "output" the directory its playlists are exported
+    into (default: <default_output>/<name>) and "rate" the requests per second allowed for the account (optional).
+    Relative paths in the manifest are resolved against its directory.
+
+    :raises AccountManifestError: If the manifest is missing, not valid JSON, or an account is malformed.
+    """
+    path = Path(path)
+    try:
+        entries = json.loads(path.read_text(encoding="utf-8"))
+    except OSError as e:
+        raise AccountManifestError(f"Unable to read accounts manifest {path}: {e}")
+    except ValueError as e:
+        raise AccountManifestError(f"Accounts manifest {path} is not valid JSON: {e}")
+    if not isinstance(entries, list) or not entries:
+        raise AccountManifestError(
+            f"Accounts manifest {path} must be a non-empty list of accounts."
+        )
+
+    accounts: List[Account] = []
+    names = set()
+    for position, entry in enumerate(entries):
+        name = entry.get("name") if isinstance(entry, dict) else None
+        if not isinstance(name, str) or not name.strip():
+            raise AccountManifestError(f"Account {position} in {path} has no name.")
+        if name in names:
+            raise AccountManifestError(
+                f'Account name "{name}" appears more than once in {path}.'
+            )
+        names.add(name)
+        token = entry.get("token")
+        if not isinstance(token, str) or not token:
+            raise AccountManifestError(f'Account "{name}" in {path} has no token file.')
+        rate = entry.get("rate")
+        if rate is not None and (not isinstance(rate, (int, float)) or rate <= 0):
+            raise AccountManifestError(
+                f'Account "{name}" in {path} has an invalid rate: {rate!r}'
+            )
+        output = entry.get("output")
+        accounts.append(
+            Account(
+                name,
+                path.parent / token,
+                path.parent / output
+                if output
+                else Path(default_output) / re.sub(r"[^\w\- ]", "_", name),
+                float(rate) if rate is not None else None,
+            )
+        )
+    return accounts
+
+
+def read_account_token(account: Account) -> str | None:
+    """
+    Read the Music-User-Token of an account.
+
+    :return: The music user token, or None if it is missing or unreadable.
+    """
+    try:
+        music_user_token = account.token_path.read_text().strip()
+    except OSError:
+        logging.exception(
+            "Failed to read the Music-User-Token of account %s", account.name
+        )
+        music_user_token = ""
+    if not music_user_token:
+        print(
+            f"Unable to read the Music-User-Token of account {account.name} from {account.token_path}."
+        )
+        return None
+    return music_user_token
+
+
+def fair_map(
+    executor: Executor,
+    fn: Callable[..., Any],
+    jobs: Mapping[str, Iterable[Tuple[Any, ...]]],
+    limit: int,
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Run the calls of several queues on one shared executor, with at most `limit` of them running at a time.
+
+    Whenever a slot frees up, the next call is taken from the queue with the fewest calls running, in round-robin
+    order among equals, so a queue with many or slow jobs cannot hold every slot while the others wait. Queues are
+    only pulled from as slots free up, so lazily produced jobs (such as the playlists of a listing still being paged
+    through) are not read ahead.
+
+    :param jobs: Argument tuples of the calls, by queue name.
+    :return: (queue name, result) pairs, in order of completion.
+    """
+    queues: Dict[str, Iterator[Tuple[Any, ...]]] = {
+        name: iter(items) for name, items in jobs.items()
+    }
+    order: Deque[str] = deque(queues)
+    running: Dict[Future, str] = {}
+    counts: Counter = Counter()
+    try:
+        while order or running:
+            while order and len(running) < limit:
+                name = min(order, key=lambda queue: counts[queue])
+                order.remove(name)
+                try:
+                    item = next(queues[name])
+                except StopIteration:
+                    continue
+                order.append(name)
+                running[executor.submit(fn, *item)] = name
+                counts[name] += 1
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                counts[name] -= 1
+                yield name, future.result()
+    finally:
+        for future in running:
+            future.cancel()
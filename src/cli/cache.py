@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+DEFAULT_TTL_SECONDS = 60
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class CachedResponse:
+    """
+    A response body stored by ResponseCache, with the validators needed to revalidate it.
+    """
+
+    __slots__ = ("body", "etag", "last_modified", "stored_at")
+
+    def __init__(
+        self,
+        body: str,
+        etag: str | None = None,
+        last_modified: str | None = None,
+        stored_at: float = 0.0,
+    ) -> None:
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """
+        :return: If-None-Match / If-Modified-Since headers for revalidating this response.
+        """
+        headers: Dict[str, str] = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    On-disk cache of API response bodies keyed by URL and Music-User-Token.
+
+    Entries younger than the TTL are served without a request. Older entries are revalidated with a conditional
+    request, so an unchanged resource costs a 304 instead of a full payload. The cache directory is capped at
+    max_bytes; the least recently used entries are evicted first.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        ttl: float = DEFAULT_TTL_SECONDS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        """
+        :param directory: Directory the cache entries are stored in.
+        :param ttl: Seconds an entry is served without revalidation.
+        :param max_bytes: Maximum total size of the cache entries.
+        """
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._size: int | None = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(url: str, music_user_token: str | None) -> str:
+        """
+        Build the cache key for a fully-qualified URL (including its query string) and user token.
+        """
+        digest = hashlib.sha256(url.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update((music_user_token or "").encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def is_fresh(self, entry: CachedResponse) -> bool:
+        return time.time() - entry.stored_at < self.ttl
+
+    def get(self, key: str) -> CachedResponse | None:
+        """
+        Look up an entry, marking it as recently used.
+        """
+        path = self._path(key)
+        try:
+            data: Dict[str, Any] = json.loads(path.read_text(encoding="utf-8"))
+            entry = CachedResponse(
+                data["body"],
+                data.get("etag"),
+                data.get("last_modified"),
+                data["stored_at"],
+            )
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError):
+            logging.warning("Ignoring unreadable cache entry %s", path.name)
+            return None
+        return entry
+
+    def put(self, key: str, entry: CachedResponse) -> None:
+        """
+        Store an entry and evict least recently used entries if the cache is over its size cap.
+        """
+        entry.stored_at = time.time()
+        data = json.dumps(
+            {
+                "body": entry.body,
+                "etag": entry.etag,
+                "last_modified": entry.last_modified,
+                "stored_at": entry.stored_at,
+            }
+        ).encode("utf-8")
+
+        path = self._path(key)
+        with self._lock:
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                previous = path.stat().st_size if path.exists() else 0
+                tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+                tmp_path.write_bytes(data)
+                os.replace(tmp_path, path)
+            except OSError:
+                logging.warning("Failed to write cache entry %s", path.name)
+                return
+
+            if self._size is None:
+                self._size = sum(p.stat().st_size for p in self._entries())
+            else:
+                self._size += len(data) - previous
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def touch(self, key: str, entry: CachedResponse) -> None:
+        """
+        Restart the TTL of an entry that the server confirmed is unchanged.
+        """
+        self.put(key, entry)
+
+    def _entries(self) -> List[Path]:
+        return list(self.directory.glob("*.json"))
+
+    def _evict(self) -> None:
+        entries = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in entries:
+            if size <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            size -= entry_size
+            logging.debug("Evicted cache entry %s", path.name)
+        self._size = size
@@ -0,0 +1,296 @@
+import csv
+import json
+import logging
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, List, Mapping, Sequence, Tuple
+
+from cli.decoding import Page
+
+CHECKPOINT_SUFFIX = ".checkpoint.json"
+
+# A JSON export's elements are indented by two spaces, so the closing brace of each one is the only line that is
+# exactly "  }" (followed by "," unless it is the last element).
+_JSON_ELEMENT_ENDS = (b"  }\n", b"  },\n", b"  }")
+
+
+def checkpoint_path(outputs: Mapping[str, str]) -> Path:
+    """
+    The checkpoint of an export is stored next to its first output file, e.g. "out.json.checkpoint.json".
+    """
+    return Path(next(iter(outputs.values())) + CHECKPOINT_SUFFIX)
+
+
+def _json_row_ends(file: IO[bytes], limit: int) -> List[int]:
+    ends: List[int] = []
+    offset = 0
+    for line in file:
+        if line in _JSON_ELEMENT_ENDS:
+            ends.append(offset + 3)
+            if len(ends) >= limit:
+                break
+        offset += len(line)
+    return ends
+
+
+def _jsonl_row_ends(file: IO[bytes], limit: int) -> List[int]:
+    ends: List[int] = []
+    offset = 0
+    for line in file:
+        if not line.endswith(b"\n") or len(ends) >= limit:
+            break
+        offset += len(line)
+        ends.append(offset)
+    return ends
+
+
+def _csv_row_ends(file: IO[bytes], limit: int) -> List[int]:
+    offset = 0
+
+    def _lines() -> Iterator[str]:
+        nonlocal offset
+        for line in file:
+            if not line.endswith(b"\n"):
+                return
+            offset += len(line)
+            yield line.decode("utf-8")
+
+    ends: List[int] = []
+    # strict makes a quoted field cut off by the end of the file an error instead of a row.
+    reader = csv.reader(_lines(), strict=True)
+    try:
+        for _ in reader:
+            ends.append(offset)
+            if len(ends) > limit:
+                break
+    except csv.Error:
+        pass
+    # The first row is the header.
+    return ends[1:]
+
+
+_ROW_ENDS = {"json": _json_row_ends, "jsonl": _jsonl_row_ends, "csv": _csv_row_ends}
+
+
+def complete_rows(
+    fmt: str, path: str, limit: int, playlist_id: str = ""
+) -> Sequence[int]:
+    """
+    Find the rows of a partially written export that are complete on disk.
+
+    :param fmt: Format of the file: json, jsonl, csv or sqlite.
+    :param limit: Stop after this many rows.
+    :param playlist_id: Playlist whose rows are counted in a SQLite export.
+    :return: For text formats, the byte offset just past each complete row. For SQLite, a range with one entry per
+        stored row of the playlist.
+    """
+    if not Path(path).exists():
+        return []
+    if fmt == "sqlite":
+        connection = sqlite3.connect(path)
+        try:
+            (count,) = connection.execute(
+                "SELECT count(*) FROM playlist_tracks WHERE playlist_id = ?",
+                (playlist_id,),
+            ).fetchone()
+        except sqlite3.Error:
+            count = 0
+        finally:
+            connection.close()
+        return range(min(count, limit))
+    with open(path, "rb") as file:
+        return _ROW_ENDS[fmt](file, limit)
+
+
+class ExportCheckpoint:
+    """
+    Small state file recording how far an export of one playlist has got, so an interrupted export can be resumed
+    instead of restarted.
+
+    After every page handed to the writers the checkpoint stores the number of rows written and the API offset of the
+    next page, together with the playlist, output files and columns it belongs to. It is removed once the export
+    completes. The two differ once the decoder has skipped a malformed entry, so the checkpoint also keeps the
+    (rows, offset) boundary of every page that skipped one. Resuming keeps the rows that actually reached every output
+    file, cuts any partly written row off the end of the files, and continues from the API offset of the first row
+    after them.
+    """
+
+    def __init__(
+        self,
+        playlist_id: str,
+        outputs: Mapping[str, str],
+        fieldnames: Sequence[str] = (),
+    ) -> None:
+        """
+        :param playlist_id: Apple Music library playlist ID being exported.
+        :param outputs: Output file of each format, as given to export_songs_to.
+        :param fieldnames: Columns written to the files.
+        """
+        self.path = checkpoint_path(outputs)
+        self.playlist_id = playlist_id
+        self.outputs = dict(outputs)
+        self.fieldnames = list(fieldnames)
+        # (rows, API offset) at the start of the export, at both ends of every page that skipped entries, and at the
+        # next page. Between two consecutive boundaries, rows and offsets either advance together or belong to one
+        # page.
+        self.boundaries: List[Tuple[int, int]] = [(0, 0)]
+
+    @property
+    def rows(self) -> int:
+        return self.boundaries[-1][0]
+
+    @property
+    def offset(self) -> int:
+        return self.boundaries[-1][1]
+
+    def _state(self) -> Dict[str, Any]:
+        return {
+            "playlist_id": self.playlist_id,
+            "outputs": self.outputs,
+            "fieldnames": self.fieldnames,
+            "rows": self.rows,
+            "offset": self.offset,
+            "boundaries": self.boundaries,
+            "updated_at": time.time(),
+        }
+
+    def save(self) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(self._state()), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+        except OSError:
+            logging.warning("Failed to write checkpoint %s", self.path)
+
+    def remove(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+    def load(self) -> Dict[str, Any] | None:
+        """
+        :return: The stored state, or None if there is no readable checkpoint.
+        """
+        try:
+            state = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logging.warning("Ignoring unreadable checkpoint %s", self.path)
+            return None
+        return state if isinstance(state, dict) else None
+
+    def track(
+        self, pages: Iterable[Page], rows: int = 0, offset: int = 0
+    ) -> Iterator[Page]:
+        """
+        Pass pages through, saving the checkpoint each time the consumer asks for the page after one.
+
+        :param rows: Number of rows already in the files.
+        :param offset: API offset of the first page.
+        """
+        self.boundaries = [(rows, offset)]
+        for page in pages:
+            yield page
+            self._advance(len(page.records), page.size)
+            self.save()
+
+    def _advance(self, rows: int, size: int) -> None:
+        boundary = (self.rows + rows, self.offset + size)
+        if (
+            rows == size
+            and len(self.boundaries) > 1
+            and _in_step(self.boundaries[-2], self.boundaries[-1])
+        ):
+            # Neither page skipped an entry, so one boundary covers both.
+            self.boundaries[-1] = boundary
+        else:
+            self.boundaries.append(boundary)
+
+    def resume_point(self) -> Tuple[int, int] | None:
+        """
+        Prepare the output files to continue an interrupted export: the complete rows are kept and anything after
+        them is truncated. Prints a message and returns None if the checkpoint belongs to a different export.
+
+        :return: Number of rows already exported and the API offset to fetch the rest from; (0, 0) if there is no
+            checkpoint and the export starts over.
+        """
+        state = self.load()
+        if state is None:
+            print(f"No checkpoint found at {self.path}; starting from the beginning.")
+            return 0, 0
+        if (
+            state.get("playlist_id") != self.playlist_id
+            or state.get("outputs") != self.outputs
+            or state.get("fieldnames") != self.fieldnames
+        ):
+            print(
+                f"{self.path} is a checkpoint of a different export; run it with the same playlist, formats, output "
+                "and options, or without --resume to start over."
+            )
+            return None
+
+        boundaries = _boundaries(state.get("boundaries"))
+        limit = boundaries[-1][0]
+        rows = {
+            fmt: complete_rows(fmt, path, limit, self.playlist_id)
+            for fmt, path in self.outputs.items()
+        }
+        start, offset = _resume_at(
+            boundaries, min([limit] + [len(ends) for ends in rows.values()])
+        )
+        if start == 0:
+            return 0, 0
+        for fmt, path in self.outputs.items():
+            if fmt != "sqlite":
+                os.truncate(path, rows[fmt][start - 1])
+        logging.info(
+            "Resuming export of %s after %d rows, from offset %d",
+            self.playlist_id,
+            start,
+            offset,
+        )
+        return start, offset
+
+
+def _in_step(start: Tuple[int, int], end: Tuple[int, int]) -> bool:
+    return end[0] - start[0] == end[1] - start[1]
+
+
+def _boundaries(value: Any) -> List[Tuple[int, int]]:
+    """
+    Validate the boundaries of a stored checkpoint; malformed ones are replaced by the start of the playlist.
+    """
+    if not isinstance(value, list) or not value:
+        return [(0, 0)]
+    boundaries: List[Tuple[int, int]] = []
+    for boundary in value:
+        if (
+            not isinstance(boundary, list)
+            or len(boundary) != 2
+            or not all(isinstance(n, int) and n >= 0 for n in boundary)
+            or (boundaries and (boundary[0], boundary[1]) < boundaries[-1])
+        ):
+            logging.warning("Ignoring malformed checkpoint boundaries: %r", value)
+            return [(0, 0)]
+        boundaries.append((boundary[0], boundary[1]))
+    return boundaries
+
+
+def _resume_at(boundaries: Sequence[Tuple[int, int]], rows: int) -> Tuple[int, int]:
+    """
+    Find where to continue an export once the files hold `rows` complete rows.
+
+    :return: The rows to keep and the API offset of the next one. Within a page that skipped entries, the skipped
+        entries cannot be placed, so the export continues from the start of that page. Before the first boundary
+        nothing is known, so it starts over.
+    """
+    if rows >= boundaries[-1][0]:
+        return boundaries[-1]
+    for start, end in zip(reversed(boundaries[:-1]), reversed(boundaries[1:])):
+        if start[0] <= rows:
+            if _in_step(start, end):
+                return rows, start[1] + rows - start[0]
+            return start
+    return 0, 0
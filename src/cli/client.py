@@ -0,0 +1,338 @@
+import logging
+import time
+from typing import Any, Callable, Dict, Protocol
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cli.cache import CachedResponse, ResponseCache
+from cli.decoding import Decoder, Page, get_decoder
+from cli.metrics import Metrics
+from cli.ratelimit import RateLimiter, RetryPolicy, parse_retry_after
+
+BASE_URL = "https://api.music.apple.com"
+DEFAULT_TIMEOUT = 10
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 16
+
+
+class TokenProvider(Protocol):
+    """
+    Source of developer tokens, such as cli.auth.DeveloperTokenCache.
+    """
+
+    def get(self) -> str: ...
+
+    def refresh(self) -> str: ...
+
+
+def _report_http_error(status: int | None, e: Exception, description: str) -> None:
+    if status == 401:
+        print("Unauthorized: Incorrect Authorization header or token expired.")
+    elif status == 403:
+        print("Forbidden: Invalid or insufficient authentication.")
+    elif status == 429:
+        print("Too Many Requests: Rate limited by Apple servers.")
+    elif status == 500:
+        print("Internal Server Error: An error occurred on the server.")
+    else:
+        print(f"HTTP error occurred: {e}")
+    logging.exception("HTTP error fetching %s", description)
+
+
+class AppleMusicClient:
+    """
+    Pooled HTTP client for the Apple Music API.
+
+    The developer token is given either as a JWT or as a TokenProvider that keeps one fresh, and is held once together
+    with the optional Music-User-Token. Every request is sent through a single keep-alive requests.Session, so
+    repeated calls reuse open TLS connections to api.music.apple.com instead of performing a new handshake per page.
+
+    Every request first takes a token from the client's RateLimiter, which is shared by all threads using the client.
+    429 responses slow the limiter down and are retried after Retry-After; 5xx responses, connection resets and
+    timeouts are retried with jittered exponential backoff. When a TokenProvider is given, a 401 response re-signs the
+    developer token and retries the request once.
+
+    With a ResponseCache, recent responses are served from disk and older ones are revalidated with conditional
+    requests using their ETag / Last-Modified values.
+
+    Response bodies are decoded by a cli.decoding.Decoder, which uses msgspec or orjson when they are installed;
+    get_page decodes listing pages straight into records.
+
+    With a Metrics recorder, every HTTP exchange, returned page and JSON decode is recorded for --profile.
+    """
+
+    def __init__(
+        self,
+        developer_token: str | TokenProvider,
+        music_user_token: str | None = None,
+        base_url: str = BASE_URL,
+        timeout: float = DEFAULT_TIMEOUT,
+        pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        rate_limiter: RateLimiter | None = None,
+        retry_policy: RetryPolicy | None = None,
+        cache: ResponseCache | None = None,
+        metrics: Metrics | None = None,
+        decoder: Decoder | None = None,
+    ) -> None:
+        """
+        :param developer_token: A developer JWT used as the Bearer token in the Authorization header, or a
+            TokenProvider asked for the current token before every request.
+        :param music_user_token: The Music-User-Token for requests against /v1/me endpoints.
+        :param base_url: Root URL of the Apple Music API.
+        :param timeout: Seconds to wait for the server before giving up on a request.
+        :param pool_connections: Number of host connection pools to cache.
+        :param pool_maxsize: Maximum number of connections kept open per host.
+        :param rate_limiter: Limiter shared by every request sent through this client.
+        :param retry_policy: How often and after how long failed requests are retried.
+        :param cache: Optional on-disk response cache.
+        :param metrics: Optional recorder for request and decode timings.
+        :param decoder: JSON decoder for response bodies. Defaults to the fastest installed backend.
+        """
+        self.base_url: str = base_url.rstrip("/")
+        self.timeout: float = timeout
+        self.rate_limiter: RateLimiter = rate_limiter or RateLimiter()
+        self.retry_policy: RetryPolicy = retry_policy or RetryPolicy()
+        self.cache: ResponseCache | None = cache
+        self.metrics: Metrics | None = metrics
+        self.decoder: Decoder = decoder or get_decoder()
+        self.music_user_token: str | None = music_user_token
+
+        self.session: requests.Session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.token_provider: TokenProvider | None = None
+        if isinstance(developer_token, str):
+            self.session.headers["Authorization"] = "Bearer " + developer_token
+        else:
+            self.token_provider = developer_token
+        if music_user_token:
+            self.session.headers["Music-User-Token"] = music_user_token
+
+    def __enter__(self) -> "AppleMusicClient":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.session.close()
+
+    def url_for(self, path: str) -> str:
+        """
+        Resolve an API path (e.g. a "next" cursor) against the base URL. Absolute URLs are returned unchanged.
+        """
+        if path.startswith(("http://", "https://")):
+            return path
+        return self.base_url + path
+
+    def get(
+        self,
+        path: str,
+        params: Dict[str, Any] | None = None,
+        description: str = "data",
+    ) -> Dict[str, Any] | None:
+        """
+        Send a GET request to the Apple Music API and decode the JSON body.
+
+        :param path: API path such as "/v1/me/library/playlists", or an absolute URL.
+        :param params: Optional query string parameters.
+        :param description: Short description of the resource, used in log and error messages.
+        :return: The decoded response body. Returns None if an error occurs; prints a short message describing
+            common HTTP/errors before returning None.
+        """
+        return self._get(path, params, description, self.decoder.decode)
+
+    def get_page(
+        self,
+        path: str,
+        kind: str,
+        params: Dict[str, Any] | None = None,
+        catalog_ids: bool = False,
+        include: str | None = None,
+        include_kind: str | None = None,
+    ) -> Page | None:
+        """
+        Send a GET request for a page of library songs or playlists and decode it straight into records.
+
+        :param kind: One of cli.decoding.PAGE_KINDS; also used as the description in messages.
+        :param catalog_ids: Keep each song's catalog ID, for catalog enrichment.
+        :param include: Relationship to include with each playlist, e.g. "tracks"; sent as the include parameter and
+            decoded into Page.related.
+        :param include_kind: Kind of the included pages, if not the relationship's default.
+        :return: The page, or None if an error occurs, like get.
+        """
+        if include is not None:
+            params = {**(params or {}), "include": include}
+        return self._get(
+            path,
+            params,
+            kind,
+            lambda body: self.decoder.page(
+                body, kind, catalog_ids, include, include_kind
+            ),
+        )
+
+    def _get(
+        self,
+        path: str,
+        params: Dict[str, Any] | None,
+        description: str,
+        decode: Callable[[bytes | str], Any],
+    ) -> Any:
+        url = self.url_for(path)
+        headers: Dict[str, str] = {}
+        cache_key: str | None = None
+        cached: CachedResponse | None = None
+        if self.cache is not None:
+            full_url = requests.Request("GET", url, params=params).prepare().url
+            cache_key = self.cache.key(str(full_url), self.music_user_token)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                if self.cache.is_fresh(cached):
+                    logging.debug("Serving %s from cache", description)
+                    self._record_page(url, "cache")
+                    return self._decode(cached.body, decode)
+                headers = cached.conditional_headers()
+
+        response = self._send(url, params, description, headers)
+        if response is None:
+            return None
+
+        if self.cache is not None and cache_key is not None:
+            if response.status_code == 304 and cached is not None:
+                logging.debug("Cached %s is still valid", description)
+                self.cache.touch(cache_key, cached)
+                self._record_page(url, "revalidated")
+                return self._decode(cached.body, decode)
+            if response.status_code == 200:
+                self.cache.put(
+                    cache_key,
+                    CachedResponse(
+                        response.text,
+                        response.headers.get("ETag"),
+                        response.headers.get("Last-Modified"),
+                    ),
+                )
+
+        self._record_page(url, "network")
+        return self._decode(response.content, decode)
+
+    def _record_page(self, url: str, source: str) -> None:
+        if self.metrics is not None:
+            self.metrics.record_page(url, source)
+
+    def _decode(self, body: bytes | str, decode: Callable[[bytes | str], Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            decoded = decode(body)
+        except ValueError:
+            logging.exception("Failed to parse JSON response")
+            print("Invalid JSON received from Apple Music API.")
+            return None
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_span(
+                    "decode", self.decoder.name, started, time.perf_counter() - started
+                )
+
+        return decoded
+
+    def _send(
+        self,
+        url: str,
+        params: Dict[str, Any] | None,
+        description: str,
+        extra_headers: Dict[str, str] | None = None,
+    ) -> requests.Response | None:
+        """
+        Send a rate-limited GET request, retrying throttled, failed and dropped requests.
+
+        :return: The successful response, or None once the error is reported or the retries are exhausted.
+        """
+        attempt = 0
+        reauthorised = False
+        while True:
+            self.rate_limiter.acquire()
+            can_retry = attempt < self.retry_policy.max_retries
+            headers: Dict[str, str] = dict(extra_headers or {})
+            if self.token_provider is not None:
+                headers["Authorization"] = "Bearer " + self.token_provider.get()
+            started = time.perf_counter()
+            try:
+                response: requests.Response = self.session.get(
+                    url, params=params, headers=headers, timeout=self.timeout
+                )
+            except (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+            ) as e:
+                self._record_request(url, 0, started, attempt)
+                if not can_retry:
+                    logging.exception("Network error while fetching %s", description)
+                    print(f"Network error while fetching {description}: {e}")
+                    return None
+                delay = self.retry_policy.delay(attempt)
+                logging.warning(
+                    "Network error fetching %s, retrying in %.1fs: %s",
+                    description,
+                    delay,
+                    e,
+                )
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except requests.exceptions.RequestException as e:
+                self._record_request(url, 0, started, attempt)
+                logging.exception("Network error while fetching %s", description)
+                print(f"Network error while fetching {description}: {e}")
+                return None
+
+            status = response.status_code
+            self._record_request(url, status, started, attempt, len(response.content))
+            if status == 401 and self.token_provider is not None and not reauthorised:
+                logging.warning("Developer token rejected, signing a new one")
+                self.token_provider.refresh()
+                reauthorised = True
+                continue
+
+            if can_retry and (status == 429 or status >= 500):
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                delay = (
+                    retry_after
+                    if retry_after is not None
+                    else self.retry_policy.delay(attempt)
+                )
+                logging.warning(
+                    "HTTP %d fetching %s, retrying in %.1fs", status, description, delay
+                )
+                if status == 429:
+                    self.rate_limiter.throttle(delay)
+                else:
+                    time.sleep(delay)
+                attempt += 1
+                continue
+
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                _report_http_error(
+                    getattr(e.response, "status_code", None), e, description
+                )
+                return None
+
+            self.rate_limiter.succeed()
+            return response
+
+    def _record_request(
+        self, url: str, status: int, started: float, attempt: int, size: int = 0
+    ) -> None:
+        if self.metrics is not None:
+            self.metrics.record_request(
+                url, status, started, time.perf_counter() - started, size, attempt
+            )
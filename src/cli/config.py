@@ -1,5 +1,6 @@
 import os
 from pathlib import Path
+from typing import NamedTuple
 
 if os.name == "nt":
     appdata: str | None = os.getenv("APPDATA")
@@ -8,4 +9,39 @@ else:
     xdg = os.getenv("XDG_CONFIG_HOME")
     base = Path(xdg) if xdg else Path.home() / ".config"
 
-TOKEN_PATH: Path = base / "apple_music_cli" / "music_user_token"
+CONFIG_DIR: Path = base / "apple_music_cli"
+TOKEN_PATH: Path = CONFIG_DIR / "music_user_token"
+DEVELOPER_TOKEN_PATH: Path = CONFIG_DIR / "developer_token.json"
+CACHE_DIR: Path = CONFIG_DIR / "cache"
+STATE_DB_PATH: Path = CONFIG_DIR / "sync.db"
+DAEMON_PATH: Path = CONFIG_DIR / "daemon.json"
+CATALOG_DB_PATH: Path = CONFIG_DIR / "catalog.db"
+PLAYLIST_INDEX_PATH: Path = CONFIG_DIR / "playlists.json"
+
+
+class Credentials(NamedTuple):
+    team_id: str
+    key_id: str
+    private_key_path: str
+
+
+def load_credentials() -> Credentials:
+    """
+    Read the Apple Music developer credentials from the environment (or a .env file).
+
+    :raises RuntimeError: If any of the credentials are missing.
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    team_id = os.getenv("APPLE_MUSIC_TEAM_ID")
+    key_id = os.getenv("APPLE_MUSIC_KEY_ID")
+    private_key_path = os.getenv("APPLE_MUSIC_PRIVATE_KEY_PATH")
+
+    if not team_id or not key_id or not private_key_path:
+        raise RuntimeError(
+            "Missing Apple Music credentials. "
+            "Set APPLE_MUSIC_TEAM_ID, APPLE_MUSIC_KEY_ID, "
+            "and APPLE_MUSIC_PRIVATE_KEY_PATH."
+        )
+    return Credentials(team_id, key_id, private_key_path)
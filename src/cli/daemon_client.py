@@ -0,0 +1,121 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict
+
+from cli.config import DAEMON_PATH
+
+# urllib.request (and with it http.client and ssl) is only imported when a daemon file exists, so looking for a daemon
+# costs a single stat() on the common path.
+
+DEFAULT_DAEMON_HOST = "127.0.0.1"
+DEFAULT_DAEMON_PORT = 3001
+HEALTH_CHECK_TIMEOUT = 0.5
+
+
+class DaemonError(RuntimeError):
+    pass
+
+
+class DaemonClient:
+    """
+    Sends CLI commands to a running `apple-music-cli daemon` over its local HTTP API.
+    """
+
+    def __init__(self, url: str, secret: str, timeout: float | None = None) -> None:
+        """
+        :param url: Base URL the daemon listens on.
+        :param secret: Shared secret the daemon wrote to its daemon file.
+        :param timeout: Seconds to wait for a response, or None to wait for long exports to finish.
+        """
+        self.url = url.rstrip("/")
+        self.secret = secret
+        self.timeout = timeout
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        body: Dict[str, Any] | None = None,
+        timeout: float | None = None,
+    ) -> Any:
+        """
+        Send a request to the daemon and decode its JSON response.
+
+        :raises DaemonError: If the daemon cannot be reached or reports an error.
+        """
+        import urllib.error
+        import urllib.request
+
+        request = urllib.request.Request(
+            self.url + path,
+            method=method,
+            data=json.dumps(body).encode("utf-8") if body is not None else None,
+            headers={
+                "Authorization": "Bearer " + self.secret,
+                "Content-Type": "application/json",
+            },
+        )
+        try:
+            with urllib.request.urlopen(
+                request, timeout=timeout or self.timeout
+            ) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            try:
+                detail = json.loads(e.read()).get("detail", e.reason)
+            except (ValueError, AttributeError):
+                detail = e.reason
+            raise DaemonError(f"Daemon error {e.code}: {detail}") from e
+        except (OSError, ValueError) as e:
+            raise DaemonError(f"Daemon at {self.url} is not responding: {e}") from e
+
+    def is_alive(self) -> bool:
+        try:
+            self.request("GET", "/health", timeout=HEALTH_CHECK_TIMEOUT)
+        except DaemonError:
+            return False
+        return True
+
+
+def write_daemon_file(url: str, secret: str, path: Path | None = None) -> None:
+    """
+    Advertise a running daemon to CLI invocations. The file is only readable by the current user.
+    """
+    path = path or DAEMON_PATH
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as file:
+        json.dump({"url": url, "secret": secret, "pid": os.getpid()}, file)
+
+
+def remove_daemon_file(secret: str, path: Path | None = None) -> None:
+    """
+    Remove the daemon file, unless it has since been taken over by another daemon.
+    """
+    path = path or DAEMON_PATH
+    try:
+        if json.loads(path.read_text()).get("secret") == secret:
+            path.unlink()
+    except (OSError, ValueError):
+        pass
+
+
+def find_daemon(path: Path | None = None) -> DaemonClient | None:
+    """
+    :return: A client for the running daemon, or None if no daemon is running.
+    """
+    path = path or DAEMON_PATH
+    if not path.exists():
+        return None
+    try:
+        info = json.loads(path.read_text())
+        daemon = DaemonClient(info["url"], info["secret"])
+    except (OSError, ValueError, KeyError, TypeError):
+        logging.warning("Ignoring unreadable daemon file %s", path)
+        return None
+    if not daemon.is_alive():
+        logging.info("Ignoring stale daemon file %s", path)
+        return None
+    return daemon
@@ -0,0 +1,465 @@
+import json
+import logging
+from datetime import datetime
+from functools import cache
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+from cli.records import Playlist, Track
+
+# Decoding backends, fastest first. msgspec and orjson are optional (the "fast-json" extra); the standard library is
+# always available.
+BACKENDS = ("msgspec", "orjson", "json")
+# Kinds of pages and their records: "songs" are Tracks, "library-songs" are (library song ID, Track) pairs, "ids" are
+# the IDs of the resources alone and "playlists" are Playlists.
+PAGE_KINDS = ("songs", "library-songs", "ids", "playlists")
+# Relationships that can be included in pages of playlists (include=...), and the kind of page each one holds by
+# default.
+RELATED_KINDS = {"tracks": "songs"}
+
+
+class Page(NamedTuple):
+    """
+    One page of a paginated listing, projected into records.
+    """
+
+    records: List[Any]
+    # Number of resources in the page's "data", including any that were skipped; the page size of offset windows.
+    size: int
+    next: str | None
+    total: int | None
+    # First page of the included relationship of each resource, by resource ID, when the page was requested with one.
+    related: Dict[str, "Page"] | None = None
+
+
+def playlist_resources(response_dict: Dict[str, Any]) -> List[Dict[str, Any]] | None:
+    """
+    Return the playlist resources in a response's "data", or None if the response is malformed.
+    """
+    playlists = response_dict.get("data", [])
+    if not isinstance(playlists, list):
+        logging.error("Unexpected playlists format in response")
+        print("Unexpected response format from Apple Music API.")
+        return None
+    return [item for item in playlists if isinstance(item, dict)]
+
+
+def _date_added(pid: Any, date_added: Any) -> str | None:
+    if not date_added:
+        return None
+    try:
+        return datetime.fromisoformat(date_added).strftime("%d-%m-%Y")
+    except Exception:
+        logging.warning(
+            "Invalid dateAdded format for playlist id %s: %s", pid, date_added
+        )
+        return None
+
+
+def parse_playlists(playlists: List[Dict[str, Any]]) -> List[Playlist]:
+    """
+    Project playlist resources into name/id/dateAdded records, keeping each one's lastModifiedDate.
+    """
+    output: List[Playlist] = []
+    for item in playlists:
+        attributes = item.get("attributes") or {}
+        if not isinstance(attributes, dict):
+            attributes = {}
+        pid = item.get("id")
+        last_modified = attributes.get("lastModifiedDate")
+        output.append(
+            Playlist(
+                attributes.get("name"),
+                pid,
+                _date_added(pid, attributes.get("dateAdded")),
+                last_modified if isinstance(last_modified, str) else None,
+            )
+        )
+
+    return output
+
+
+def _song_attributes(item: Any) -> Dict[str, Any] | None:
+    """
+    Return the attributes of a song resource, or None if the resource or its attributes are missing or malformed.
+
+    An empty attributes object is kept: with a sparse fieldset, a song may have none of the requested attributes.
+    """
+    if not isinstance(item, dict):
+        return None
+    attributes = item.get("attributes")
+    return attributes if isinstance(attributes, dict) else None
+
+
+def parse_library_songs(
+    tracks: List[Dict[str, Any]], catalog_ids: bool = False
+) -> List[Tuple[str, Track]]:
+    """
+    Project library song resources into (library song ID, Track) pairs, like parse_songs.
+    """
+    songs: List[Tuple[str, Track]] = []
+    for item in tracks:
+        attributes = _song_attributes(item)
+        if attributes is None or not item.get("id"):
+            continue
+        songs.append((item["id"], Track.from_attributes(attributes, catalog_ids)))
+    return songs
+
+
+def parse_songs(tracks: List[Dict[str, Any]], catalog_ids: bool = False) -> List[Track]:
+    """
+    Project library song resources into Track records with the SONG_FIELDS keys. Nothing from the raw resources is
+    kept, so each page of the API payload can be freed as soon as it has been parsed.
+
+    :param catalog_ids: Also keep each song's catalog ID, for catalog enrichment.
+    """
+    songs: List[Track] = []
+    for item in tracks:
+        attributes = _song_attributes(item)
+        if attributes is None:
+            continue
+        songs.append(Track.from_attributes(attributes, catalog_ids))
+    return songs
+
+
+class Decoder:
+    """
+    Standard library JSON decoder. Pages are decoded into dictionaries and then projected into records.
+
+    Subclasses swap in faster backends; see get_decoder.
+    """
+
+    name = "json"
+
+    def decode(self, body: bytes | str) -> Any:
+        """
+        :raises ValueError: If the body is not valid JSON.
+        """
+        return json.loads(body)
+
+    def page(
+        self,
+        body: bytes | str,
+        kind: str,
+        catalog_ids: bool = False,
+        include: str | None = None,
+        include_kind: str | None = None,
+    ) -> Page | None:
+        """
+        Decode a page of library songs or playlists straight into records.
+
+        :param kind: One of PAGE_KINDS.
+        :param catalog_ids: Keep each song's catalog ID, for catalog enrichment.
+        :param include: Relationship included in a page of playlists, one of RELATED_KINDS; its pages are decoded into
+            Page.related.
+        :param include_kind: Kind of the included pages, if not the relationship's default, e.g. "ids".
+        :return: The page, or None if the response is malformed.
+        :raises ValueError: If the body is not valid JSON, or the kind is unknown.
+        """
+        if kind not in PAGE_KINDS:
+            raise ValueError(f"Unknown page kind: {kind}")
+        if include is not None and include_kind is None:
+            include_kind = RELATED_KINDS[include]
+        return self._page(self.decode(body), kind, catalog_ids, include, include_kind)
+
+    def _page(
+        self,
+        response_dict: Any,
+        kind: str,
+        catalog_ids: bool = False,
+        include: str | None = None,
+        include_kind: str | None = None,
+    ) -> Page | None:
+        if not isinstance(response_dict, dict):
+            logging.error("Unexpected %s response: %r", kind, type(response_dict))
+            print("Unexpected response format from Apple Music API.")
+            return None
+        related: Dict[str, Page] | None = None
+        if kind == "playlists":
+            resources = playlist_resources(response_dict)
+            if resources is None:
+                return None
+            records: List[Any] = parse_playlists(resources)
+            if include is not None and include_kind is not None:
+                related = self._related(resources, include, include_kind, catalog_ids)
+                if related is None:
+                    return None
+        else:
+            resources = response_dict.get("data", [])
+            if not isinstance(resources, list):
+                logging.error("Unexpected %s format in response", kind)
+                print("Unexpected response format from Apple Music API.")
+                return None
+            if kind == "ids":
+                records = [
+                    item["id"]
+                    for item in resources
+                    if isinstance(item, dict) and item.get("id")
+                ]
+            elif kind == "library-songs":
+                records = parse_library_songs(resources, catalog_ids)
+            else:
+                records = parse_songs(resources, catalog_ids)
+        meta = response_dict.get("meta")
+        total = meta.get("total") if isinstance(meta, dict) else None
+        return Page(
+            records,
+            len(resources),
+            response_dict.get("next"),
+            total if isinstance(total, int) else None,
+            related,
+        )
+
+    def _related(
+        self,
+        resources: List[Dict[str, Any]],
+        include: str,
+        include_kind: str,
+        catalog_ids: bool,
+    ) -> Dict[str, Page] | None:
+        related: Dict[str, Page] = {}
+        for item in resources:
+            relationship = (item.get("relationships") or {}).get(include)
+            if not isinstance(relationship, dict) or not item.get("id"):
+                continue
+            page = self._page(relationship, include_kind, catalog_ids)
+            if page is None:
+                return None
+            related[item["id"]] = page
+        return related
+
+
+class OrjsonDecoder(Decoder):
+    """
+    orjson parses several times faster than the standard library; the projection is the same.
+    """
+
+    name = "orjson"
+
+    def __init__(self) -> None:
+        import orjson
+
+        self._loads: Callable[[bytes | str], Any] = orjson.loads
+
+    def decode(self, body: bytes | str) -> Any:
+        # orjson.JSONDecodeError is a ValueError.
+        return self._loads(body)
+
+
+class MsgspecDecoder(Decoder):
+    """
+    msgspec decodes pages into typed structs holding only the attributes that are exported, without building
+    intermediate dictionaries for the rest of each resource. Responses that do not match the schema are decoded and
+    projected like any other.
+    """
+
+    name = "msgspec"
+
+    def __init__(self) -> None:
+        import msgspec
+
+        schema = _msgspec_schema()
+        self._error = msgspec.DecodeError
+        self._mismatch = msgspec.ValidationError
+        self._decode = msgspec.json.Decoder().decode
+        self._decoders = {
+            kind: msgspec.json.Decoder(schema[kind]).decode for kind in PAGE_KINDS
+        }
+
+    def decode(self, body: bytes | str) -> Any:
+        try:
+            return self._decode(body)
+        except self._error as e:
+            raise ValueError(str(e)) from e
+
+    def page(
+        self,
+        body: bytes | str,
+        kind: str,
+        catalog_ids: bool = False,
+        include: str | None = None,
+        include_kind: str | None = None,
+    ) -> Page | None:
+        if kind not in PAGE_KINDS:
+            raise ValueError(f"Unknown page kind: {kind}")
+        if include is not None and include_kind not in (None, RELATED_KINDS[include]):
+            # The schema types included relationships with their default kind; listings are few pages.
+            return super().page(body, kind, catalog_ids, include, include_kind)
+        try:
+            decoded = self._decoders[kind](body)
+        except self._mismatch:
+            logging.debug(
+                "%s page does not match the schema, decoding it generically", kind
+            )
+            return super().page(body, kind, catalog_ids, include, include_kind)
+        except self._error as e:
+            raise ValueError(str(e)) from e
+
+        if kind == "songs":
+            return self._songs(decoded, catalog_ids)
+        if kind == "library-songs":
+            return self._songs(decoded, catalog_ids, library_ids=True)
+        if kind == "ids":
+            total = decoded.meta.total if decoded.meta is not None else None
+            ids: List[Any] = [item.id for item in decoded.data if item.id]
+            return Page(ids, len(decoded.data), decoded.next, total)
+        records: List[Any] = []
+        related: Dict[str, Page] = {}
+        for item in decoded.data:
+            attributes = item.attributes
+            if attributes is None:
+                records.append(Playlist(None, item.id))
+            else:
+                records.append(
+                    Playlist(
+                        attributes.name,
+                        item.id,
+                        _date_added(item.id, attributes.dateAdded),
+                        attributes.lastModifiedDate,
+                    )
+                )
+            if include is not None and item.relationships is not None and item.id:
+                relationship = getattr(item.relationships, include)
+                if relationship is not None:
+                    related[item.id] = self._songs(relationship, catalog_ids)
+        total = decoded.meta.total if decoded.meta is not None else None
+        return Page(
+            records,
+            len(decoded.data),
+            decoded.next,
+            total,
+            related if include is not None else None,
+        )
+
+    @staticmethod
+    def _songs(decoded: Any, catalog_ids: bool, library_ids: bool = False) -> Page:
+        records: List[Any] = []
+        for item in decoded.data:
+            attributes = item.attributes
+            if attributes is None or (library_ids and not item.id):
+                continue
+            play_params = attributes.playParams if catalog_ids else None
+            track = Track(
+                attributes.name,
+                attributes.artistName,
+                attributes.albumName,
+                attributes.genreNames,
+                attributes.releaseDate,
+                play_params.catalogId if play_params is not None else None,
+            )
+            records.append((item.id, track) if library_ids else track)
+        total = decoded.meta.total if decoded.meta is not None else None
+        return Page(records, len(decoded.data), decoded.next, total)
+
+
+@cache
+def _msgspec_schema() -> Dict[str, Any]:
+    """
+    Build the msgspec structs for song and playlist pages. Attributes that are not listed are skipped while decoding.
+    """
+    import msgspec
+
+    class PlayParams(msgspec.Struct):
+        catalogId: str | None = None
+
+    class SongAttributes(msgspec.Struct):
+        name: str | None = None
+        artistName: str | None = None
+        albumName: str | None = None
+        genreNames: List[str] | None = None
+        releaseDate: str | None = None
+        playParams: PlayParams | None = None
+
+    class Song(msgspec.Struct):
+        attributes: SongAttributes | None = None
+
+    class LibrarySong(Song):
+        id: str | None = None
+
+    class Resource(msgspec.Struct):
+        id: str | None = None
+
+    class PlaylistAttributes(msgspec.Struct):
+        name: str | None = None
+        dateAdded: str | None = None
+        lastModifiedDate: str | None = None
+
+    class Meta(msgspec.Struct):
+        total: int | None = None
+
+    class SongsPage(msgspec.Struct):
+        data: List[Song] = []
+        next: str | None = None
+        meta: Meta | None = None
+
+    class LibrarySongsPage(msgspec.Struct):
+        data: List[LibrarySong] = []
+        next: str | None = None
+        meta: Meta | None = None
+
+    class IdsPage(msgspec.Struct):
+        data: List[Resource] = []
+        next: str | None = None
+        meta: Meta | None = None
+
+    # One attribute per entry of RELATED_KINDS.
+    class PlaylistRelationships(msgspec.Struct):
+        tracks: SongsPage | None = None
+
+    class PlaylistResource(msgspec.Struct):
+        id: str | None = None
+        attributes: PlaylistAttributes | None = None
+        relationships: PlaylistRelationships | None = None
+
+    class PlaylistsPage(msgspec.Struct):
+        data: List[PlaylistResource] = []
+        next: str | None = None
+        meta: Meta | None = None
+
+    return {
+        "songs": SongsPage,
+        "library-songs": LibrarySongsPage,
+        "ids": IdsPage,
+        "playlists": PlaylistsPage,
+    }
+
+
+_DECODERS: Dict[str, Callable[[], Decoder]] = {
+    "msgspec": MsgspecDecoder,
+    "orjson": OrjsonDecoder,
+    "json": Decoder,
+}
+
+
+def available_backends() -> List[str]:
+    """
+    :return: The names of the installed decoding backends, fastest first.
+    """
+    available: List[str] = []
+    for name in BACKENDS:
+        try:
+            get_decoder(name)
+        except ImportError:
+            continue
+        available.append(name)
+    return available
+
+
+@cache
+def get_decoder(name: str | None = None) -> Decoder:
+    """
+    Return the decoder of a backend, created once and shared; decoders are thread-safe.
+
+    :param name: One of BACKENDS. Defaults to the fastest installed backend.
+    :raises ImportError: If the requested backend is not installed.
+    :raises ValueError: If the name is unknown.
+    """
+    if name is not None:
+        if name not in _DECODERS:
+            raise ValueError(f"Unknown JSON backend: {name}")
+        return _DECODERS[name]()
+    for backend in BACKENDS:
+        try:
+            return _DECODERS[backend]()
+        except ImportError:
+            continue
+    return Decoder()
@@ -0,0 +1,281 @@
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Deque, Dict, Iterable, Iterator, List, Tuple
+
+from cli.records import EnrichedTrack, Track
+
+if TYPE_CHECKING:
+    from cli.client import AppleMusicClient
+
+# The catalog songs endpoint accepts at most 300 IDs per request.
+CATALOG_BATCH_SIZE = 300
+DEFAULT_STOREFRONT = "us"
+DEFAULT_CATALOG_TTL_SECONDS = 30 * 24 * 60 * 60
+DEFAULT_ENRICH_WORKERS = 4
+
+# (isrc, durationInMillis, composerName) of a catalog song, or None if the catalog does not have it.
+CatalogFields = Tuple[Any, Any, Any] | None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog_songs (
+    storefront TEXT NOT NULL,
+    id TEXT NOT NULL,
+    fields TEXT,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (storefront, id)
+);
+"""
+
+
+def _catalog_fields(attributes: Dict[str, Any]) -> CatalogFields:
+    composer = attributes.get("composerName")
+    return (
+        attributes.get("isrc"),
+        attributes.get("durationInMillis"),
+        sys.intern(composer) if isinstance(composer, str) else composer,
+    )
+
+
+def get_storefront(client: "AppleMusicClient") -> str | None:
+    """
+    :param client: An AppleMusicClient holding the developer token and Music-User-Token.
+    :return: The storefront of the authenticated user, e.g. "gb", or None if it could not be fetched.
+    """
+    response_dict = client.get("/v1/me/storefront", description="storefront")
+    if response_dict is None:
+        return None
+    data = response_dict.get("data") or []
+    if not data or not isinstance(data[0], dict):
+        return None
+    return data[0].get("id")
+
+
+def get_catalog_songs(
+    client: "AppleMusicClient", storefront: str, catalog_ids: List[str]
+) -> Dict[str, CatalogFields] | None:
+    """
+    Fetch one batch of catalog songs with a single ids= request.
+
+    :param client: An AppleMusicClient holding the developer token.
+    :param storefront: Catalog storefront, e.g. "us".
+    :param catalog_ids: At most CATALOG_BATCH_SIZE catalog song IDs.
+    :return: The fields of every requested ID; IDs the catalog did not return map to None. Returns None if the
+        request fails.
+    """
+    response_dict = client.get(
+        f"/v1/catalog/{storefront}/songs",
+        params={"ids": ",".join(catalog_ids)},
+        description="catalog songs",
+    )
+    if response_dict is None:
+        return None
+
+    found: Dict[str, CatalogFields] = dict.fromkeys(catalog_ids)
+    for item in response_dict.get("data") or []:
+        if isinstance(item, dict) and item.get("id") in found:
+            found[item["id"]] = _catalog_fields(item.get("attributes") or {})
+    return found
+
+
+class CatalogCache:
+    """
+    SQLite store of catalog song fields per storefront, so repeated exports only fetch songs they have not seen
+    within the TTL. Songs the catalog does not have are stored too, so they are not asked for again on every run.
+    """
+
+    def __init__(self, path: Path, ttl: float = DEFAULT_CATALOG_TTL_SECONDS) -> None:
+        """
+        :param path: SQLite database file; created, along with its directory, if it does not exist.
+        :param ttl: Seconds a stored entry is used before it is fetched again.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        # Shared by the enrichment workers; every access goes through the lock.
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "CatalogCache":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def get(self, storefront: str, catalog_id: str) -> Tuple[bool, CatalogFields]:
+        """
+        :return: (True, fields) if a fresh entry is stored for the song, (False, None) otherwise.
+        """
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT fields FROM catalog_songs WHERE storefront = ? AND id = ? AND fetched_at > ?",
+                (storefront, catalog_id, time.time() - self.ttl),
+            ).fetchone()
+        if row is None:
+            return False, None
+        fields = json.loads(row[0]) if row[0] is not None else None
+        return True, _catalog_fields(fields) if isinstance(fields, dict) else None
+
+    def put_many(self, storefront: str, songs: Dict[str, CatalogFields]) -> None:
+        now = time.time()
+        rows = [
+            (
+                storefront,
+                catalog_id,
+                None
+                if fields is None
+                else json.dumps(
+                    dict(zip(("isrc", "durationInMillis", "composerName"), fields))
+                ),
+                now,
+            )
+            for catalog_id, fields in songs.items()
+        ]
+        with self._lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO catalog_songs VALUES (?, ?, ?, ?)", rows
+            )
+
+
+class CatalogEnricher:
+    """
+    Adds catalog fields (ISRC, duration, composer) to library songs as they stream to the file writers.
+
+    Catalog IDs are deduplicated across everything enriched through one instance, including playlists exported
+    concurrently by export-all: each ID is looked up in the CatalogCache, and the missing ones are fetched in batches
+    of CATALOG_BATCH_SIZE on a bounded worker pool. Songs are yielded in their original order once their batch has
+    been fetched; at most batch_size * (workers + 1) songs are buffered per stream.
+    """
+
+    def __init__(
+        self,
+        client: "AppleMusicClient",
+        storefront: str = DEFAULT_STOREFRONT,
+        cache: CatalogCache | None = None,
+        workers: int = DEFAULT_ENRICH_WORKERS,
+        batch_size: int = CATALOG_BATCH_SIZE,
+    ) -> None:
+        """
+        :param client: An AppleMusicClient holding the developer token.
+        :param storefront: Catalog storefront the songs are looked up in.
+        :param cache: Optional on-disk store of previously fetched songs.
+        :param workers: Maximum number of batches fetched at the same time.
+        :param batch_size: Catalog IDs per request.
+        """
+        self.client = client
+        self.storefront = storefront
+        self.cache = cache
+        self.batch_size = batch_size
+        self.max_buffered = batch_size * (workers + 1)
+        self.requests = 0
+        self._songs: Dict[str, CatalogFields] = {}
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="enrich"
+        )
+
+    def __enter__(self) -> "CatalogEnricher":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def _claim(self, catalog_id: str, batch: Future) -> bool:
+        """
+        Resolve a catalog ID from memory or the cache, or claim it for `batch` if nobody is fetching it yet.
+
+        :return: True if the ID was added to the batch.
+        """
+        with self._lock:
+            if catalog_id in self._songs or catalog_id in self._pending:
+                return False
+            if self.cache is not None:
+                found, fields = self.cache.get(self.storefront, catalog_id)
+                if found:
+                    self._songs[catalog_id] = fields
+                    return False
+            self._pending[catalog_id] = batch
+            return True
+
+    def _submit(self, catalog_ids: List[str], batch: Future) -> None:
+        self._executor.submit(self._fetch, catalog_ids, batch)
+
+    def _fetch(self, catalog_ids: List[str], batch: Future) -> None:
+        try:
+            songs = get_catalog_songs(self.client, self.storefront, catalog_ids)
+            if songs is None:
+                logging.warning(
+                    "Failed to fetch %d catalog songs; they are exported without catalog fields",
+                    len(catalog_ids),
+                )
+            elif self.cache is not None:
+                self.cache.put_many(self.storefront, songs)
+            with self._lock:
+                self.requests += 1
+                for catalog_id in catalog_ids:
+                    self._songs[catalog_id] = songs.get(catalog_id) if songs else None
+                    self._pending.pop(catalog_id, None)
+        finally:
+            batch.set_result(None)
+
+    def _ready(self, track: Track) -> bool:
+        with self._lock:
+            return track.catalog_id is None or track.catalog_id in self._songs
+
+    def _wait(self, track: Track) -> None:
+        with self._lock:
+            batch = self._pending.get(track.catalog_id or "")
+        if batch is not None:
+            batch.result()
+
+    def _enriched(self, track: Track) -> EnrichedTrack:
+        with self._lock:
+            fields = self._songs.get(track.catalog_id) if track.catalog_id else None
+        return EnrichedTrack.from_track(track, fields)
+
+    def enrich(self, songs: Iterable[Track]) -> Iterator[EnrichedTrack]:
+        """
+        Yield every song with its catalog fields, in order. Songs need their catalog_id, see Track.from_attributes.
+        """
+        buffered: Deque[Track] = deque()
+        batch_ids: List[str] = []
+        batch: Future = Future()
+        try:
+            for song in songs:
+                buffered.append(song)
+                if song.catalog_id and self._claim(song.catalog_id, batch):
+                    batch_ids.append(song.catalog_id)
+                    if len(batch_ids) >= self.batch_size:
+                        self._submit(batch_ids, batch)
+                        batch_ids, batch = [], Future()
+
+                while buffered and (
+                    self._ready(buffered[0]) or len(buffered) > self.max_buffered
+                ):
+                    if batch_ids and not self._ready(buffered[0]):
+                        # The oldest song may be waiting on this stream's unsent batch.
+                        self._submit(batch_ids, batch)
+                        batch_ids, batch = [], Future()
+                    self._wait(buffered[0])
+                    yield self._enriched(buffered.popleft())
+        finally:
+            # Other streams may be waiting on IDs claimed by this one, so the batch is sent even if the songs failed.
+            if batch_ids:
+                self._submit(batch_ids, batch)
+
+        while buffered:
+            self._wait(buffered[0])
+            yield self._enriched(buffered.popleft())
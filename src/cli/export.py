@@ -0,0 +1,1230 @@
+from __future__ import annotations
+
+import json
+import logging
+import re
+import sqlite3
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from itertools import chain, islice
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Sequence,
+    Tuple,
+)
+
+from cli.batch import Account, fair_map
+from cli.checkpoint import ExportCheckpoint
+from cli.decoding import Page
+from cli.file_output import (
+    COMPRESSION_SUFFIXES,
+    is_compressed,
+    write_fanout,
+    write_library_to_sqlite,
+    write_memberships_to_sqlite,
+    write_songs_to_csv,
+    write_songs_to_json,
+    write_songs_to_jsonl,
+    write_songs_to_sqlite,
+)
+from cli.playlist_index import PlaylistIndex, normalise_name
+from cli.records import Playlist, Track, as_dict
+from cli.state import SyncState, track_hash, track_key
+
+# Like cli.main, this module is imported at startup, so the HTTP stack is only imported for type checking.
+if TYPE_CHECKING:
+    from cli.client import AppleMusicClient
+    from cli.enrich import CatalogEnricher
+
+SQLITE_LIBRARY_FILENAME = "library.sqlite"
+OUTPUT_FORMATS = ("json", "jsonl", "csv", "sqlite")
+SONG_FIELDS = ("name", "artistName", "albumName", "genreNames", "releaseDate")
+ENRICHED_SONG_FIELDS = SONG_FIELDS + (
+    "catalogId",
+    "isrc",
+    "durationInMillis",
+    "composerName",
+)
+# Largest page the API returns for library playlists and playlist tracks; every page is requested at this size.
+PAGE_LIMIT = 100
+PLAYLISTS_PATH = "/v1/me/library/playlists"
+LIBRARY_SONGS_PATH = "/v1/me/library/songs"
+# library-export only needs the IDs of playlist tracks, which every resource carries. The API has no empty sparse
+# fieldset, so the shortest attribute is requested.
+TRACK_ID_FIELDS = "name"
+
+
+class PlaylistFetchError(RuntimeError):
+    pass
+
+
+def iter_pages(
+    client: AppleMusicClient,
+    path: str | None,
+    kind: str,
+    params: Dict[str, Any] | None = None,
+    catalog_ids: bool = False,
+    include: str | None = None,
+    include_kind: str | None = None,
+) -> Iterator[Page]:
+    """
+    Lazily walk a paginated listing of library songs or playlists, following the "next" cursor. Each page is only
+    requested once the previous one has been consumed, so callers can stop early without fetching the rest.
+
+    :param path: Path of the first page, e.g. the "next" cursor of a page already fetched; None yields nothing.
+    :param kind: Kind of the pages, see AppleMusicClient.get_page.
+    :param params: Query parameters sent with every page.
+    :param catalog_ids: Keep each song's catalog ID, for catalog enrichment.
+    :param include: Relationship fetched along with each playlist in the same request, e.g. "tracks"; its first page
+        is in Page.related.
+    :param include_kind: Kind of the included pages, if not the relationship's default.
+    :raises PlaylistFetchError: If a page fails to load.
+    """
+    while path:
+        page = client.get_page(path, kind, params, catalog_ids, include, include_kind)
+        if page is None:
+            raise PlaylistFetchError(f"Failed to fetch {path}")
+        yield page
+        path = page.next
+
+
+def get_all_playlists(client: AppleMusicClient) -> List[Playlist] | None:
+    """
+    Retrieve all Apple Music library playlists for the authenticated user, following the "next" cursor until every
+    page of the listing has been fetched.
+
+    Sends GET requests to the Apple Music API endpoint for the current user's library playlists
+    using the client's developer token and Music-User-Token.
+
+    :param client: An AppleMusicClient holding the developer token and Music-User-Token.
+    :return: On success, returns a list of Playlist records, read-only mappings with the following keys:
+        - "name": str | None, playlist name
+        - "id": str | None, playlist identifier
+        - "dateAdded": str | None, date the playlist was added formatted as "DD-MM-YYYY"
+    Returns None if an error occurs; prints a short message describing common HTTP/errors
+    before returning None.
+    """
+    output: List[Playlist] = []
+    try:
+        for page in iter_pages(
+            client, PLAYLISTS_PATH, "playlists", {"limit": PAGE_LIMIT}
+        ):
+            output.extend(page.records)
+    except PlaylistFetchError:
+        return None
+    logging.info("Got all playlists")
+
+    return output
+
+
+def resolve_playlist_name(
+    client: AppleMusicClient, index: PlaylistIndex, name: str
+) -> str | None:
+    """
+    Resolve a playlist name to its library playlist ID.
+
+    A fresh index answers without any API call. Otherwise the playlist listing is fetched page by page and merged into
+    the index, stopping at the first page with a playlist of exactly that (case-insensitive) name; a listing that runs
+    to the end replaces the index and restarts its staleness window.
+
+    :param client: An AppleMusicClient holding the developer token and Music-User-Token.
+    :param index: The PlaylistIndex to look the name up in and update.
+    :param name: Playlist name, or the start of one.
+    :return: The playlist ID, or None if no playlist matches or the listing fails.
+    :raises AmbiguousPlaylistName: If the name matches several playlists.
+    """
+    if not index.is_stale():
+        playlist_id = index.resolve(name)
+        if playlist_id is not None:
+            return playlist_id
+
+    key = normalise_name(name)
+    listed: List[Playlist] = []
+    pages = iter_pages(client, PLAYLISTS_PATH, "playlists", {"limit": PAGE_LIMIT})
+    try:
+        for page in pages:
+            listed.extend(page.records)
+            if page.next and any(
+                normalise_name(p.name or "") == key for p in page.records
+            ):
+                logging.info("Found playlist %r without a full listing", name)
+                index.update(listed)
+                return index.resolve(name)
+    except PlaylistFetchError:
+        return None
+
+    index.update(listed, complete=True)
+    return index.resolve(name)
+
+
+def get_playlist_by_id(
+    client: AppleMusicClient, playlist_id: str
+) -> List[Playlist] | None:
+    """
+    Retrieve a specified playlist for the authenticated user.
+
+    :param client: An AppleMusicClient holding the developer token and Music-User-Token.
+    :param playlist_id: Apple Music library playlist ID
+    """
+    page = client.get_page(f"/v1/me/library/playlists/{playlist_id}", "playlists")
+    if page is None:
+        return None
+    logging.info("Found playlist")
+
+    return page.records
+
+
+def get_playlist_with_tracks(
+    client: AppleMusicClient,
+    playlist_id: str,
+    fields: Sequence[str] = SONG_FIELDS,
+    catalog_ids: bool = False,
+) -> Tuple[Playlist, Page | None] | None:
+    """
+    Retrieve a playlist together with the first page of its tracks, in a single request with include=tracks.
+
+    :param client: An AppleMusicClient holding the developer token and Music-User-Token.
+    :param playlist_id: Apple Music library playlist ID
+    :param fields: Song keys to fetch, see song_params.
+    :param catalog_ids: Keep each song's catalog ID, for catalog enrichment.
+    :return: The playlist and the first page of its tracks, to continue with iter_songs_in_playlist. The page is None
+        if the response did not include the tracks. Returns None if the playlist could not be fetched.
+    """
+    params = song_params(fields, catalog_ids)
+    del params["limit"]
+    page = client.get_page(
+        f"/v1/me/library/playlists/{playlist_id}",
+        "playlists",
+        params,
+        catalog_ids,
+        include="tracks",
+    )
+    if page is None or not page.records:
+        return None
+    logging.info("Found playlist")
+
+    return page.records[0], (page.related or {}).get(playlist_id)
+
+
+def song_params(
+    fields: Sequence[str] = SONG_FIELDS, catalog_ids: bool = False
+) -> Dict[str, Any]:
+    """
+    Query parameters for a page of playlist tracks: the largest page size and a sparse fieldset, so the API only
+    returns the attributes that are exported instead of full library-song resources.
+
+    :param fields: Song keys to fetch; keys that are not library-song attributes (the catalog fields) are skipped.
+    :param catalog_ids: Also fetch playParams, which hold the catalog ID used for catalog enrichment.
+    """
+    attributes = [field for field in fields if field in SONG_FIELDS]
+    if catalog_ids:
+        attributes.append("playParams")
+    return {"limit": PAGE_LIMIT, "fields[library-songs]": ",".join(attributes)}
+
+
+def _fetch_remaining_pages(
+    client: AppleMusicClient,
+    path: str,
+    page_size: int,
+    total: int,
+    concurrency: int,
+    catalog_ids: bool = False,
+    start: int = 0,
+    params: Dict[str, Any] | None = None,
+    kind: str = "songs",
+) -> Iterator[Page]:
+    """
+    Fetch every page after the first by "offset" window on a bounded thread pool, yielding the pages in playlist
+    order. At most 2 * concurrency pages are held in memory at once.
+
+    :param start: Offset of the first page.
+    :param params: Query parameters sent with every page, see song_params.
+    :param kind: Kind of the pages, e.g. "library-songs".
+    :raises PlaylistFetchError: If any page fails to load.
+    """
+    offsets = iter(range(start + page_size, total, page_size))
+
+    def _fetch(offset: int) -> Page | None:
+        return client.get_page(
+            path,
+            kind,
+            params={**(params or {}), "offset": offset, "limit": page_size},
+            catalog_ids=catalog_ids,
+        )
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        window: Deque[Future] = deque(
+            executor.submit(_fetch, offset)
+            for offset in islice(offsets, concurrency * 2)
+        )
+        while window:
+            page = window.popleft().result()
+            if page is None:
+                for future in window:
+                    future.cancel()
+                raise PlaylistFetchError(f"Failed to fetch a page of {path}")
+            for offset in islice(offsets, 1):
+                window.append(executor.submit(_fetch, offset))
+
+            logging.info("Fetched %d tracks", page.size)
+            yield page
+
+
+def iter_songs_in_playlist(
+    client: AppleMusicClient,
+    playlist_id: str,
+    concurrency: int = 1,
+    catalog_ids: bool = False,
+    start: int = 0,
+    fields: Sequence[str] = SONG_FIELDS,
+    first: Page | None = None,
+) -> Iterator[List[Track]]:
+    """
+    Yield the songs of the specified playlist one page at a time, so callers can write them out without holding the
+    whole playlist in memory.
+
+    With a concurrency of 1 the "next" cursor is followed one page at a time. With a higher concurrency the first
+    page reveals the page size and total track count, and the remaining offset windows are fetched in parallel and
+    yielded in playlist order. Falls back to following the cursor when the total is unknown.
+
+    :param client: An AppleMusicClient holding the developer token and Music-User-Token.
+    :param playlist_id: Apple Music library playlist ID
+    :param concurrency: Maximum number of pages fetched at the same time.
+    :param catalog_ids: Keep each song's catalog ID, for catalog enrichment.
+    :param start: Skip the playlist's first `start` songs, e.g. to resume an interrupted export.
+    :param fields: Song keys to fetch; the other attributes are left out of the API responses and are None.
+    :param first: The first page of tracks, if it has already been fetched along with the playlist (see
+        get_playlist_with_tracks); only the pages after it are requested.
+    :return: An iterator of lists of Track records, read-only mappings with the SONG_FIELDS keys.
+    :raises PlaylistFetchError: If any page fails to load.
+    """
+    pages = _iter_playlist_pages(
+        client, playlist_id, concurrency, catalog_ids, start, fields, first
+    )
+    return (page.records for page in pages)
+
+
+def _iter_playlist_pages(
+    client: AppleMusicClient,
+    playlist_id: str,
+    concurrency: int = 1,
+    catalog_ids: bool = False,
+    start: int = 0,
+    fields: Sequence[str] = SONG_FIELDS,
+    first: Page | None = None,
+) -> Iterator[Page]:
+    return _iter_song_pages(
+        client,
+        f"/v1/me/library/playlists/{playlist_id}/tracks",
+        "songs",
+        song_params(fields, catalog_ids),
+        concurrency,
+        catalog_ids,
+        start,
+        first,
+    )
+
+
+def iter_library_songs(
+    client: AppleMusicClient, concurrency: int = 1
+) -> Iterator[List[Tuple[str, Track]]]:
+    """
+    Yield the songs of the authenticated user's library one page at a time, paginated like iter_songs_in_playlist.
+
+    :param client: An AppleMusicClient holding the developer token and Music-User-Token.
+    :param concurrency: Maximum number of pages fetched at the same time.
+    :return: An iterator of lists of (library song ID, song) pairs.
+    :raises PlaylistFetchError: If any page fails to load.
+    """
+    pages = _iter_song_pages(
+        client, LIBRARY_SONGS_PATH, "library-songs", song_params(), concurrency
+    )
+    return (page.records for page in pages)
+
+
+def _iter_song_pages(
+    client: AppleMusicClient,
+    path: str,
+    kind: str,
+    params: Dict[str, Any],
+    concurrency: int = 1,
+    catalog_ids: bool = False,
+    start: int = 0,
+    first: Page | None = None,
+) -> Iterator[Page]:
+    page = first
+    if page is None:
+        page = client.get_page(
+            path,
+            kind,
+            params={**params, "offset": start} if start else params,
+            catalog_ids=catalog_ids,
+        )
+        if page is None:
+            raise PlaylistFetchError(f"Failed to fetch {path}")
+    logging.info("Fetched %d tracks", page.size)
+    yield page
+
+    if concurrency > 1 and page.next and page.total is not None and page.size:
+        yield from _fetch_remaining_pages(
+            client,
+            path,
+            page.size,
+            page.total,
+            concurrency,
+            catalog_ids,
+            start,
+            params,
+            kind,
+        )
+        return
+
+    for next_page in iter_pages(client, page.next, kind, params, catalog_ids):
+        logging.info("Fetched %d tracks", next_page.size)
+        yield next_page
+
+
+def get_songs_in_playlist(
+    client: AppleMusicClient, playlist_id: str, concurrency: int = 1
+) -> List[Track] | None:
+    """
+    Gets every song from the specified playlist. See iter_songs_in_playlist for the pagination modes.
+
+    :param client: An AppleMusicClient holding the developer token and Music-User-Token.
+    :param playlist_id: Apple Music library playlist ID
+    :param concurrency: Maximum number of pages fetched at the same time.
+    :return: List of song records, or None if any page fails to load.
+    """
+    songs: List[Track] = []
+    try:
+        for page in iter_songs_in_playlist(client, playlist_id, concurrency):
+            songs.extend(page)
+    except PlaylistFetchError:
+        logging.exception("Failed to fetch songs")
+        return None
+    return songs
+
+
+def parse_formats(fmt: str) -> List[str]:
+    """
+    Split a --format value such as "json,csv" into its formats, lower-cased and without duplicates.
+    """
+    formats: List[str] = []
+    for part in fmt.split(","):
+        part = part.strip().lower()
+        if part and part not in formats:
+            formats.append(part)
+    return formats
+
+
+def parse_fields(value: str, enrich: bool = False) -> List[str] | None:
+    """
+    Split a --fields value such as "name,artistName" into song keys, matched case-insensitively and without
+    duplicates. The catalog fields of ENRICHED_SONG_FIELDS are only available with enrich.
+
+    :return: The fields in the given order, or None if one is unknown.
+    """
+    available = ENRICHED_SONG_FIELDS if enrich else SONG_FIELDS
+    by_name = {field.lower(): field for field in available}
+    fields: List[str] = []
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        field = by_name.get(part.lower())
+        if field is None:
+            print(f"Unknown field: {part}. Available fields: {', '.join(available)}")
+            return None
+        if field not in fields:
+            fields.append(field)
+    if not fields:
+        print(f"No fields given. Available fields: {', '.join(available)}")
+        return None
+    return fields
+
+
+def output_files(
+    output_file: str, formats: Sequence[str], compression: str | None = None
+) -> Dict[str, str]:
+    """
+    Map each output format to the file it is written to.
+
+    A single format is written to output_file itself. With several, output_file is a base name: its format
+    extension, if any, is replaced by each format's own, e.g. "out.json" with json and csv gives "out.json" and
+    "out.csv". With a compression, its suffix (.gz or .zst) is appended to every file except SQLite databases.
+    """
+    suffix = COMPRESSION_SUFFIXES[compression] if compression else ""
+
+    def _compressed(fmt: str, path: str) -> str:
+        return path if fmt == "sqlite" or path.endswith(suffix) else path + suffix
+
+    if len(formats) == 1:
+        return {formats[0]: _compressed(formats[0], output_file)}
+    base = output_file
+    if suffix and base.endswith(suffix):
+        base = base[: -len(suffix)]
+    extension = Path(base).suffix
+    if extension[1:].lower() in OUTPUT_FORMATS:
+        base = base[: -len(extension)]
+    return {fmt: _compressed(fmt, f"{base}.{fmt}") for fmt in formats}
+
+
+def open_writers(
+    outputs: Mapping[str, str],
+    fieldnames: Sequence[str] | None = None,
+    playlist_id: str | None = None,
+    playlist_name: str | None = None,
+    start: int = 0,
+    columns: Sequence[str] | None = None,
+) -> List[Callable[[Iterable[Mapping[str, Any]]], int]] | None:
+    """
+    Build a writer for every format -> file in outputs. The "sqlite" format is only available when a playlist_id is
+    given.
+
+    :param fieldnames: CSV header. Defaults to the keys of the first row.
+    :param start: Number of rows already in the files; the writers append after them.
+    :param columns: Only write these keys, in this order, to JSON, JSON Lines and CSV files. SQLite exports keep
+        their fixed schema.
+    :return: The writers, or None if a format is unknown.
+    """
+    writers: List[Callable[[Iterable[Mapping[str, Any]]], int]] = []
+    for fmt, path in outputs.items():
+        if fmt == "json":
+            writers.append(
+                partial(
+                    write_songs_to_json,
+                    output_file=path,
+                    start=start,
+                    fieldnames=columns,
+                )
+            )
+        elif fmt == "jsonl":
+            writers.append(
+                partial(
+                    write_songs_to_jsonl,
+                    output_file=path,
+                    start=start,
+                    fieldnames=columns,
+                )
+            )
+        elif fmt == "csv":
+            writers.append(
+                partial(
+                    write_songs_to_csv,
+                    output_file=path,
+                    fieldnames=columns or fieldnames,
+                    start=start,
+                )
+            )
+        elif fmt == "sqlite" and playlist_id is not None:
+            writers.append(
+                partial(
+                    write_songs_to_sqlite,
+                    output_file=path,
+                    playlist_id=playlist_id,
+                    playlist_name=playlist_name,
+                    start=start,
+                )
+            )
+        else:
+            print(f"Unknown format: {fmt}")
+            return None
+    return writers
+
+
+def write_output(
+    data: Iterable[Mapping[str, Any]] | None,
+    fmt: str,
+    output_file: str,
+    fieldnames: Sequence[str] | None = None,
+    compression: str | None = None,
+) -> int | None:
+    """
+    Write data to output_file in the requested format, consuming it one row at a time.
+
+    :param fmt: Output format, or several separated by commas; every format is written from the same pass over the
+        data, see output_files for the file names.
+    :param fieldnames: Fixed CSV header. Defaults to the keys of the first row.
+    :param compression: "gzip" or "zstd" to compress the files as they are written.
+    :return: The number of rows written, or None if nothing could be written.
+    """
+    if data is None:
+        print("No data to write.")
+        return None
+    formats = parse_formats(fmt)
+    if not formats:
+        print(f"Unknown format: {fmt}")
+        return None
+    writers = open_writers(output_files(output_file, formats, compression), fieldnames)
+    if writers is None:
+        return None
+    return write_fanout(data, writers)[0]
+
+
+def export_songs(
+    client: AppleMusicClient,
+    playlist_id: str,
+    fmt: str,
+    output_file: str,
+    concurrency: int = 1,
+    playlist_name: str | None = None,
+    enricher: CatalogEnricher | None = None,
+    compression: str | None = None,
+    resume: bool = False,
+    fields: Sequence[str] | None = None,
+) -> int | None:
+    """
+    Stream the songs of a playlist straight into an output file, page by page.
+
+    With the "sqlite" format the songs are added to a (possibly shared) export database instead, under the given
+    playlist ID and name. Uncompressed exports are checkpointed after every page, see ExportCheckpoint.
+
+    :param fmt: Output format, or several separated by commas. The playlist is fetched once and written to every
+        format at the same time, see output_files for the file names.
+    :param enricher: Adds the ENRICHED_SONG_FIELDS catalog fields to every song.
+    :param compression: "gzip" or "zstd" to compress the files as they are written.
+    :param resume: Continue an interrupted export from its checkpoint, appending to the partial files.
+    :param fields: Columns to export, in order, see export_songs_to.
+    :return: The number of songs in the files, or None if the playlist could not be fully fetched.
+    """
+    outputs = output_files(output_file, parse_formats(fmt), compression)
+    if any(is_compressed(path) for path in outputs.values()):
+        if resume:
+            print("--resume is not supported for compressed exports.")
+            return None
+        return export_songs_to(
+            client,
+            playlist_id,
+            outputs,
+            concurrency,
+            playlist_name,
+            enricher,
+            fields=fields,
+        )
+
+    checkpoint = ExportCheckpoint(
+        playlist_id,
+        outputs,
+        fields or (SONG_FIELDS if enricher is None else ENRICHED_SONG_FIELDS),
+    )
+    resume_at = checkpoint.resume_point() if resume else (0, 0)
+    if resume_at is None:
+        return None
+    start, offset = resume_at
+    return export_songs_to(
+        client,
+        playlist_id,
+        outputs,
+        concurrency,
+        playlist_name,
+        enricher,
+        start,
+        checkpoint,
+        fields,
+        offset=offset,
+    )
+
+
+def export_songs_to(
+    client: AppleMusicClient,
+    playlist_id: str,
+    outputs: Mapping[str, str],
+    concurrency: int = 1,
+    playlist_name: str | None = None,
+    enricher: CatalogEnricher | None = None,
+    start: int = 0,
+    checkpoint: ExportCheckpoint | None = None,
+    fields: Sequence[str] | None = None,
+    first: Page | None = None,
+    offset: int | None = None,
+) -> int | None:
+    """
+    Stream the songs of a playlist into several output files at once, from a single fetch.
+
+    SQLite exports store the playlist's name. Without a playlist_name, the playlist is fetched together with its first
+    page of tracks (see get_playlist_with_tracks), so the name costs no extra request.
+
+    :param outputs: Output file of each format, e.g. {"json": "out.json", "csv": "out.csv.gz"}.
+    :param start: Number of songs already in the files; the rest of the playlist is appended after them.
+    :param checkpoint: Saved after every page and removed once the export completes.
+    :param fields: Columns to export, in order, e.g. from parse_fields. Only these attributes are requested from the
+        API, except for SQLite exports, which always store every SONG_FIELDS column. Defaults to SONG_FIELDS, plus
+        the catalog fields with an enricher.
+    :param first: The playlist's first page of tracks, if it has already been fetched, e.g. included in the playlist
+        listing.
+    :param offset: API offset to fetch the rest of the playlist from. Defaults to start; it is larger once the
+        decoder has skipped entries before it, see ExportCheckpoint.
+    :return: The number of songs in the files, or None if the playlist could not be fully fetched or written.
+    """
+    fieldnames: Sequence[str] = (
+        SONG_FIELDS if enricher is None else ENRICHED_SONG_FIELDS
+    )
+    requested = _requested_fields(outputs, fields)
+    if first is None and start == 0 and playlist_name is None and "sqlite" in outputs:
+        fetched = get_playlist_with_tracks(
+            client, playlist_id, requested, enricher is not None
+        )
+        if fetched is None:
+            return None
+        playlist, first = fetched
+        playlist_name = playlist.name
+    writers = open_writers(
+        outputs, fieldnames, playlist_id, playlist_name, start, columns=fields
+    )
+    if not writers:
+        return None
+    if offset is None:
+        offset = start
+    pages: Iterable[Page] = _iter_playlist_pages(
+        client,
+        playlist_id,
+        concurrency,
+        catalog_ids=enricher is not None,
+        start=offset,
+        fields=requested,
+        first=first,
+    )
+    if checkpoint is not None:
+        pages = checkpoint.track(pages, start, offset)
+    songs: Iterable[Track] = chain.from_iterable(page.records for page in pages)
+    if enricher is not None:
+        songs = enricher.enrich(songs)
+
+    def _write(rows: Iterable[Track]) -> int:
+        return write_fanout(rows, writers)[0]
+
+    try:
+        if client.metrics is not None:
+            # Time spent waiting for the next page is network time, not write time.
+            name = ", ".join(Path(path).name for path in outputs.values())
+            count = client.metrics.measure_consumer("write", name, _write, songs)
+        else:
+            count = _write(songs)
+    except (OSError, RuntimeError, sqlite3.Error):
+        # A page failed to load (PlaylistFetchError) or a writer failed, e.g. on a full disk or a locked shared
+        # database; either only fails this playlist, so export-all and batch runs carry on with the others.
+        logging.exception("Failed to export playlist %s", playlist_id)
+        return None
+    if checkpoint is not None:
+        checkpoint.remove()
+    return count
+
+
+def _requested_fields(
+    formats: Iterable[str], fields: Sequence[str] | None
+) -> Sequence[str]:
+    """
+    Song keys to request from the API for an export: the selected fields, or every SONG_FIELDS column for SQLite.
+    """
+    return SONG_FIELDS if fields is None or "sqlite" in formats else fields
+
+
+def _playlist_filename(playlist: Mapping[str, Any], fmt: str) -> str:
+    """
+    Build a filesystem-safe, unique file name for a playlist export.
+    """
+    name = re.sub(r"[^\w\- ]", "_", playlist.get("name") or "").strip()
+    pid = playlist["id"]
+    return f"{name} ({pid}).{fmt}" if name else f"{pid}.{fmt}"
+
+
+def playlist_files(
+    playlist: Mapping[str, Any], fmt: str, compression: str | None = None
+) -> Dict[str, str]:
+    """
+    File name of each format an export-all writes a playlist to. SQLite exports share one database so playlists can
+    be searched together.
+    """
+    suffix = COMPRESSION_SUFFIXES[compression] if compression else ""
+    return {
+        kind: (
+            SQLITE_LIBRARY_FILENAME
+            if kind == "sqlite"
+            else _playlist_filename(playlist, kind) + suffix
+        )
+        for kind in parse_formats(fmt)
+    }
+
+
+def manifest_entry(playlist: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Manifest entry of a playlist, marked as failed until record_export fills it in.
+    """
+    return {
+        "id": playlist["id"],
+        "name": playlist.get("name"),
+        "file": None,
+        "tracks": 0,
+        "status": "failed",
+    }
+
+
+def record_export(entry: Dict[str, Any], files: Mapping[str, str], count: int) -> None:
+    """
+    Mark a manifest entry as exported to `files` with `count` tracks.
+    """
+    filenames = list(files.values())
+    entry["file"] = filenames[0]
+    if len(filenames) > 1:
+        entry["files"] = filenames
+    entry["tracks"] = count
+    entry["status"] = "ok"
+
+
+def export_all_playlists(
+    client: AppleMusicClient,
+    output_dir: str,
+    fmt: str = "json",
+    workers: int = 4,
+    concurrency: int = 1,
+    enricher: CatalogEnricher | None = None,
+    compression: str | None = None,
+    fields: Sequence[str] | None = None,
+) -> List[Dict[str, Any]] | None:
+    """
+    Export the tracks of every library playlist, one output file per playlist, on a bounded worker pool.
+
+    The playlist listing is requested with include=tracks, so each playlist's first page of tracks arrives with the
+    listing instead of in a request of its own. Listing pages are fetched as the workers free up, so at most one
+    page of the listing and 2 * workers queued playlists are held in memory.
+
+    A manifest.json describing every playlist and its output file is written alongside the exports. With several
+    formats each entry also lists all of its files under "files".
+
+    :param client: An AppleMusicClient holding the developer token and Music-User-Token.
+    :param output_dir: Directory to write the playlist files and manifest into.
+    :param fmt: Output file format for each playlist, or several separated by commas.
+    :param workers: Maximum number of playlists exported at the same time.
+    :param concurrency: Maximum number of pages fetched at the same time per playlist.
+    :param enricher: Adds catalog fields to every song; shared by all playlists, so each catalog song is fetched once.
+    :param compression: "gzip" or "zstd" to compress the files as they are written.
+    :param fields: Columns to export, in order, see export_songs_to.
+    :return: The manifest entries, or None if the playlist listing could not be fetched; playlists already exported
+        keep their files, but no manifest is written.
+    """
+    directory = Path(output_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    pages = iter_pages(
+        client,
+        PLAYLISTS_PATH,
+        "playlists",
+        song_params(
+            _requested_fields(parse_formats(fmt), fields), enricher is not None
+        ),
+        catalog_ids=enricher is not None,
+        include="tracks",
+    )
+
+    def _export(playlist: Playlist, first: Page | None) -> Dict[str, Any]:
+        entry = manifest_entry(playlist)
+        files = playlist_files(playlist, fmt, compression)
+        count = export_songs_to(
+            client,
+            playlist["id"],
+            {kind: str(directory / name) for kind, name in files.items()},
+            concurrency,
+            playlist.get("name"),
+            enricher,
+            fields=fields,
+            first=first,
+        )
+        if count is None:
+            logging.error("Failed to export playlist %s", playlist["id"])
+            return entry
+
+        record_export(entry, files, count)
+        logging.info("Exported playlist %s (%d tracks)", playlist["id"], count)
+        return entry
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            manifest = list(
+                _map_bounded(executor, _export, _with_included(pages), workers * 2)
+            )
+    except PlaylistFetchError:
+        logging.exception("Failed to list playlists")
+        return None
+
+    (directory / "manifest.json").write_text(
+        json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8"
+    )
+    return manifest
+
+
+def export_library(
+    client: AppleMusicClient,
+    output_file: str,
+    workers: int = 4,
+    concurrency: int = 1,
+) -> Dict[str, Any] | None:
+    """
+    Export the whole library into a SQLite database with a single crawl of the library songs, instead of fetching the
+    songs of every playlist.
+
+    The library songs are paged through once and each one is stored once. The playlists are then listed with
+    include=tracks and only the IDs of their tracks are fetched, on a pool of `workers`; their memberships are joined
+    to the stored songs locally (see write_memberships_to_sqlite). Requests grow with the size of the library rather
+    than with the sum of the playlist sizes, which matters when songs appear in many playlists.
+
+    :param client: An AppleMusicClient holding the developer token and Music-User-Token.
+    :param output_file: SQLite database to write; see write_songs_to_sqlite for its tables.
+    :param workers: Maximum number of playlists whose tracks are fetched at the same time.
+    :param concurrency: Maximum number of library song pages fetched at the same time.
+    :return: A summary with the number of "songs", the "playlists" (one manifest entry each, with the number of tracks
+        and a status of "ok" or "failed") and the number of playlist tracks "missing" from the library songs. Returns
+        None if the library songs or the playlist listing could not be fetched.
+    """
+    try:
+        songs = write_library_to_sqlite(
+            chain.from_iterable(iter_library_songs(client, concurrency)), output_file
+        )
+    except PlaylistFetchError:
+        logging.exception("Failed to export the library songs")
+        return None
+    logging.info("Exported %d library songs", songs)
+
+    params = {"limit": PAGE_LIMIT, "fields[library-songs]": TRACK_ID_FIELDS}
+    pages = iter_pages(
+        client,
+        PLAYLISTS_PATH,
+        "playlists",
+        params,
+        include="tracks",
+        include_kind="ids",
+    )
+
+    def _track_ids(
+        playlist: Playlist, first: Page | None
+    ) -> Tuple[Playlist, List[str] | None]:
+        track_ids: List[str] = []
+        path: str | None = f"{PLAYLISTS_PATH}/{playlist['id']}/tracks"
+        if first is not None:
+            track_ids.extend(first.records)
+            path = first.next
+        try:
+            for page in iter_pages(client, path, "ids", params):
+                track_ids.extend(page.records)
+        except PlaylistFetchError:
+            logging.exception(
+                "Failed to fetch the tracks of playlist %s", playlist["id"]
+            )
+            return playlist, None
+        return playlist, track_ids
+
+    entries: List[Dict[str, Any]] = []
+
+    def _memberships(
+        results: Iterable[Tuple[Playlist, List[str] | None]],
+    ) -> Iterator[Tuple[str, str | None, List[str]]]:
+        for playlist, track_ids in results:
+            entry = manifest_entry(playlist)
+            entries.append(entry)
+            if track_ids is None:
+                continue
+            entry["tracks"] = len(track_ids)
+            entry["status"] = "ok"
+            yield playlist["id"], playlist.get("name"), track_ids
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            missing = write_memberships_to_sqlite(
+                _memberships(
+                    _map_bounded(
+                        executor, _track_ids, _with_included(pages), workers * 2
+                    )
+                ),
+                output_file,
+            )
+    except PlaylistFetchError:
+        logging.exception("Failed to list playlists")
+        return None
+    if missing:
+        logging.warning("%d playlist tracks are not in the library songs", missing)
+    return {"songs": songs, "playlists": entries, "missing": missing}
+
+
+def export_accounts(
+    clients: Mapping[str, AppleMusicClient],
+    accounts: Sequence[Account],
+    fmt: str = "json",
+    workers: int = 4,
+    concurrency: int = 1,
+    compression: str | None = None,
+    fields: Sequence[str] | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Export every library playlist of several user accounts, like export_all_playlists for each of them, on one
+    shared worker pool.
+
+    Playlists are scheduled fairly across the accounts (see cli.batch.fair_map): a free worker takes the next
+    playlist of the account with the fewest playlists being exported, so a large library cannot starve the others.
+    Each account's listing is paged through as its playlists are scheduled, and a failed listing only stops that
+    account. Every account directory gets its own manifest.json.
+
+    :param clients: Client of each account, by account name, holding its Music-User-Token and rate limiter. Accounts
+        without a client (e.g. because their token could not be read) are reported as failed.
+    :param accounts: The accounts to export, e.g. from cli.batch.load_accounts.
+    :param workers: Maximum number of playlists exported at the same time, across all accounts.
+    :return: A summary of each account, in the order given: its status ("ok", "partial" if some playlists failed,
+        or "failed"), numbers of playlists, failed playlists and tracks, and the seconds until it was done.
+    """
+    started = time.monotonic()
+    params = song_params(_requested_fields(parse_formats(fmt), fields))
+    summaries: Dict[str, Dict[str, Any]] = {
+        account.name: {
+            "name": account.name,
+            "output": str(account.output_dir),
+            "status": "failed",
+            "playlists": 0,
+            "failed": 0,
+            "tracks": 0,
+            "seconds": 0.0,
+        }
+        for account in accounts
+    }
+    manifests: Dict[str, List[Dict[str, Any]]] = {}
+
+    def _playlists(
+        account: Account,
+    ) -> Iterator[Tuple[Account, Dict[str, Any], Page | None]]:
+        account.output_dir.mkdir(parents=True, exist_ok=True)
+        manifest: List[Dict[str, Any]] = []
+        pages = iter_pages(
+            clients[account.name], PLAYLISTS_PATH, "playlists", params, include="tracks"
+        )
+        try:
+            for playlist, first in _with_included(pages):
+                entry = manifest_entry(playlist)
+                manifest.append(entry)
+                yield account, entry, first
+        except PlaylistFetchError:
+            logging.exception(
+                "Failed to list the playlists of account %s", account.name
+            )
+            return
+        manifests[account.name] = manifest
+
+    def _export(
+        account: Account, entry: Dict[str, Any], first: Page | None
+    ) -> Dict[str, Any]:
+        files = playlist_files(entry, fmt, compression)
+        count = export_songs_to(
+            clients[account.name],
+            entry["id"],
+            {kind: str(account.output_dir / name) for kind, name in files.items()},
+            concurrency,
+            entry["name"],
+            fields=fields,
+            first=first,
+        )
+        if count is None:
+            logging.error(
+                "Failed to export playlist %s of account %s", entry["id"], account.name
+            )
+        else:
+            record_export(entry, files, count)
+        return entry
+
+    jobs = {
+        account.name: _playlists(account)
+        for account in accounts
+        if account.name in clients
+    }
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for name, entry in fair_map(executor, _export, jobs, workers):
+            summary = summaries[name]
+            summary["playlists"] += 1
+            summary["tracks"] += entry["tracks"]
+            if entry["status"] != "ok":
+                summary["failed"] += 1
+            summary["seconds"] = round(time.monotonic() - started, 3)
+
+    for account in accounts:
+        summary = summaries[account.name]
+        if account.name not in manifests:
+            continue
+        (account.output_dir / "manifest.json").write_text(
+            json.dumps(manifests[account.name], indent=2, ensure_ascii=False),
+            encoding="utf-8",
+        )
+        summary["status"] = "partial" if summary["failed"] else "ok"
+    return [summaries[account.name] for account in accounts]
+
+
+def _with_included(pages: Iterable[Page]) -> Iterator[Tuple[Playlist, Page | None]]:
+    """
+    Pair every playlist of a listing requested with an include with its included page, if any.
+    """
+    for page in pages:
+        related = page.related or {}
+        for playlist in page.records:
+            if playlist.get("id"):
+                yield playlist, related.get(playlist["id"])
+
+
+def _map_bounded(
+    executor: ThreadPoolExecutor,
+    fn: Callable[..., Any],
+    items: Iterable[Tuple[Any, ...]],
+    limit: int,
+) -> Iterator[Any]:
+    """
+    Like executor.map, but at most `limit` calls are queued ahead of the results consumed, so lazily produced items
+    (such as the playlists of a listing still being paged through) are only pulled in as the workers free up.
+
+    :param items: Argument tuples of each call.
+    :return: The results, in order.
+    """
+    window: Deque[Future] = deque()
+    try:
+        for item in items:
+            if len(window) >= limit:
+                yield window.popleft().result()
+            window.append(executor.submit(fn, *item))
+        while window:
+            yield window.popleft().result()
+    finally:
+        for future in window:
+            future.cancel()
+
+
+def _diff_tracks(
+    old: Sequence[Mapping[str, Any]], new: Sequence[Mapping[str, Any]]
+) -> Tuple[List[Mapping[str, Any]], List[Mapping[str, Any]]]:
+    """
+    Compare two track lists as multisets, so duplicate tracks are counted individually.
+
+    :return: The (added, removed) songs.
+    """
+    old_counts = Counter(track_key(song) for song in old)
+    new_counts = Counter(track_key(song) for song in new)
+
+    def _pick(
+        songs: Sequence[Mapping[str, Any]], extra: Counter
+    ) -> List[Mapping[str, Any]]:
+        picked = []
+        for song in songs:
+            key = track_key(song)
+            if extra[key] > 0:
+                extra[key] -= 1
+                picked.append(song)
+        return picked
+
+    return _pick(new, new_counts - old_counts), _pick(old, old_counts - new_counts)
+
+
+def sync_playlists(
+    client: AppleMusicClient,
+    state: SyncState,
+    output_dir: str,
+    workers: int = 4,
+    concurrency: int = 1,
+) -> List[Dict[str, Any]] | None:
+    """
+    Incrementally sync every library playlist against the state of the previous sync.
+
+    Playlists whose lastModifiedDate is unchanged are skipped without fetching their tracks. Changed and new playlists
+    are re-fetched on a bounded worker pool, and for each one whose track list actually changed a
+    "<name> (<id>).diff.json" file listing the added and removed tracks is written to output_dir. Playlists that are no
+    longer in the library are dropped from the state.
+
+    :param client: An AppleMusicClient holding the developer token and Music-User-Token.
+    :param state: The SyncState recording the previous sync.
+    :param output_dir: Directory to write diff files into.
+    :param workers: Maximum number of playlists fetched at the same time.
+    :param concurrency: Maximum number of pages fetched at the same time per playlist.
+    :return: One summary entry per playlist, or None if the playlist listing could not be fetched.
+    """
+    playlists = get_all_playlists(client)
+    if playlists is None:
+        return None
+
+    summary: List[Dict[str, Any]] = []
+    changed: List[Dict[str, Any]] = []
+    for playlist in playlists:
+        pid = playlist.id
+        if not pid:
+            continue
+        entry: Dict[str, Any] = {
+            "id": pid,
+            "name": playlist.name,
+            "lastModified": playlist.last_modified,
+            "status": "unchanged",
+            "added": 0,
+            "removed": 0,
+            "file": None,
+        }
+        summary.append(entry)
+
+        stored = state.playlist(pid)
+        if (
+            stored is not None
+            and entry["lastModified"] is not None
+            and stored["last_modified"] == entry["lastModified"]
+        ):
+            continue
+        entry["status"] = "new" if stored is None else "changed"
+        changed.append(entry)
+
+    def _fetch(entry: Dict[str, Any]) -> List[Track] | None:
+        return get_songs_in_playlist(client, entry["id"], concurrency)
+
+    directory = Path(output_dir)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # The SQLite connection stays on this thread; only the fetches run in the pool.
+        for entry, songs in zip(changed, executor.map(_fetch, changed)):
+            if songs is None:
+                logging.error("Failed to sync playlist %s", entry["id"])
+                entry["status"] = "failed"
+                continue
+
+            stored = state.playlist(entry["id"])
+            if stored is not None and stored["track_hash"] == track_hash(songs):
+                entry["status"] = "unchanged"
+                state.save(entry["id"], entry["name"], entry["lastModified"], songs)
+                continue
+
+            old = state.tracks(entry["id"]) if stored is not None else []
+            added, removed = _diff_tracks(old, songs)
+            entry["added"], entry["removed"] = len(added), len(removed)
+
+            directory.mkdir(parents=True, exist_ok=True)
+            filename = _playlist_filename(entry, "diff.json")
+            (directory / filename).write_text(
+                json.dumps(
+                    {
+                        "id": entry["id"],
+                        "name": entry["name"],
+                        "lastModified": entry["lastModified"],
+                        "added": [as_dict(song) for song in added],
+                        "removed": [as_dict(song) for song in removed],
+                    },
+                    indent=2,
+                    ensure_ascii=False,
+                ),
+                encoding="utf-8",
+            )
+            entry["file"] = filename
+            state.save(entry["id"], entry["name"], entry["lastModified"], songs)
+            logging.info(
+                "Synced playlist %s (+%d/-%d)", entry["id"], len(added), len(removed)
+            )
+
+    listed = {entry["id"] for entry in summary}
+    for pid in state.playlist_ids():
+        if pid not in listed:
+            state.delete(pid)
+            summary.append({"id": pid, "status": "deleted"})
+
+    return summary
@@ -1,28 +1,428 @@
 import csv
+import gzip
+import importlib.util
+import io
 import json
+import queue
+import sqlite3
+import threading
+from itertools import chain, islice
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, Callable, Iterable, Iterator, List, Mapping, Sequence, Tuple
+
+from cli.records import Record, as_dict, select
+
+# Output files ending in one of these suffixes are compressed while they are written.
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+FANOUT_BATCH_SIZE = 256
+FANOUT_QUEUE_SIZE = 8
+
+
+def zstd_available() -> bool:
+    return importlib.util.find_spec("zstandard") is not None
+
+
+def is_compressed(output_file: str) -> bool:
+    return Path(output_file).suffix.lower() in COMPRESSION_SUFFIXES.values()
+
+
+def _open_for_write(output_file: str, append: bool = False):
+    """
+    Open an output file for writing text. Files ending in .gz or .zst are compressed as they are written, so the
+    compressed output is streamed to disk instead of being built in memory.
+
+    :param append: Add to the end of an existing, uncompressed file instead of replacing it.
+    :raises RuntimeError: For .zst files when the optional zstandard package is not installed.
+    """
+    path = Path(output_file)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if append:
+        return path.open("a", newline="", encoding="utf-8")
+    suffix = path.suffix.lower()
+    if suffix == COMPRESSION_SUFFIXES["gzip"]:
+        return gzip.open(
+            path, "wt", compresslevel=GZIP_LEVEL, encoding="utf-8", newline=""
+        )
+    if suffix == COMPRESSION_SUFFIXES["zstd"]:
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError(
+                'zstd output requires zstandard: pip install "apple-music-cli[zstd]"'
+            ) from None
+        raw = path.open("wb")
+        compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw)
+        return io.TextIOWrapper(compressed, encoding="utf-8", newline="")
+    return path.open("w", newline="", encoding="utf-8")
+
+
+_DONE = object()
+
+
+def write_fanout(
+    payload: Iterable[Mapping[str, Any]],
+    writers: Sequence[Callable[[Iterable[Mapping[str, Any]]], int]],
+) -> List[int]:
+    """
+    Feed one stream of rows to several writers at the same time, e.g. to write JSON and CSV from a single fetch.
+
+    Each writer runs on its own thread and receives the rows in batches through a bounded queue, so a slow writer
+    holds back the stream instead of letting rows pile up in memory. A single writer is called directly.
+
+    :return: The value returned by each writer, in order.
+    :raises Exception: The first error raised by the payload or by a writer, once every writer has stopped.
+    """
+    if len(writers) == 1:
+        return [writers[0](payload)]
+
+    queues: List[queue.Queue] = [
+        queue.Queue(maxsize=FANOUT_QUEUE_SIZE) for _ in writers
+    ]
+    results: List[Any] = [None] * len(writers)
+    errors: List[BaseException] = []
+
+    def _rows(batches: queue.Queue) -> Iterator[Mapping[str, Any]]:
+        while (batch := batches.get()) is not _DONE:
+            yield from batch
+
+    def _run(index: int) -> None:
+        rows = _rows(queues[index])
+        try:
+            results[index] = writers[index](rows)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            # Keep draining so the stream never blocks on a writer that has stopped.
+            for _ in rows:
+                pass
+
+    threads = [
+        threading.Thread(target=_run, args=(index,), name=f"writer-{index}")
+        for index in range(len(writers))
+    ]
+    for thread in threads:
+        thread.start()
+    batch: List[Mapping[str, Any]] = []
+    try:
+        for row in payload:
+            batch.append(row)
+            if len(batch) >= FANOUT_BATCH_SIZE:
+                for batches in queues:
+                    batches.put(batch)
+                batch = []
+    finally:
+        # Rows read before the payload failed are still written, so an interrupted export keeps all of them.
+        for batches in queues:
+            if batch:
+                batches.put(batch)
+            batches.put(_DONE)
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return results
 
 
 def write_songs_to_json(
-    payload: List[Dict], output_file: str = "output/output.json"
-) -> None:
-    # Write to JSON file
-    Path(output_file).write_text(
-        json.dumps(payload, indent=2, ensure_ascii=False),
-        encoding="utf-8",
-    )
+    payload: Iterable[Mapping[str, Any]],
+    output_file: str = "output/output.json",
+    start: int = 0,
+    fieldnames: Sequence[str] | None = None,
+) -> int:
+    """
+    Stream rows to a JSON array, one element at a time. The file is laid out exactly as json.dumps(indent=2) would.
+
+    :param fieldnames: Keys to write, in order. Defaults to every key of each row.
+    :param start: Number of elements already in the file, which ends right after the last of them; the rows are
+        appended to the array. Used to resume an interrupted export.
+    :return: The number of rows in the file.
+    """
+    count = start
+    with _open_for_write(output_file, append=start > 0) as file:
+        for row in payload:
+            element = json.dumps(
+                as_dict(row) if fieldnames is None else select(row, fieldnames),
+                indent=2,
+                ensure_ascii=False,
+            )
+            file.write("[\n  " if count == 0 else ",\n  ")
+            file.write(element.replace("\n", "\n  "))
+            count += 1
+        file.write("\n]" if count else "[]")
+    return count
+
+
+def write_songs_to_jsonl(
+    payload: Iterable[Mapping[str, Any]],
+    output_file: str = "output/output.jsonl",
+    start: int = 0,
+    fieldnames: Sequence[str] | None = None,
+) -> int:
+    """
+    Stream rows to a JSON Lines file, one compact JSON object per line.
+
+    :param fieldnames: Keys to write, in order. Defaults to every key of each row.
+    :param start: Number of lines already in the file; the rows are appended after them.
+    :return: The number of rows in the file.
+    """
+    count = start
+    with _open_for_write(output_file, append=start > 0) as file:
+        for row in payload:
+            file.write(
+                json.dumps(
+                    as_dict(row) if fieldnames is None else select(row, fieldnames),
+                    ensure_ascii=False,
+                )
+            )
+            file.write("\n")
+            count += 1
+    return count
 
 
 def write_songs_to_csv(
-    payload: List[Dict], output_file: str = "output/output.csv"
+    payload: Iterable[Mapping[str, Any]],
+    output_file: str = "output/output.csv",
+    fieldnames: Sequence[str] | None = None,
+    start: int = 0,
+) -> int:
+    """
+    Stream rows to a CSV file.
+
+    :param fieldnames: Fixed header for the file. Defaults to the keys of the first row.
+    :param start: Number of rows already in the file after its header; the rows are appended after them. Requires
+        fieldnames.
+    :return: The number of rows in the file.
+    """
+    rows = iter(payload)
+    if fieldnames is None:
+        first = next(rows, None)
+        if first is None:
+            Path(output_file).parent.mkdir(parents=True, exist_ok=True)
+            Path(output_file).write_text("", encoding="utf-8")
+            return 0
+        fieldnames = list(first.keys())
+        rows = chain([first], rows)
+
+    count = start
+    with _open_for_write(output_file, append=start > 0) as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        if not start:
+            writer.writeheader()
+        for row in rows:
+            if isinstance(row, Record):
+                writer.writer.writerow(row.row(fieldnames))
+            else:
+                writer.writerow(row)
+            count += 1
+    return count
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS playlists (
+    id TEXT PRIMARY KEY,
+    name TEXT
+);
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY,
+    track_key TEXT NOT NULL UNIQUE,
+    name TEXT,
+    artist_name TEXT,
+    album_name TEXT,
+    release_date TEXT
+);
+CREATE TABLE IF NOT EXISTS track_genres (
+    track_id INTEGER NOT NULL REFERENCES tracks (id),
+    genre TEXT NOT NULL,
+    PRIMARY KEY (track_id, genre)
+);
+CREATE TABLE IF NOT EXISTS playlist_tracks (
+    playlist_id TEXT NOT NULL REFERENCES playlists (id),
+    position INTEGER NOT NULL,
+    track_id INTEGER NOT NULL REFERENCES tracks (id),
+    PRIMARY KEY (playlist_id, position)
+);
+CREATE TABLE IF NOT EXISTS library_songs (
+    id TEXT PRIMARY KEY,
+    track_id INTEGER NOT NULL REFERENCES tracks (id)
+);
+CREATE INDEX IF NOT EXISTS idx_tracks_artist_name ON tracks (artist_name);
+CREATE INDEX IF NOT EXISTS idx_tracks_album_name ON tracks (album_name);
+CREATE INDEX IF NOT EXISTS idx_track_genres_genre ON track_genres (genre);
+CREATE INDEX IF NOT EXISTS idx_playlist_tracks_track_id ON playlist_tracks (track_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS tracks_fts USING fts5 (
+    name, artist_name, album_name, content='tracks', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS tracks_fts_insert AFTER INSERT ON tracks BEGIN
+    INSERT INTO tracks_fts (rowid, name, artist_name, album_name)
+    VALUES (new.id, new.name, new.artist_name, new.album_name);
+END;
+"""
+SQLITE_BATCH_SIZE = 500
+
+
+def connect_sqlite(output_file: str) -> sqlite3.Connection:
+    """
+    Open (and if needed create) an export database. Several exports may write to the same file concurrently; writers
+    wait for each other's short transactions instead of failing.
+    """
+    Path(output_file).parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(output_file, timeout=60)
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.executescript(SQLITE_SCHEMA)
+    return connection
+
+
+def _insert_track(connection: sqlite3.Connection, row: Mapping[str, Any]) -> int:
+    """
+    Store a song in the tracks and track_genres tables, unless the same track is already stored.
+
+    :return: The track's ID.
+    """
+    key = "\x1f".join(
+        str(row.get(field) or "")
+        for field in ("name", "artistName", "albumName", "releaseDate")
+    )
+    connection.execute(
+        "INSERT INTO tracks (track_key, name, artist_name, album_name, release_date) "
+        "VALUES (?, ?, ?, ?, ?) ON CONFLICT (track_key) DO NOTHING",
+        (
+            key,
+            row.get("name"),
+            row.get("artistName"),
+            row.get("albumName"),
+            row.get("releaseDate"),
+        ),
+    )
+    (track_id,) = connection.execute(
+        "SELECT id FROM tracks WHERE track_key = ?", (key,)
+    ).fetchone()
+    connection.executemany(
+        "INSERT OR IGNORE INTO track_genres (track_id, genre) VALUES (?, ?)",
+        ((track_id, genre) for genre in row.get("genreNames") or []),
+    )
+    return track_id
+
+
+def _replace_playlist(
+    connection: sqlite3.Connection,
+    playlist_id: str,
+    playlist_name: str | None,
+    start: int = 0,
 ) -> None:
-    dictionary = payload[0]
+    """
+    Store a playlist and drop its membership rows from position `start` on.
+    """
+    connection.execute(
+        "INSERT INTO playlists (id, name) VALUES (?, ?) "
+        "ON CONFLICT (id) DO UPDATE SET name = coalesce(excluded.name, name)",
+        (playlist_id, playlist_name),
+    )
+    connection.execute(
+        "DELETE FROM playlist_tracks WHERE playlist_id = ? AND position >= ?",
+        (playlist_id, start),
+    )
 
-    # Write to CSV file
-    path = Path(output_file)
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", newline="", encoding="utf-8") as file:
-        writer = csv.DictWriter(file, fieldnames=dictionary.keys())
-        writer.writeheader()
-        writer.writerows(payload)
+
+def write_songs_to_sqlite(
+    payload: Iterable[Mapping[str, Any]],
+    output_file: str = "output/output.sqlite",
+    playlist_id: str = "",
+    playlist_name: str | None = None,
+    start: int = 0,
+) -> int:
+    """
+    Stream songs into normalised playlists / tracks / track_genres / playlist_tracks tables, with an FTS5 index over
+    song, artist and album names. Each distinct track is stored once no matter how many playlists contain it, and
+    re-exporting a playlist replaces its previous membership rows.
+
+    :param playlist_id: ID of the playlist the songs belong to.
+    :param playlist_name: Name of the playlist the songs belong to.
+    :param start: Keep the playlist's first `start` membership rows and add the songs after them.
+    :return: The number of songs in the playlist.
+    """
+    connection = connect_sqlite(output_file)
+    count = start
+    try:
+        with connection:
+            _replace_playlist(connection, playlist_id, playlist_name, start)
+
+        rows = iter(payload)
+        while batch := list(islice(rows, SQLITE_BATCH_SIZE)):
+            # Rows are collected before the transaction opens, so concurrent writers never wait on the network.
+            with connection:
+                for row in batch:
+                    connection.execute(
+                        "INSERT INTO playlist_tracks (playlist_id, position, track_id) "
+                        "VALUES (?, ?, ?)",
+                        (playlist_id, count, _insert_track(connection, row)),
+                    )
+                    count += 1
+    finally:
+        connection.close()
+    return count
+
+
+def write_library_to_sqlite(
+    payload: Iterable[Tuple[str, Mapping[str, Any]]],
+    output_file: str = "output/library.sqlite",
+) -> int:
+    """
+    Stream the songs of a whole library into the export tables of write_songs_to_sqlite. Each distinct track is stored
+    once, and the library_songs table maps every library song ID to its track, replacing the mapping of any earlier
+    library export. Playlists are then added with write_memberships_to_sqlite.
+
+    :param payload: (library song ID, song) pairs.
+    :return: The number of library songs.
+    """
+    connection = connect_sqlite(output_file)
+    count = 0
+    try:
+        with connection:
+            connection.execute("DELETE FROM library_songs")
+
+        rows = iter(payload)
+        while batch := list(islice(rows, SQLITE_BATCH_SIZE)):
+            with connection:
+                for library_id, row in batch:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO library_songs (id, track_id) VALUES (?, ?)",
+                        (library_id, _insert_track(connection, row)),
+                    )
+                    count += 1
+    finally:
+        connection.close()
+    return count
+
+
+def write_memberships_to_sqlite(
+    playlists: Iterable[Tuple[str, str | None, Sequence[str]]],
+    output_file: str = "output/library.sqlite",
+) -> int:
+    """
+    Store the track lists of playlists given as library song IDs, joined against the library_songs table written by
+    write_library_to_sqlite, so no song attributes are needed. Each playlist's previous membership rows are replaced.
+
+    :param playlists: (playlist ID, playlist name, library song IDs in playlist order) for each playlist.
+    :return: The number of track IDs that are not in library_songs. They are left out, and the other tracks keep
+        their positions.
+    """
+    connection = connect_sqlite(output_file)
+    missing = 0
+    try:
+        for playlist_id, playlist_name, track_ids in playlists:
+            with connection:
+                _replace_playlist(connection, playlist_id, playlist_name)
+                cursor = connection.executemany(
+                    "INSERT INTO playlist_tracks (playlist_id, position, track_id) "
+                    "SELECT ?, ?, track_id FROM library_songs WHERE id = ?",
+                    (
+                        (playlist_id, position, track_id)
+                        for position, track_id in enumerate(track_ids)
+                    ),
+                )
+                missing += len(track_ids) - cursor.rowcount
+    finally:
+        connection.close()
+    return missing
@@ -1,94 +1,104 @@
+from __future__ import annotations
+
 import argparse
 import logging
-import os
-from datetime import datetime
-from typing import Any, Dict, List, cast
-
-import requests
-from dotenv import load_dotenv
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterator,
+    List,
+)
+from urllib.parse import quote
+
+from cli.auth import (
+    AuthServerError,
+    AuthTimeoutError,
+    DeveloperTokenCache,
+    start_auth_flow,
+)
+from cli.batch import (
+    Account,
+    AccountManifestError,
+    load_accounts,
+    read_account_token,
+)
+from cli.cache import DEFAULT_TTL_SECONDS, ResponseCache
+from cli.checkpoint import checkpoint_path
+from cli.config import (
+    CACHE_DIR,
+    CATALOG_DB_PATH,
+    PLAYLIST_INDEX_PATH,
+    STATE_DB_PATH,
+    TOKEN_PATH,
+    load_credentials,
+)
+from cli.daemon_client import (
+    DEFAULT_DAEMON_HOST,
+    DEFAULT_DAEMON_PORT,
+    DaemonClient,
+    DaemonError,
+    find_daemon,
+)
+from cli.export import (
+    SQLITE_LIBRARY_FILENAME,
+    export_accounts,
+    export_all_playlists,
+    export_library,
+    export_songs,
+    get_all_playlists,
+    get_playlist_by_id,
+    output_files,
+    parse_fields,
+    parse_formats,
+    resolve_playlist_name,
+    sync_playlists,
+    write_output,
+)
+from cli.file_output import COMPRESSION_SUFFIXES, zstd_available
+from cli.metrics import Metrics
+from cli.playlist_index import (
+    AmbiguousPlaylistName,
+    PlaylistIndex,
+    is_playlist_id,
+)
+from cli.ratelimit import DEFAULT_RATE, RateLimiter
+from cli.search import SearchDatabaseError, search_tracks
+from cli.state import SyncState
+
+# The HTTP stack (requests, httpx, asyncio) is imported only by the commands that talk to the API, so --help and
+# offline commands such as search start quickly. tests/test_startup.py enforces this.
+if TYPE_CHECKING:
+    from cli.client import AppleMusicClient
+    from cli.enrich import CatalogEnricher
 
-from cli.auth import generate_jwt, start_auth_flow
-from cli.config import TOKEN_PATH
-from cli.file_output import write_songs_to_csv, write_songs_to_json
-
-load_dotenv()
 logger: logging.Logger = logging.getLogger(__name__)
 
-
-TEAM_ID: str | None = os.getenv("APPLE_MUSIC_TEAM_ID")
-KEY_ID: str | None = os.getenv("APPLE_MUSIC_KEY_ID")
-PRIVATE_KEY_PATH: str | None = os.getenv("APPLE_MUSIC_PRIVATE_KEY_PATH")
-BASE_URL = "https://api.music.apple.com"
-
-if not all([TEAM_ID, KEY_ID, PRIVATE_KEY_PATH]):
-    raise RuntimeError(
-        "Missing Apple Music credentials. "
-        "Set APPLE_MUSIC_TEAM_ID, APPLE_MUSIC_KEY_ID, "
-        "and APPLE_MUSIC_PRIVATE_KEY_PATH."
-    )
-
-
-def get_song_data(jwt_token: str) -> None:
+COMMANDS = (
+    "test",
+    "all-playlists",
+    "export",
+    "export-all",
+    "playlist",
+    "sync",
+    "search",
+    "daemon",
+    "library-export",
+    "batch",
+)
+# Commands a running daemon can serve in place of this process.
+DAEMON_COMMANDS = ("all-playlists", "playlist", "export", "export-all")
+
+
+def read_music_user_token() -> str | None:
     """
-    Test function that should take a developer token and a known good URL and return data from the public catalogue.
-    "Born in the U.S.A" by Bruce Springsteen should print to the terminal if the developer token is correct.
+    Read the Music-User-Token stored by the auth flow.
 
-    :param jwt_token: A developer JWT used as the Bearer token in the Authorization header.
+    :return: The music user token, or None if it is missing or unreadable.
     """
-    url: str = f"{BASE_URL}/v1/catalog/us/songs/203709340"
-    headers: Dict[str, str] = {"Authorization": "Bearer " + jwt_token}
-
-    try:
-        response: requests.Response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        logging.info("Got song")
-    except requests.exceptions.HTTPError as e:
-        status = getattr(e.response, "status_code", None)
-        if status == 401:
-            print("Unauthorized: Incorrect Authorization header or token expired.")
-        elif status == 403:
-            print("Forbidden: Invalid or insufficient authentication.")
-        elif status == 429:
-            print("Too Many Requests: Rate limited by Apple servers.")
-        elif status == 500:
-            print("Internal Server Error: An error occurred on the server.")
-        else:
-            print(f"HTTP error occurred: {e}")
-        logging.exception("HTTP error fetching playlists")
-        return None
-    except requests.exceptions.RequestException as e:
-        logging.exception("Network error while fetching playlists")
-        print(f"Network error while fetching playlists: {e}")
-        return None
-
-    try:
-        response_dict = response.json()
-    except ValueError:
-        logging.exception("Failed to parse JSON response")
-        print("Invalid JSON received from Apple Music API.")
-        return None
-
-    print(response_dict)
-
-
-def get_all_playlists(jwt_token: str) -> List[Dict[Any, Any]] | None:
-    """
-    Retrieve all Apple Music library playlists for the authenticated user. Limited to 25 playlists internally.
-
-    Sends a GET request to the Apple Music API endpoint for the current user's library playlists,
-    using the provided developer JWT for the Authorization header and reading the Music-User-Token
-    from TOKEN_PATH.
-
-    :param jwt_token: A developer JWT used as the Bearer token in the Authorization header.
-    :return: On success, returns a list of playlist dictionaries with the following keys:
-        - "name": str | None, playlist name
-        - "id": str | None, playlist identifier
-        - "dateAdded": str | None, date the playlist was added formatted as "DD-MM-YYYY"
-    Returns None if an error occurs; prints a short message describing common HTTP/errors
-    before returning None.
-    """
-    url: str = f"{BASE_URL}/v1/me/library/playlists"
-
     try:
         music_user_token: str = TOKEN_PATH.read_text().strip()
         if not music_user_token:
@@ -101,341 +111,699 @@ def get_all_playlists(jwt_token: str) -> List[Dict[Any, Any]] | None:
         )
         print("Unable to read Music-User-Token. Make sure you have authenticated.")
         return None
+    return music_user_token
 
-    headers: Dict[str, str] = {
-        "Authorization": "Bearer " + jwt_token,
-        "Music-User-Token": music_user_token,
-    }
 
-    try:
-        response: requests.Response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        logging.info("Got all playlists")
-    except requests.exceptions.HTTPError as e:
-        status = getattr(e.response, "status_code", None)
-        if status == 401:
-            print("Unauthorized: Incorrect Authorization header or token expired.")
-        elif status == 403:
-            print("Forbidden: Invalid or insufficient authentication.")
-        elif status == 429:
-            print("Too Many Requests: Rate limited by Apple servers.")
-        elif status == 500:
-            print("Internal Server Error: An error occurred on the server.")
-        else:
-            print(f"HTTP error occurred: {e}")
-        logging.exception("HTTP error fetching playlists")
-        return None
-    except requests.exceptions.RequestException as e:
-        logging.exception("Network error while fetching playlists")
-        print(f"Network error while fetching playlists: {e}")
-        return None
-
-    try:
-        response_dict = response.json()
-    except ValueError:
-        logging.exception("Failed to parse JSON response")
-        print("Invalid JSON received from Apple Music API.")
-        return None
+def get_song_data(client: AppleMusicClient) -> None:
+    """
+    Test function that should take a developer token and a known good URL and return data from the public catalogue.
+    "Born in the U.S.A" by Bruce Springsteen should print to the terminal if the developer token is correct.
 
-    playlists = response_dict.get("data", [])
-    if not isinstance(playlists, list):
-        logging.error("Unexpected playlists format in response")
-        print("Unexpected response format from Apple Music API.")
+    :param client: An AppleMusicClient holding the developer token.
+    """
+    response_dict = client.get("/v1/catalog/us/songs/203709340", description="song")
+    if response_dict is None:
         return None
+    logging.info("Got song")
 
-    output: List[Dict[str | None, str | None]] = []
-    for item in playlists:
-        if not isinstance(item, dict):
-            continue
-        attributes = item.get("attributes") or {}
-        name = attributes.get("name") if isinstance(attributes, dict) else None
-        pid = item.get("id")
-        date_added = (
-            attributes.get("dateAdded") if isinstance(attributes, dict) else None
-        )
+    print(response_dict)
 
-        date_str: str | None = None
-        if date_added:
-            try:
-                dt = datetime.fromisoformat(date_added)
-                date_str = dt.strftime("%d-%m-%Y")
-            except Exception:
-                logging.warning(
-                    "Invalid dateAdded format for playlist id %s: %s", pid, date_added
-                )
-                date_str = None
 
-        playlist: Dict[str | None, str | None] = {
-            "name": name,
-            "id": pid,
-            "dateAdded": date_str,
-        }
-        output.append(playlist)
+async def _export_all_async(
+    developer_token: DeveloperTokenCache,
+    music_user_token: str,
+    args: argparse.Namespace,
+    fmt: str,
+    metrics: Metrics | None = None,
+    fields: List[str] | None = None,
+) -> List[Dict[str, Any]] | None:
+    # Imported here: the async pipeline needs the optional httpx dependency.
+    from cli.async_api import AsyncAppleMusicClient, export_all_playlists_async
+    from cli.client import DEFAULT_POOL_MAXSIZE
+
+    async with AsyncAppleMusicClient(
+        developer_token,
+        music_user_token,
+        max_connections=max(DEFAULT_POOL_MAXSIZE, args.workers * args.concurrency),
+        metrics=metrics,
+    ) as client:
+        return await export_all_playlists_async(
+            client,
+            args.output or "output",
+            fmt,
+            max_playlists=args.workers,
+            prefetch=args.concurrency,
+            compression=args.compress,
+            fields=fields,
+        )
 
-    return output
 
+def _report_manifest(manifest: List[Dict[str, Any]] | None) -> None:
+    if manifest is None:
+        print("No data to write.")
+        return
+    failed = sum(1 for entry in manifest if entry["status"] != "ok")
+    print(f"Exported {len(manifest) - failed} playlists ({failed} failed).")
+
+
+def forward_to_daemon(
+    daemon: DaemonClient,
+    cmd: str,
+    args: argparse.Namespace,
+    fmt: str,
+    output_file: str,
+    fields: List[str] | None = None,
+    index: PlaylistIndex | None = None,
+) -> None:
+    """
+    Run a command on the running daemon instead of in this process. Exports are written by the daemon itself, so
+    output paths are sent as absolute paths.
 
-def get_playlist_by_id(jwt_token: str, playlist_id: str) -> List[Dict[Any, Any]] | None:
+    :param index: Playlist index updated from the playlists the daemon lists or exports.
+    """
+    playlist_path = "/playlists/" + quote(args.playlistID or "", safe="")
+    try:
+        if cmd == "all-playlists":
+            playlists = daemon.request("GET", "/playlists")
+            if index is not None and isinstance(playlists, list):
+                index.update(playlists, complete=True)
+            write_output(playlists, fmt, output_file, compression=args.compress)
+        elif cmd == "playlist":
+            write_output(
+                daemon.request("GET", playlist_path),
+                fmt,
+                output_file,
+                compression=args.compress,
+            )
+        elif cmd == "export":
+            daemon.request(
+                "POST",
+                playlist_path + "/export",
+                {
+                    "output": str(Path(output_file).resolve()),
+                    "format": fmt,
+                    "concurrency": args.concurrency,
+                    "compression": args.compress,
+                    "fields": fields,
+                },
+            )
+        elif cmd == "export-all":
+            manifest = daemon.request(
+                "POST",
+                "/export-all",
+                {
+                    "output_dir": str(Path(args.output or "output").resolve()),
+                    "format": fmt,
+                    "workers": args.workers,
+                    "concurrency": args.concurrency,
+                    "compression": args.compress,
+                    "fields": fields,
+                },
+            )
+            if index is not None and isinstance(manifest, list):
+                index.update(manifest, complete=True)
+            _report_manifest(manifest)
+    except DaemonError as e:
+        logging.exception("Daemon request failed")
+        print(e)
+
+
+@contextmanager
+def catalog_enricher(
+    client: AppleMusicClient, args: argparse.Namespace
+) -> Iterator[CatalogEnricher | None]:
     """
-    Retrieve a specified playlist for the authenticated user.
+    Set up catalog enrichment for --enrich, in --storefront or else the user's own storefront. Fetched catalog songs
+    are cached in the config directory unless --no-cache is given.
 
-    :param jwt_token: A developer JWT used as the Bearer token in the Authorization header.
+    :return: The enricher, or None if --enrich was not given.
     """
-    url: str = f"{BASE_URL}/v1/me/library/playlists/{playlist_id}"
+    if not args.enrich:
+        yield None
+        return
+    from cli.enrich import (
+        DEFAULT_STOREFRONT,
+        CatalogCache,
+        CatalogEnricher,
+        get_storefront,
+    )
 
+    storefront = args.storefront or get_storefront(client) or DEFAULT_STOREFRONT
+    cache = None if args.no_cache else CatalogCache(CATALOG_DB_PATH)
     try:
-        music_user_token: str = TOKEN_PATH.read_text().strip()
-        if not music_user_token:
-            logging.error("Music user token is empty.")
-            print("Music user token is missing. Please authenticate.")
-            return None
-    except Exception as e:
-        logging.exception(
-            f"Failed to read Music-User-Token from TOKEN_PATH. Error: {e}"
-        )
-        print("Unable to read Music-User-Token. Make sure you have authenticated.")
-        return None
+        with CatalogEnricher(client, storefront, cache, args.workers) as enricher:
+            yield enricher
+        logging.info("Fetched catalog songs in %d requests", enricher.requests)
+    finally:
+        if cache is not None:
+            cache.close()
 
-    headers: Dict[str, str] = {
-        "Authorization": "Bearer " + jwt_token,
-        "Music-User-Token": music_user_token,
-    }
 
-    try:
-        response: requests.Response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        logging.info("Found playlist")
-    except requests.exceptions.HTTPError as e:
-        status = getattr(e.response, "status_code", None)
-        if status == 401:
-            print("Unauthorized: Incorrect Authorization header or token expired.")
-        elif status == 403:
-            print("Forbidden: Invalid or insufficient authentication.")
-        elif status == 429:
-            print("Too Many Requests: Rate limited by Apple servers.")
-        elif status == 500:
-            print("Internal Server Error: An error occurred on the server.")
-        else:
-            print(f"HTTP error occurred: {e}")
-        logging.exception("HTTP error fetching playlists")
-        return None
-    except requests.exceptions.RequestException as e:
-        logging.exception("Network error while fetching playlists")
-        print(f"Network error while fetching playlists: {e}")
-        return None
+def token_exists() -> bool:
+    return TOKEN_PATH.exists() and TOKEN_PATH.read_text().strip() != ""
 
-    try:
-        response_dict = response.json()
-    except ValueError:
-        logging.exception("Failed to parse JSON response")
-        print("Invalid JSON received from Apple Music API.")
-        return None
 
-    playlists = response_dict.get("data", [])
-    if not isinstance(playlists, list):
-        logging.error("Unexpected playlists format in response")
-        print("Unexpected response format from Apple Music API.")
-        return None
+def authorise() -> str | None:
+    """
+    Return the stored Music-User-Token, running the browser auth flow first if there is none.
 
-    output: List[Dict[str | None, str | None]] = []
-    for item in playlists:
-        if not isinstance(item, dict):
-            continue
-        attributes = item.get("attributes") or {}
-        name = attributes.get("name") if isinstance(attributes, dict) else None
-        pid = item.get("id")
-        date_added = (
-            attributes.get("dateAdded") if isinstance(attributes, dict) else None
-        )
+    :return: The music user token, or None if authorisation failed.
+    """
+    if token_exists():
+        return read_music_user_token()
+    try:
+        return start_auth_flow()
+    except (AuthTimeoutError, AuthServerError) as e:
+        logging.exception("Authorisation failed")
+        print(f"Authorisation failed: {e}")
+        return None
 
-        date_str: str | None = None
-        if date_added:
-            try:
-                dt = datetime.fromisoformat(date_added)
-                date_str = dt.strftime("%d-%m-%Y")
-            except Exception:
-                logging.warning(
-                    "Invalid dateAdded format for playlist id %s: %s", pid, date_added
-                )
-                date_str = None
 
-        playlist: Dict[str | None, str | None] = {
-            "name": name,
-            "id": pid,
-            "dateAdded": date_str,
-        }
-        output.append(playlist)
-    return output
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog="apple-music-cli",
+        description="Python CLI tool to help users save Apple Music playlist data into various file formats.",
+    )
 
+    parser.add_argument(
+        "COMMAND",
+        help="Command to execute: Accepted commands - " + ", ".join(COMMANDS),
+        type=str,
+    )
 
-def get_songs_in_playlist(jwt_token: str, playlist_id: str) -> List[Dict] | None:
-    """
-    Gets songs from the specified playlist, limited to 100 songs internally.
+    parser.add_argument(
+        "--playlistID",
+        type=str,
+        help="id of playlist to backup, or its name (exact, case-insensitive or a unique prefix)",
+    )
 
-    :param jwt_token: A developer JWT used as the Bearer token in the Authorization header.
-    :param playlist_id: Apple Music library playlist ID
-    :return: Full response dict with aggregated data
-    """
-    url: str | None = f"{BASE_URL}/v1/me/library/playlists/{playlist_id}/tracks"
+    parser.add_argument(
+        "-f",
+        "--format",
+        type=str,
+        help="output file format (json, jsonl, csv or sqlite), or several separated by commas, e.g. json,csv: the "
+        "playlist is fetched once and every format is written at the same time (default: json; library-export "
+        "always writes sqlite)",
+    )
 
-    try:
-        music_user_token: str = TOKEN_PATH.read_text().strip()
-        if not music_user_token:
-            logging.error("Music user token is empty.")
-            print("Music user token is missing. Please authenticate.")
-            return None
-    except Exception as e:
-        logging.exception(
-            f"Failed to read Music-User-Token from TOKEN_PATH. Error: {e}"
-        )
-        print("Unable to read Music-User-Token. Make sure you have authenticated.")
-        return None
+    parser.add_argument(
+        "--fields",
+        "--columns",
+        dest="fields",
+        help="song fields to export, in order, separated by commas, e.g. name,artistName (default: all). Only these "
+        "attributes are requested from the API",
+    )
 
-    headers: Dict[str, str] = {
-        "Authorization": "Bearer " + jwt_token,
-        "Music-User-Token": music_user_token,
-    }
+    parser.add_argument(
+        "--compress",
+        choices=tuple(COMPRESSION_SUFFIXES),
+        help="compress output files as they are written (zstd needs the zstd extra)",
+    )
 
-    all_tracks: List[Dict] = []
-    while url:
-        try:
-            response: requests.Response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            logging.info("Found playlist")
-        except requests.exceptions.HTTPError as e:
-            status = getattr(e.response, "status_code", None)
-            if status == 401:
-                print("Unauthorized: Incorrect Authorization header or token expired.")
-            elif status == 403:
-                print("Forbidden: Invalid or insufficient authentication.")
-            elif status == 429:
-                print("Too Many Requests: Rate limited by Apple servers.")
-            elif status == 500:
-                print("Internal Server Error: An error occurred on the server.")
-            else:
-                print(f"HTTP error occurred: {e}")
-            logging.exception("HTTP error fetching songs")
-            return None
-        except requests.exceptions.RequestException as e:
-            logging.exception("Network error while fetching songs")
-            print(f"Network error while fetching songs: {e}")
-            return None
+    parser.add_argument("-o", "--output", help="Output file.")
 
-        try:
-            payload = response.json()
-        except ValueError:
-            logging.exception("Failed to parse JSON response")
-            print("Invalid JSON received from Apple Music API.")
-            return None
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue an interrupted export from its checkpoint, appending to the partially written output",
+    )
 
-        tracks = payload.get("data", [])
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="number of playlist pages to fetch in parallel",
+    )
 
-        all_tracks.extend(tracks)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="number of playlists to export in parallel with export-all",
+    )
 
-        logging.info("Fetched %d tracks", len(tracks))
+    parser.add_argument(
+        "--accounts",
+        help="accounts manifest of the batch command: a JSON list of {name, token, output, rate} objects",
+    )
 
-        next_path = payload.get("next")
-        if next_path:
-            url = BASE_URL + next_path
-        else:
-            url = None
+    parser.add_argument(
+        "--rate",
+        type=float,
+        help=f"requests per second allowed for the developer token; a batch run shares it between every account, "
+        f"and it is also the default rate of each account (default: {DEFAULT_RATE:g})",
+    )
 
-    payload = {"data": all_tracks, "total": len(all_tracks)}
-    songs: List[Dict] = []
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="run export-all on the asyncio pipeline (requires the async extra)",
+    )
 
-    for item in payload.get("data", []):
-        attributes = item.get("attributes", {})
-        if not attributes:
-            continue
+    parser.add_argument(
+        "--enrich",
+        action="store_true",
+        help="add ISRC, duration and composer from the catalog to exported songs",
+    )
 
-        song = {
-            "name": attributes.get("name"),
-            "artistName": attributes.get("artistName"),
-            "albumName": attributes.get("albumName"),
-            "genreNames": attributes.get("genreNames", []),
-            "releaseDate": attributes.get("releaseDate"),
-        }
+    parser.add_argument(
+        "--storefront",
+        help="catalog storefront used by --enrich (default: the user's storefront)",
+    )
 
-        songs.append(song)
+    parser.add_argument(
+        "-q", "--query", help="words to look for in song, artist and album names"
+    )
 
-    return songs
+    parser.add_argument(
+        "--db",
+        help="SQLite export to search (default: output/output.sqlite)",
+    )
 
+    parser.add_argument(
+        "--no-cache", action="store_true", help="disable the on-disk response cache"
+    )
 
-def token_exists() -> bool:
-    return TOKEN_PATH.exists() and TOKEN_PATH.read_text().strip() != ""
+    parser.add_argument(
+        "--cache-dir",
+        help="response cache directory (default: cache/ in the config directory)",
+    )
 
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        help=f"seconds a cached response is reused before it is revalidated (default: {DEFAULT_TTL_SECONDS:g})",
+    )
 
-def parse_args():
-    parser = argparse.ArgumentParser(
-        prog="apple-music-cli",
-        description="Python CLI tool to help users save Apple Music playlist data into various file formats.",
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print request counts, per-endpoint latency percentiles and time spent in network, JSON decoding and "
+        "file writes",
     )
 
     parser.add_argument(
-        "COMMAND",
-        help="Command to execute: Accepted commands - test, all-playlists, export, playlist",
-        type=str,
+        "--metrics-out", help="write the --profile summary to this JSON file"
     )
 
-    parser.add_argument("--playlistID", type=str, help="id of playlist to backup")
+    parser.add_argument(
+        "--trace-out",
+        help="write a Chrome trace-format timeline (chrome://tracing, ui.perfetto.dev) to this file",
+    )
 
     parser.add_argument(
-        "-f", "--format", type=str, help="output file format", default="json"
+        "--no-daemon",
+        action="store_true",
+        help="run the command in this process even if a daemon is running",
     )
 
-    parser.add_argument("-o", "--output", help="Output file.")
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=DEFAULT_DAEMON_PORT,
+        help="port the daemon command listens on",
+    )
 
     return parser.parse_args()
 
 
 def main() -> None:
     args = parse_args()
+    metrics: Metrics | None = None
+    if args.profile or args.metrics_out or args.trace_out:
+        metrics = Metrics()
+    try:
+        run(args, metrics)
+    finally:
+        if metrics is not None:
+            report_metrics(metrics, args)
+
+
+def report_metrics(metrics: Metrics, args: argparse.Namespace) -> None:
+    if args.profile:
+        print(metrics.format_summary())
+    if args.metrics_out:
+        metrics.write_summary(args.metrics_out)
+        print(f"Wrote metrics to {args.metrics_out}")
+    if args.trace_out:
+        metrics.write_trace(args.trace_out)
+        print(f"Wrote trace to {args.trace_out}")
+
+
+def run(args: argparse.Namespace, metrics: Metrics | None = None) -> None:
+    """
+    Execute the command given on the command line.
 
-    key_id: str = cast(str, KEY_ID)
-    team_id: str = cast(str, TEAM_ID)
-    secret_key_file_path: str = cast(str, PRIVATE_KEY_PATH)
+    :param metrics: Recorder for the --profile report, passed to every client.
+    """
+    if args.concurrency < 1 or args.workers < 1:
+        print("concurrency and workers must be at least 1.")
+        return
+    if args.rate is not None and args.rate <= 0:
+        print("rate must be greater than 0.")
+        return
+    rate: float = DEFAULT_RATE if args.rate is None else args.rate
 
-    jwt: str = generate_jwt(secret_key_file_path, team_id, key_id)
+    formats = parse_formats(args.format or "json")
+    if not formats:
+        print(f"Unknown format: {args.format}")
+        return
+    fmt: str = ",".join(formats)
+    output_file: str = args.output or f"output/output.{formats[0]}"
+    fields: List[str] | None = None
+    if args.fields:
+        fields = parse_fields(args.fields, args.enrich)
+        if fields is None:
+            return
+    if args.compress == "zstd" and not zstd_available():
+        print(
+            'zstd compression requires zstandard: pip install "apple-music-cli[zstd]"'
+        )
+        return
 
     def _write_output(data):
-        if data is None:
-            print("No data to write.")
+        if metrics is None:
+            write_output(data, fmt, output_file, compression=args.compress)
             return
-        fmt = (args.format or "json").lower()
-        if fmt == "json":
-            write_songs_to_json(data, args.output)
-        elif fmt == "csv":
-            write_songs_to_csv(data, args.output)
-        else:
-            print(f"Unknown format: {args.format}")
+        with metrics.span("write", Path(output_file).name):
+            write_output(data, fmt, output_file, compression=args.compress)
 
     cmd = (args.COMMAND or "").lower()
+    if cmd not in COMMANDS:
+        print(f"Unknown command: {args.COMMAND}")
+        return
+
+    if cmd == "search":
+        if not args.query:
+            print("query is required for this command.")
+            return
+        try:
+            results = search_tracks(args.db or "output/output.sqlite", args.query)
+        except SearchDatabaseError as e:
+            print(e)
+            return
+        for result in results:
+            print(
+                f"{result['name']} - {result['artistName']} - {result['albumName']}"
+                f" [{', '.join(result['playlists'])}]"
+            )
+        if args.output:
+            write_output(results, fmt, output_file, compression=args.compress)
+        return
+
+    if cmd in {"playlist", "export"} and not args.playlistID:
+        print("playlistID is required for this command.")
+        return
+
+    index = PlaylistIndex(PLAYLIST_INDEX_PATH)
+    playlist_name: str | None = None
+    if cmd in {"playlist", "export"} and not is_playlist_id(args.playlistID):
+        playlist_name = args.playlistID
+        try:
+            # Names known to a fresh index resolve here, before any credentials are loaded or requests sent.
+            resolved = None if index.is_stale() else index.resolve(playlist_name)
+        except AmbiguousPlaylistName as e:
+            print(e)
+            return
+        if resolved is not None:
+            args.playlistID = resolved
+            playlist_name = None
+
+    if args.enrich and args.use_async:
+        print("--enrich is not supported with --async.")
+        return
+
+    # Profiling measures this process, so profiled commands are never forwarded. The daemon's cache and rate limit
+    # are set when it starts, so commands overriding them also run here.
+    if cmd in DAEMON_COMMANDS and not (
+        args.no_daemon
+        or args.use_async
+        or args.enrich
+        or args.resume
+        or playlist_name is not None
+        or metrics is not None
+        or args.no_cache
+        or args.cache_dir is not None
+        or args.cache_ttl is not None
+        or args.rate is not None
+    ):
+        daemon = find_daemon()
+        if daemon is not None:
+            logging.info("Forwarding %s to the daemon at %s", cmd, daemon.url)
+            forward_to_daemon(daemon, cmd, args, fmt, output_file, fields, index)
+            return
+
+    accounts: List[Account] = []
+    if cmd == "batch":
+        if args.enrich or args.resume or args.use_async:
+            print("--enrich, --resume and --async are not supported with batch.")
+            return
+        if not args.accounts:
+            print("accounts is required for this command.")
+            return
+        try:
+            accounts = load_accounts(args.accounts, args.output or "output")
+        except AccountManifestError as e:
+            print(e)
+            return
+
+    # Every other command talks to the API, so the credentials and HTTP stack are only loaded from here on.
+    try:
+        credentials = load_credentials()
+    except RuntimeError as e:
+        print(e)
+        return
+    from cli.client import DEFAULT_POOL_MAXSIZE, AppleMusicClient
+
+    developer_token = DeveloperTokenCache(
+        credentials.private_key_path, credentials.team_id, credentials.key_id
+    )
+
+    cache: ResponseCache | None = None
+    if not args.no_cache:
+        cache = ResponseCache(
+            Path(args.cache_dir or CACHE_DIR),
+            ttl=DEFAULT_TTL_SECONDS if args.cache_ttl is None else args.cache_ttl,
+        )
+
+    def _client(
+        music_user_token: str | None = None,
+        connections: int = 1,
+        rate_limiter: RateLimiter | None = None,
+    ):
+        if args.enrich:
+            connections += args.workers
+        return AppleMusicClient(
+            developer_token,
+            music_user_token,
+            pool_maxsize=max(DEFAULT_POOL_MAXSIZE, connections),
+            rate_limiter=rate_limiter or RateLimiter(rate=rate),
+            cache=cache,
+            metrics=metrics,
+        )
 
     if cmd == "test":
-        get_song_data(jwt)
+        with _client() as client:
+            get_song_data(client)
         return
 
     if cmd == "all-playlists":
-        if not token_exists():
-            start_auth_flow()
-        output = get_all_playlists(jwt)
+        music_user_token = authorise()
+        if music_user_token is None:
+            return
+        with _client(music_user_token) as client:
+            output = get_all_playlists(client)
+        if output is not None:
+            index.update(output, complete=True)
         _write_output(output)
         return
 
     if cmd in {"playlist", "export"}:
-        if not args.playlistID:
-            print("playlistID is required for this command.")
+        music_user_token = authorise()
+        if music_user_token is None:
+            return
+        with _client(music_user_token, args.concurrency) as client:
+            if playlist_name is not None:
+                try:
+                    resolved = resolve_playlist_name(client, index, playlist_name)
+                except AmbiguousPlaylistName as e:
+                    print(e)
+                    return
+                if resolved is None:
+                    print(f'No playlist found named "{playlist_name}".')
+                    return
+                args.playlistID = resolved
+            if cmd == "playlist":
+                _write_output(get_playlist_by_id(client, args.playlistID))
+                return
+            with catalog_enricher(client, args) as enricher:
+                count = export_songs(
+                    client,
+                    args.playlistID,
+                    fmt,
+                    output_file,
+                    args.concurrency,
+                    enricher=enricher,
+                    compression=args.compress,
+                    resume=args.resume,
+                    fields=fields,
+                )
+        if count is None:
+            print(f"Export incomplete: {output_file} may be partially written.")
+            if checkpoint_path(
+                output_files(output_file, formats, args.compress)
+            ).exists():
+                print("Run the same command again with --resume to continue it.")
+        return
+
+    if cmd == "export-all":
+        music_user_token = authorise()
+        if music_user_token is None:
             return
-        if not token_exists():
-            start_auth_flow()
-        if cmd == "playlist":
-            output = get_playlist_by_id(jwt, args.playlistID)
+        if args.use_async:
+            import asyncio
+
+            manifest = asyncio.run(
+                _export_all_async(
+                    developer_token, music_user_token, args, fmt, metrics, fields
+                )
+            )
         else:
-            output = get_songs_in_playlist(jwt, args.playlistID)
-        _write_output(output)
+            with (
+                _client(music_user_token, args.workers * args.concurrency) as client,
+                catalog_enricher(client, args) as enricher,
+            ):
+                manifest = export_all_playlists(
+                    client,
+                    args.output or "output",
+                    fmt,
+                    args.workers,
+                    args.concurrency,
+                    enricher,
+                    args.compress,
+                    fields,
+                )
+        if manifest is not None:
+            index.update(manifest, complete=True)
+        _report_manifest(manifest)
+        return
+
+    if cmd == "library-export":
+        if args.enrich or args.fields or args.compress or args.resume:
+            print(
+                "library-export writes every song field to an uncompressed SQLite database; --enrich, --fields, "
+                "--compress and --resume are not supported."
+            )
+            return
+        if args.format and formats != ["sqlite"]:
+            print("library-export writes a SQLite database; use -o to choose its path.")
+            return
+        music_user_token = authorise()
+        if music_user_token is None:
+            return
+        database = args.output or f"output/{SQLITE_LIBRARY_FILENAME}"
+        with _client(music_user_token, max(args.workers, args.concurrency)) as client:
+            library = export_library(client, database, args.workers, args.concurrency)
+        if library is None:
+            print("No data to write.")
+            return
+        index.update(library["playlists"], complete=True)
+        failed = sum(1 for entry in library["playlists"] if entry["status"] != "ok")
+        print(
+            f"Exported {library['songs']} songs and {len(library['playlists']) - failed} playlists "
+            f"({failed} failed) to {database}."
+        )
+        if library["missing"]:
+            print(
+                f"{library['missing']} playlist tracks are not in the library songs and were left out."
+            )
         return
 
-    print(f"Unknown command: {args.COMMAND}")
+    if cmd == "batch":
+        shared = RateLimiter(rate=rate)
+        with ExitStack() as stack:
+            clients: Dict[str, AppleMusicClient] = {}
+            for account in accounts:
+                music_user_token = read_account_token(account)
+                if music_user_token is not None:
+                    clients[account.name] = stack.enter_context(
+                        _client(
+                            music_user_token,
+                            args.workers * args.concurrency,
+                            RateLimiter(rate=account.rate or rate, parent=shared),
+                        )
+                    )
+            summaries = export_accounts(
+                clients,
+                accounts,
+                fmt,
+                args.workers,
+                args.concurrency,
+                args.compress,
+                fields,
+            )
+        for entry in summaries:
+            print(
+                f"{entry['name']}: {entry['status']}, {entry['playlists'] - entry['failed']} playlists "
+                f"({entry['failed']} failed), {entry['tracks']} tracks in {entry['seconds']:.1f}s -> "
+                f"{entry['output']}"
+            )
+        failed = sum(1 for entry in summaries if entry["status"] != "ok")
+        print(
+            f"Exported {len(summaries) - failed} accounts ({failed} failed or partial)."
+        )
+        return
+
+    if cmd == "daemon":
+        if find_daemon() is not None:
+            print("A daemon is already running.")
+            return
+        music_user_token = authorise()
+        if music_user_token is None:
+            return
+        from server.daemon import run_daemon
+
+        print(f"Serving on http://{DEFAULT_DAEMON_HOST}:{args.port} (Ctrl+C to stop).")
+        with _client(music_user_token, args.workers * args.concurrency) as client:
+            run_daemon(client, DEFAULT_DAEMON_HOST, args.port)
+        return
+
+    if cmd == "sync":
+        music_user_token = authorise()
+        if music_user_token is None:
+            return
+        with (
+            _client(music_user_token, args.workers * args.concurrency) as client,
+            SyncState(STATE_DB_PATH) as state,
+        ):
+            summary = sync_playlists(
+                client,
+                state,
+                args.output or "output",
+                args.workers,
+                args.concurrency,
+            )
+        if summary is None:
+            print("No data to write.")
+            return
+        index.update(
+            (entry for entry in summary if entry["status"] != "deleted"),
+            complete=True,
+        )
+        counts = Counter(entry["status"] for entry in summary)
+        print(
+            "Synced {} playlists: {} changed, {} new, {} unchanged, {} deleted, "
+            "{} failed.".format(
+                len(summary),
+                counts["changed"],
+                counts["new"],
+                counts["unchanged"],
+                counts["deleted"],
+                counts["failed"],
+            )
+        )
+        return
 
 
 if __name__ == "__main__":
@@ -0,0 +1,328 @@
+import json
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, TypeVar
+from urllib.parse import urlparse
+
+T = TypeVar("T")
+
+# Path segments that identify a resource (p.abc123, i.xyz, 1440857781) are collapsed so requests group per endpoint.
+_ID_SEGMENT = re.compile(r"^(?:[a-z]{1,2}\.[A-Za-z0-9_-]+|\d+)$")
+
+
+def endpoint_for(url: str) -> str:
+    """
+    Normalise a request URL to its endpoint, e.g. ".../v1/me/library/playlists/p.abc/tracks?offset=100" becomes
+    "/v1/me/library/playlists/{id}/tracks".
+    """
+    segments = urlparse(url).path.split("/")
+    return "/".join("{id}" if _ID_SEGMENT.match(s) else s for s in segments)
+
+
+def percentile(samples: List[float], p: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted, non-empty list.
+    """
+    return samples[max(0, math.ceil(p / 100 * len(samples)) - 1)]
+
+
+class RequestEvent(NamedTuple):
+    endpoint: str
+    status: int  # 0 when no response was received
+    started: float
+    duration: float
+    size: int
+    attempt: int
+    thread: int
+
+
+class PageEvent(NamedTuple):
+    endpoint: str
+    source: str  # "network", "cache" or "revalidated"
+
+
+class Span(NamedTuple):
+    category: str  # "decode" or "write"
+    name: str
+    started: float
+    duration: float  # wall time of the span, as shown in the trace
+    busy: (
+        float  # time attributed to the category, excluding waits on upstream producers
+    )
+    thread: int
+
+
+class Metrics:
+    """
+    Collects per-request and per-phase timings for one CLI run.
+
+    AppleMusicClient records every HTTP exchange (endpoint, status, latency, bytes received, retry attempt), every page
+    it returns (from the network or the response cache) and the time spent decoding JSON. Exports record the time
+    spent in the file writers. Recording is thread-safe, so a single Metrics can be shared by all workers.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter) -> None:
+        self.clock = clock
+        self.started = clock()
+        self.requests: List[RequestEvent] = []
+        self.pages: List[PageEvent] = []
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def record_request(
+        self,
+        url: str,
+        status: int,
+        started: float,
+        duration: float,
+        size: int = 0,
+        attempt: int = 0,
+    ) -> None:
+        event = RequestEvent(
+            endpoint_for(url),
+            status,
+            started,
+            duration,
+            size,
+            attempt,
+            threading.get_ident(),
+        )
+        with self._lock:
+            self.requests.append(event)
+
+    def record_page(self, url: str, source: str = "network") -> None:
+        with self._lock:
+            self.pages.append(PageEvent(endpoint_for(url), source))
+
+    def record_span(
+        self,
+        category: str,
+        name: str,
+        started: float,
+        duration: float,
+        busy: float | None = None,
+    ) -> None:
+        span = Span(
+            category,
+            name,
+            started,
+            duration,
+            duration if busy is None else busy,
+            threading.get_ident(),
+        )
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, category: str, name: str = "") -> Iterator[None]:
+        started = self.clock()
+        try:
+            yield
+        finally:
+            self.record_span(
+                category, name or category, started, self.clock() - started
+            )
+
+    def measure_consumer(
+        self,
+        category: str,
+        name: str,
+        consume: Callable[[Iterator[Any]], T],
+        items: Iterable[Any],
+    ) -> T:
+        """
+        Run consume(items) as a span of `category`, excluding the time consume spends waiting for the next item.
+
+        Used for the streaming file writers, whose rows are fetched from the API while the file is being written.
+        """
+        waiting = 0.0
+
+        def _items() -> Iterator[Any]:
+            nonlocal waiting
+            iterator = iter(items)
+            while True:
+                before = self.clock()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    waiting += self.clock() - before
+                yield item
+
+        started = self.clock()
+        try:
+            return consume(_items())
+        finally:
+            duration = self.clock() - started
+            self.record_span(category, name, started, duration, duration - waiting)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        :return: Totals, time per phase and per-endpoint latency percentiles. Phase times are summed across threads,
+            so with concurrent workers they can exceed the wall time.
+        """
+        with self._lock:
+            requests = list(self.requests)
+            pages = list(self.pages)
+            spans = list(self.spans)
+
+        endpoints: Dict[str, Dict[str, Any]] = defaultdict(
+            lambda: {
+                "requests": 0,
+                "retries": 0,
+                "pages": 0,
+                "bytes": 0,
+                "statuses": defaultdict(int),
+                "latencies": [],
+            }
+        )
+        for request in requests:
+            entry = endpoints[request.endpoint]
+            entry["requests"] += 1
+            entry["retries"] += 1 if request.attempt else 0
+            entry["bytes"] += request.size
+            entry["statuses"][str(request.status)] += 1
+            entry["latencies"].append(request.duration)
+        sources: Dict[str, int] = defaultdict(int)
+        for page in pages:
+            endpoints[page.endpoint]["pages"] += 1
+            sources[page.source] += 1
+
+        for entry in endpoints.values():
+            latencies = sorted(entry.pop("latencies"))
+            entry["statuses"] = dict(entry["statuses"])
+            entry["latency_ms"] = (
+                {
+                    f"p{p}": round(percentile(latencies, p) * 1000, 3)
+                    for p in (50, 95, 99)
+                }
+                if latencies
+                else None
+            )
+
+        time_split = {
+            "network": sum(r.duration for r in requests),
+            "decode": 0.0,
+            "write": 0.0,
+        }
+        for span in spans:
+            time_split[span.category] = time_split.get(span.category, 0.0) + span.busy
+
+        return {
+            "wall_seconds": round(self.clock() - self.started, 4),
+            "requests": len(requests),
+            "retries": sum(1 for r in requests if r.attempt),
+            "pages": len(pages),
+            "pages_by_source": dict(sources),
+            "bytes": sum(r.size for r in requests),
+            "seconds": {key: round(value, 4) for key, value in time_split.items()},
+            "endpoints": dict(sorted(endpoints.items())),
+        }
+
+    def format_summary(self) -> str:
+        """
+        :return: The summary as a short human-readable report.
+        """
+        summary = self.summary()
+        lines = [
+            "Profile: {:.2f}s wall, {} requests ({} retries), {} pages, {:,} bytes received".format(
+                summary["wall_seconds"],
+                summary["requests"],
+                summary["retries"],
+                summary["pages"],
+                summary["bytes"],
+            ),
+            "Time (summed across threads): "
+            + ", ".join(
+                f"{key} {value:.3f}s" for key, value in summary["seconds"].items()
+            ),
+        ]
+        if summary["endpoints"]:
+            lines.append(
+                f"{'endpoint':<48}{'requests':>9}{'pages':>7}{'bytes':>12}"
+                f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            )
+        for endpoint, entry in summary["endpoints"].items():
+            latency = entry["latency_ms"] or {}
+            lines.append(
+                f"{endpoint:<48}{entry['requests']:>9}{entry['pages']:>7}{entry['bytes']:>12,}"
+                + "".join(
+                    f"{latency.get(key, '-'):>9}" for key in ("p50", "p95", "p99")
+                )
+            )
+        return "\n".join(lines)
+
+    def write_summary(self, path: str) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(json.dumps(self.summary(), indent=2), encoding="utf-8")
+
+    def trace_events(self) -> List[Dict[str, Any]]:
+        """
+        :return: The recorded requests and spans as Chrome trace-format complete events.
+        """
+
+        def _us(value: float) -> float:
+            return round(value * 1_000_000, 1)
+
+        with self._lock:
+            requests = list(self.requests)
+            spans = list(self.spans)
+
+        events: List[Dict[str, Any]] = []
+        for request in requests:
+            events.append(
+                {
+                    "name": request.endpoint,
+                    "cat": "network",
+                    "ph": "X",
+                    "ts": _us(request.started - self.started),
+                    "dur": _us(request.duration),
+                    "pid": 1,
+                    "tid": request.thread,
+                    "args": {
+                        "status": request.status,
+                        "bytes": request.size,
+                        "attempt": request.attempt,
+                    },
+                }
+            )
+        for span in spans:
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": span.category,
+                    "ph": "X",
+                    "ts": _us(span.started - self.started),
+                    "dur": _us(span.duration),
+                    "pid": 1,
+                    "tid": span.thread,
+                    "args": {"busy_ms": round(span.busy * 1000, 3)},
+                }
+            )
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for tid in sorted({event["tid"] for event in events}):
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": 1,
+                    "tid": tid,
+                    "args": {"name": names.get(tid, f"thread-{tid}")},
+                }
+            )
+        return events
+
+    def write_trace(self, path: str) -> None:
+        """
+        Write a Chrome trace-format timeline, viewable in chrome://tracing or https://ui.perfetto.dev.
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(
+            json.dumps({"traceEvents": self.trace_events()}), encoding="utf-8"
+        )
@@ -0,0 +1,147 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping
+
+DEFAULT_INDEX_TTL_SECONDS = 24 * 60 * 60
+
+# Library playlist IDs look like "p.b16GBvbHoRkkKo4"; anything else passed as --playlistID is treated as a name.
+_PLAYLIST_ID = re.compile(r"^p\.[A-Za-z0-9]+$")
+
+
+def is_playlist_id(value: str) -> bool:
+    return bool(_PLAYLIST_ID.match(value))
+
+
+def normalise_name(name: str) -> str:
+    """
+    Fold a playlist name for case-insensitive lookup: Unicode-normalised, case-folded and with runs of whitespace
+    collapsed.
+    """
+    return " ".join(unicodedata.normalize("NFKC", name).casefold().split())
+
+
+class AmbiguousPlaylistName(LookupError):
+    def __init__(self, name: str, matches: List[Dict[str, str]]) -> None:
+        self.matches = matches
+        candidates = ", ".join(f"{m['name']} ({m['id']})" for m in matches)
+        super().__init__(f'"{name}" matches several playlists: {candidates}')
+
+
+class PlaylistIndex:
+    """
+    Persisted map of library playlist IDs to names, used to resolve --playlistID names without listing the library.
+
+    The index is updated from every playlist listing the CLI already makes (all-playlists, export-all, sync), and
+    page by page while resolving a name it does not know. Only a complete listing removes deleted playlists and
+    restarts the staleness window; lookups against a stale index are refreshed first.
+    """
+
+    def __init__(self, path: Path, ttl: float = DEFAULT_INDEX_TTL_SECONDS) -> None:
+        """
+        :param path: JSON file the index is stored in; created, along with its directory, on the first update.
+        :param ttl: Seconds after a complete listing during which the index is trusted.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.refreshed_at = 0.0
+        self.names: Dict[str, str] = {}
+        self._by_name: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            data: Dict[str, Any] = json.loads(self.path.read_text(encoding="utf-8"))
+            self.refreshed_at = float(data.get("refreshed_at", 0.0))
+            self.names = {
+                str(pid): str(name) for pid, name in data["playlists"].items()
+            }
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            logging.warning("Ignoring unreadable playlist index %s", self.path)
+            self.refreshed_at, self.names = 0.0, {}
+        self._reindex()
+
+    def _reindex(self) -> None:
+        self._by_name = {}
+        for pid, name in self.names.items():
+            self._by_name.setdefault(normalise_name(name), []).append(pid)
+
+    def _save(self) -> None:
+        data = json.dumps(
+            {"refreshed_at": self.refreshed_at, "playlists": self.names},
+            ensure_ascii=False,
+        )
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp_path.write_text(data, encoding="utf-8")
+            os.replace(tmp_path, self.path)
+        except OSError:
+            logging.warning("Failed to write playlist index %s", self.path)
+
+    def is_stale(self) -> bool:
+        return time.time() - self.refreshed_at >= self.ttl
+
+    def update(
+        self, playlists: Iterable[Mapping[str, Any]], complete: bool = False
+    ) -> None:
+        """
+        Record the names of listed playlists.
+
+        :param playlists: Playlists with "id" and "name" keys, e.g. the records returned by get_all_playlists.
+        :param complete: The playlists are the whole library, so any other indexed playlist has been deleted.
+        """
+        names = {
+            playlist["id"]: playlist["name"]
+            for playlist in playlists
+            if playlist.get("id") and playlist.get("name")
+        }
+        with self._lock:
+            if complete:
+                self.names = names
+                self.refreshed_at = time.time()
+            elif all(self.names.get(pid) == name for pid, name in names.items()):
+                return
+            else:
+                self.names.update(names)
+            self._reindex()
+            self._save()
+
+    def lookup(self, name: str) -> List[Dict[str, str]]:
+        """
+        Find the playlists a name refers to: an exact match wins over a case-insensitive one, which wins over
+        playlists whose name starts with it.
+
+        :return: The matching playlists as {"id", "name"} dictionaries; empty if there are none.
+        """
+        with self._lock:
+            exact = [pid for pid, indexed in self.names.items() if indexed == name]
+            if not exact:
+                key = normalise_name(name)
+                exact = self._by_name.get(key, [])
+                if not exact and key:
+                    exact = [
+                        pid
+                        for indexed, pids in self._by_name.items()
+                        if indexed.startswith(key)
+                        for pid in pids
+                    ]
+            return [{"id": pid, "name": self.names[pid]} for pid in sorted(exact)]
+
+    def resolve(self, name: str) -> str | None:
+        """
+        :return: The ID of the only playlist the name refers to, or None if it matches none.
+        :raises AmbiguousPlaylistName: If it matches several playlists.
+        """
+        matches = self.lookup(name)
+        if len(matches) > 1:
+            raise AmbiguousPlaylistName(name, matches)
+        return matches[0]["id"] if matches else None
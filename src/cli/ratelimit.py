@@ -0,0 +1,152 @@
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable
+
+DEFAULT_RATE = 20.0
+DEFAULT_MIN_RATE = 0.5
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket shared by every request a client sends.
+
+    The refill rate adapts to the server: each 429 halves it (down to min_rate) and pauses the bucket for the
+    Retry-After period, while each successful response raises it again by `recovery` requests per second until it is
+    back at max_rate.
+
+    A limiter may draw on a parent limiter as well, e.g. one limiter per user account under one for the developer
+    token they share: every request then needs a token from both buckets, and 429s and successes are passed on to the
+    parent, since the server does not say which budget was exceeded.
+    """
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        burst: int | None = None,
+        min_rate: float = DEFAULT_MIN_RATE,
+        recovery: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        parent: "RateLimiter | None" = None,
+    ) -> None:
+        """
+        :param rate: Requests per second allowed when the server is not throttling.
+        :param burst: Maximum number of requests that may be sent back to back. Defaults to the rate.
+        :param min_rate: Lowest rate the limiter will back off to.
+        :param recovery: Requests per second added back to the rate after each successful response.
+        :param clock: Monotonic clock, in seconds.
+        :param sleep: Function used to wait for a token.
+        :param parent: Limiter of a wider budget that every request must also take a token from.
+        """
+        self.max_rate: float = rate
+        self.min_rate: float = min(min_rate, rate)
+        self.burst: float = float(burst if burst is not None else max(1, int(rate)))
+        self.recovery: float = recovery
+        self._clock = clock
+        self._sleep = sleep
+        self.parent: RateLimiter | None = parent
+
+        self._rate: float = rate
+        self._tokens: float = self.burst
+        self._updated: float = clock()
+        self._blocked_until: float = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - max(self._updated, self._blocked_until))
+        self._tokens = min(self.burst, self._tokens + elapsed * self._rate)
+        self._updated = max(now, self._updated)
+
+    def reserve(self) -> float:
+        """
+        Take a token from the bucket, going into debt if it is empty.
+
+        :return: Seconds the caller must wait before sending its request.
+        """
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            self._tokens -= 1
+            wait = max(0.0, self._blocked_until - now)
+            if self._tokens < 0:
+                wait += -self._tokens / self._rate
+        if self.parent is not None:
+            wait = max(wait, self.parent.reserve())
+        return wait
+
+    def acquire(self) -> None:
+        """
+        Block until the caller may send a request.
+        """
+        wait = self.reserve()
+        if wait > 0:
+            self._sleep(wait)
+
+    def throttle(self, pause: float) -> None:
+        """
+        Record a 429 response: halve the rate and hold every caller back for `pause` seconds.
+        """
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            self._rate = max(self.min_rate, self._rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            self._blocked_until = max(self._blocked_until, now + pause)
+        if self.parent is not None:
+            self.parent.throttle(pause)
+
+    def succeed(self) -> None:
+        """
+        Record a successful response, letting the rate recover towards max_rate.
+        """
+        with self._lock:
+            self._rate = min(self.max_rate, self._rate + self.recovery)
+        if self.parent is not None:
+            self.parent.succeed()
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    How often, and after how long, failed requests are retried.
+
+    Delays use "full jitter" exponential backoff: a random value between zero and base_delay * 2 ** attempt, capped at
+    max_delay.
+    """
+
+    max_retries: int = 5
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Parse a Retry-After header given either as delay-seconds or as an HTTP date.
+
+    :return: Seconds to wait, or None if the header is missing or malformed.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,243 @@
+import sys
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+# Genre lists repeat across most of a library, so every distinct list is stored once as a shared tuple.
+_genre_lists: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if type(value) is str else value
+
+
+def _intern_genres(genres: Iterable[Any] | None) -> Tuple[str, ...]:
+    if not genres:
+        return ()
+    key = tuple(genres)
+    shared = _genre_lists.get(key)
+    if shared is None:
+        shared = tuple(sys.intern(genre) for genre in key if isinstance(genre, str))
+        _genre_lists[key] = shared
+    return shared
+
+
+class Record(Mapping):
+    """
+    Compact, read-only record exposing the same keys as the dictionaries the API functions used to return.
+
+    Subclasses store their values in __slots__ instead of a per-item dict, and list the keys they expose, in output
+    order, in KEYS. Tuple values are exposed as lists, so records compare equal to, and serialise like, the
+    equivalent dictionaries.
+    """
+
+    __slots__ = ()
+    KEYS: Tuple[str, ...] = ()
+    ATTRIBUTES: Tuple[str, ...] = ()
+    _attribute_for: Dict[str, str] = {}
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._attribute_for = dict(zip(cls.KEYS, cls.ATTRIBUTES))
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            value = getattr(self, self._attribute_for[key])
+        except KeyError:
+            raise KeyError(key) from None
+        return list(value) if isinstance(value, tuple) else value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.KEYS)
+
+    def __len__(self) -> int:
+        return len(self.KEYS)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.as_dict()!r})"
+
+    def row(self, keys: Iterable[str] | None = None, missing: Any = "") -> List[Any]:
+        """
+        :param keys: Keys to return the values of, in order. Defaults to KEYS.
+        :param missing: Value of keys the record does not have; "" suits a CSV row.
+        :return: The values as a list, e.g. for a CSV row.
+        """
+        output = []
+        for key in self.KEYS if keys is None else keys:
+            attribute = self._attribute_for.get(key)
+            value = missing if attribute is None else getattr(self, attribute)
+            output.append(list(value) if isinstance(value, tuple) else value)
+        return output
+
+    def as_dict(self) -> Dict[str, Any]:
+        output: Dict[str, Any] = {}
+        for key, attribute in zip(self.KEYS, self.ATTRIBUTES):
+            value = getattr(self, attribute)
+            output[key] = list(value) if isinstance(value, tuple) else value
+        return output
+
+
+class Track(Record):
+    """
+    A library song, projected to the SONG_FIELDS keys. Artist, album, genre and release date strings are interned, so
+    values shared by many tracks are stored once.
+
+    catalog_id holds the song's Apple Music catalog ID when it was asked for; it is not one of the record's keys.
+    """
+
+    __slots__ = (
+        "name",
+        "artist_name",
+        "album_name",
+        "genre_names",
+        "release_date",
+        "catalog_id",
+    )
+    KEYS: Tuple[str, ...] = (
+        "name",
+        "artistName",
+        "albumName",
+        "genreNames",
+        "releaseDate",
+    )
+    ATTRIBUTES: Tuple[str, ...] = (
+        "name",
+        "artist_name",
+        "album_name",
+        "genre_names",
+        "release_date",
+    )
+
+    def __init__(
+        self,
+        name: str | None,
+        artist_name: str | None = None,
+        album_name: str | None = None,
+        genre_names: Iterable[str] | None = None,
+        release_date: str | None = None,
+        catalog_id: str | None = None,
+    ) -> None:
+        self.name = name
+        self.artist_name = _intern(artist_name)
+        self.album_name = _intern(album_name)
+        self.genre_names = _intern_genres(genre_names)
+        self.release_date = _intern(release_date)
+        self.catalog_id = catalog_id
+
+    @classmethod
+    def from_attributes(
+        cls, attributes: Dict[str, Any], catalog_id: bool = False
+    ) -> "Track":
+        """
+        :param attributes: The "attributes" of a library-songs resource.
+        :param catalog_id: Keep the catalog ID from the song's playParams, for catalog enrichment.
+        """
+        play_params = attributes.get("playParams") if catalog_id else None
+        return cls(
+            attributes.get("name"),
+            attributes.get("artistName"),
+            attributes.get("albumName"),
+            attributes.get("genreNames"),
+            attributes.get("releaseDate"),
+            play_params.get("catalogId") if isinstance(play_params, dict) else None,
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        # Spelled out because it runs once per exported row.
+        return {
+            "name": self.name,
+            "artistName": self.artist_name,
+            "albumName": self.album_name,
+            "genreNames": list(self.genre_names),
+            "releaseDate": self.release_date,
+        }
+
+
+class EnrichedTrack(Track):
+    """
+    A library song with the catalog fields fetched by cli.enrich appended to its keys. Fields the catalog did not
+    return are None.
+    """
+
+    __slots__ = ("isrc", "duration_in_millis", "composer_name")
+    isrc: str | None
+    duration_in_millis: int | None
+    composer_name: str | None
+    KEYS = Track.KEYS + ("catalogId", "isrc", "durationInMillis", "composerName")
+    ATTRIBUTES = Track.ATTRIBUTES + (
+        "catalog_id",
+        "isrc",
+        "duration_in_millis",
+        "composer_name",
+    )
+
+    @classmethod
+    def from_track(
+        cls, track: Track, catalog: Tuple[Any, Any, Any] | None
+    ) -> "EnrichedTrack":
+        """
+        :param catalog: The (isrc, durationInMillis, composerName) of the track's catalog song, if it was found.
+        """
+        enriched = cls.__new__(cls)
+        enriched.name = track.name
+        enriched.artist_name = track.artist_name
+        enriched.album_name = track.album_name
+        enriched.genre_names = track.genre_names
+        enriched.release_date = track.release_date
+        enriched.catalog_id = track.catalog_id
+        enriched.isrc, enriched.duration_in_millis, enriched.composer_name = (
+            catalog or (None, None, None)
+        )
+        return enriched
+
+    def as_dict(self) -> Dict[str, Any]:
+        output = super().as_dict()
+        output["catalogId"] = self.catalog_id
+        output["isrc"] = self.isrc
+        output["durationInMillis"] = self.duration_in_millis
+        output["composerName"] = self.composer_name
+        return output
+
+
+class Playlist(Record):
+    """
+    A library playlist, projected to its name, ID and the date it was added (DD-MM-YYYY). The lastModifiedDate is
+    kept for sync, but is not one of the keys.
+    """
+
+    __slots__ = ("name", "id", "date_added", "last_modified")
+    KEYS = ("name", "id", "dateAdded")
+    ATTRIBUTES = ("name", "id", "date_added")
+
+    def __init__(
+        self,
+        name: str | None,
+        id: str | None,
+        date_added: str | None = None,
+        last_modified: str | None = None,
+    ) -> None:
+        self.name = name
+        self.id = id
+        self.date_added = date_added
+        self.last_modified = last_modified
+
+
+def as_dict(row: Mapping) -> Dict[str, Any]:
+    """
+    Return a record as a plain dictionary, for serialisers such as json.dumps that only accept dicts. Dictionaries
+    are returned unchanged.
+    """
+    if isinstance(row, dict):
+        return row
+    if isinstance(row, Record):
+        return row.as_dict()
+    return dict(row)
+
+
+def select(row: Mapping, keys: Iterable[str]) -> Dict[str, Any]:
+    """
+    Return the given keys of a record or dictionary as a plain dictionary, in order. Missing keys map to None.
+    """
+    if isinstance(row, Record):
+        keys = list(keys)
+        return dict(zip(keys, row.row(keys, None)))
+    return {key: row.get(key) for key in keys}
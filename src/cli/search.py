@@ -0,0 +1,71 @@
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, List
+
+
+class SearchDatabaseError(RuntimeError):
+    pass
+
+
+def _match_expression(query: str) -> str:
+    """
+    Turn free text into an FTS5 query: every word must prefix-match a song, artist or album name.
+    """
+    terms = query.split()
+    return " ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+def search_tracks(db_path: str, query: str, limit: int = 50) -> List[Dict[str, Any]]:
+    """
+    Search an export database written with `-f sqlite` without touching the API.
+
+    :param db_path: Path to the SQLite export.
+    :param query: Words to look for in song, artist and album names.
+    :param limit: Maximum number of tracks to return.
+    :return: Matching tracks, best match first, with the names of the playlists that contain them.
+    :raises SearchDatabaseError: If the file does not exist or is not an export database.
+    """
+    if not Path(db_path).exists():
+        raise SearchDatabaseError(f"No export database at {db_path}")
+    expression = _match_expression(query)
+    if not expression:
+        return []
+
+    connection = sqlite3.connect(
+        Path(db_path).resolve().as_uri() + "?mode=ro", uri=True
+    )
+    connection.row_factory = sqlite3.Row
+    try:
+        rows = connection.execute(
+            """
+            SELECT tracks.name, tracks.artist_name, tracks.album_name,
+                   tracks.release_date,
+                   (SELECT group_concat(name, char(31)) FROM (
+                        SELECT DISTINCT coalesce(playlists.name, playlists.id) AS name
+                        FROM playlist_tracks
+                        JOIN playlists ON playlists.id = playlist_tracks.playlist_id
+                        WHERE playlist_tracks.track_id = tracks.id
+                   )) AS playlists
+            FROM tracks_fts
+            JOIN tracks ON tracks.id = tracks_fts.rowid
+            WHERE tracks_fts MATCH ?
+            ORDER BY tracks_fts.rank
+            LIMIT ?
+            """,
+            (expression, limit),
+        ).fetchall()
+    except sqlite3.DatabaseError as e:
+        raise SearchDatabaseError(f"{db_path} is not a searchable export: {e}") from e
+    finally:
+        connection.close()
+
+    return [
+        {
+            "name": row["name"],
+            "artistName": row["artist_name"],
+            "albumName": row["album_name"],
+            "releaseDate": row["release_date"],
+            "playlists": row["playlists"].split("\x1f") if row["playlists"] else [],
+        }
+        for row in rows
+    ]
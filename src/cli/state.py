@@ -0,0 +1,131 @@
+import hashlib
+import json
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Sequence
+
+from cli.records import as_dict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS playlists (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    last_modified TEXT,
+    track_hash TEXT NOT NULL,
+    synced_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS playlist_tracks (
+    playlist_id TEXT NOT NULL REFERENCES playlists (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    song TEXT NOT NULL,
+    PRIMARY KEY (playlist_id, position)
+);
+"""
+
+
+def track_key(song: Mapping[str, Any]) -> str:
+    """
+    Stable identity of a song, used to diff track lists between syncs.
+    """
+    return json.dumps(as_dict(song), sort_keys=True, ensure_ascii=False)
+
+
+def track_hash(songs: Sequence[Mapping[str, Any]]) -> str:
+    """
+    Hash of an ordered track list; changes whenever a track is added, removed or moved.
+    """
+    digest = hashlib.sha256()
+    for song in songs:
+        digest.update(track_key(song).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class SyncState:
+    """
+    SQLite store of what the last sync saw for each playlist: its lastModifiedDate, a hash of its track list and the
+    tracks themselves, so the next sync can skip unchanged playlists and diff the changed ones.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """
+        :param path: SQLite database file; created, along with its directory, if it does not exist.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self) -> "SyncState":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def playlist(self, playlist_id: str) -> Dict[str, Any] | None:
+        """
+        :return: The stored id, name, last_modified, track_hash and synced_at of a playlist, or None if it has never
+            been synced.
+        """
+        row = self.connection.execute(
+            "SELECT * FROM playlists WHERE id = ?", (playlist_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def playlist_ids(self) -> List[str]:
+        return [
+            row["id"] for row in self.connection.execute("SELECT id FROM playlists")
+        ]
+
+    def tracks(self, playlist_id: str) -> List[Dict[str, Any]]:
+        """
+        :return: The songs stored for a playlist, in playlist order.
+        """
+        rows = self.connection.execute(
+            "SELECT song FROM playlist_tracks WHERE playlist_id = ? ORDER BY position",
+            (playlist_id,),
+        )
+        return [json.loads(row["song"]) for row in rows]
+
+    def save(
+        self,
+        playlist_id: str,
+        name: str | None,
+        last_modified: str | None,
+        songs: Sequence[Mapping[str, Any]],
+    ) -> None:
+        """
+        Replace the stored state of a playlist with a freshly fetched track list.
+        """
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO playlists VALUES (?, ?, ?, ?, ?)",
+                (
+                    playlist_id,
+                    name,
+                    last_modified,
+                    track_hash(songs),
+                    datetime.now(timezone.utc).isoformat(),
+                ),
+            )
+            self.connection.execute(
+                "DELETE FROM playlist_tracks WHERE playlist_id = ?", (playlist_id,)
+            )
+            self.connection.executemany(
+                "INSERT INTO playlist_tracks VALUES (?, ?, ?)",
+                (
+                    (playlist_id, position, track_key(song))
+                    for position, song in enumerate(songs)
+                ),
+            )
+
+    def delete(self, playlist_id: str) -> None:
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM playlists WHERE id = ?", (playlist_id,)
+            )
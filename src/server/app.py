@@ -1,13 +1,14 @@
+from functools import lru_cache
 from pathlib import Path
-from typing import cast
 
 from fastapi import FastAPI
 from fastapi.responses import HTMLResponse
 from pydantic import BaseModel
 
-from cli.auth import generate_jwt
-from cli.config import TOKEN_PATH
-from cli.main import KEY_ID, PRIVATE_KEY_PATH, TEAM_ID
+from cli.auth import get_developer_token, token_handoff
+from cli.config import TOKEN_PATH, load_credentials
+
+TEMPLATE_PATH = Path(__file__).parent / "templates" / "login.html"
 
 
 class TokenPayload(BaseModel):
@@ -17,23 +18,29 @@ class TokenPayload(BaseModel):
 app = FastAPI()
 
 
+@lru_cache(maxsize=1)
+def render_login_page(developer_token: str) -> str:
+    """
+    Render the MusicKit login page. The template is read once and the page is re-rendered only when the developer
+    token changes.
+    """
+    return TEMPLATE_PATH.read_text().replace("{{ DEV_TOKEN }}", developer_token)
+
+
 # Serve MusicKit Login page
 @app.get("/login", response_class=HTMLResponse)
 def login() -> HTMLResponse:
-    key_id: str = cast(str, KEY_ID)
-    team_id: str = cast(str, TEAM_ID)
-    secret_key_file_path: str = cast(str, PRIVATE_KEY_PATH)
-    html: str = Path("server/templates/login.html").read_text()
-    return HTMLResponse(
-        html.replace(
-            "{{ DEV_TOKEN }}", generate_jwt(secret_key_file_path, team_id, key_id)
-        )
+    credentials = load_credentials()
+    developer_token = get_developer_token(
+        credentials.private_key_path, credentials.team_id, credentials.key_id
     )
+    return HTMLResponse(render_login_page(developer_token))
 
 
-# Receive and store Music User Token
+# Receive and store Music User Token, then hand it to the waiting CLI
 @app.post("/callback")
 def callback(payload: TokenPayload) -> dict[str, str]:
     TOKEN_PATH.parent.mkdir(parents=True, exist_ok=True)
     TOKEN_PATH.write_text(payload.token)
+    token_handoff.deliver(payload.token)
     return {"status": "ok"}
@@ -0,0 +1,131 @@
+import logging
+import secrets
+from typing import Any, Dict, List
+
+from fastapi import Depends, FastAPI, Header, HTTPException
+from pydantic import BaseModel
+
+from cli.client import AppleMusicClient
+from cli.daemon_client import (
+    DEFAULT_DAEMON_HOST,
+    DEFAULT_DAEMON_PORT,
+    remove_daemon_file,
+    write_daemon_file,
+)
+from cli.export import (
+    export_all_playlists,
+    export_songs,
+    get_all_playlists,
+    get_playlist_by_id,
+)
+
+
+class ExportRequest(BaseModel):
+    output: str
+    format: str = "json"
+    concurrency: int = 1
+    compression: str | None = None
+    fields: List[str] | None = None
+
+
+class ExportAllRequest(BaseModel):
+    output_dir: str
+    format: str = "json"
+    workers: int = 4
+    concurrency: int = 1
+    compression: str | None = None
+    fields: List[str] | None = None
+
+
+def create_app(client: AppleMusicClient, secret: str) -> FastAPI:
+    """
+    Build the daemon API around a long-lived client, so every request reuses its pooled connections, cached developer
+    token and response cache.
+
+    :param client: Client authorised with the user's Music-User-Token.
+    :param secret: Shared secret every request must present as a bearer token.
+    """
+    app = FastAPI()
+
+    def _check_secret(authorization: str = Header(default="")) -> None:
+        if not secrets.compare_digest(authorization, "Bearer " + secret):
+            raise HTTPException(status_code=401, detail="Invalid daemon secret")
+
+    authorised = [Depends(_check_secret)]
+
+    @app.get("/health", dependencies=authorised)
+    def health() -> Dict[str, str]:
+        return {"status": "ok"}
+
+    @app.get("/playlists", dependencies=authorised)
+    def playlists() -> List[Dict[str, Any]]:
+        output = get_all_playlists(client)
+        if output is None:
+            raise HTTPException(status_code=502, detail="Failed to fetch playlists")
+        return [playlist.as_dict() for playlist in output]
+
+    @app.get("/playlists/{playlist_id}", dependencies=authorised)
+    def playlist(playlist_id: str) -> List[Dict[str, Any]]:
+        output = get_playlist_by_id(client, playlist_id)
+        if output is None:
+            raise HTTPException(status_code=502, detail="Failed to fetch playlist")
+        return [playlist.as_dict() for playlist in output]
+
+    @app.post("/playlists/{playlist_id}/export", dependencies=authorised)
+    def export(playlist_id: str, request: ExportRequest) -> Dict[str, Any]:
+        count = export_songs(
+            client,
+            playlist_id,
+            request.format,
+            request.output,
+            request.concurrency,
+            compression=request.compression,
+            fields=request.fields,
+        )
+        if count is None:
+            raise HTTPException(
+                status_code=502,
+                detail=f"Export incomplete: {request.output} may be partially written.",
+            )
+        return {"file": request.output, "tracks": count}
+
+    @app.post("/export-all", dependencies=authorised)
+    def export_all(request: ExportAllRequest) -> List[Dict[str, Any]]:
+        manifest = export_all_playlists(
+            client,
+            request.output_dir,
+            request.format,
+            request.workers,
+            request.concurrency,
+            compression=request.compression,
+            fields=request.fields,
+        )
+        if manifest is None:
+            raise HTTPException(status_code=502, detail="Failed to fetch playlists")
+        return manifest
+
+    return app
+
+
+def run_daemon(
+    client: AppleMusicClient,
+    host: str = DEFAULT_DAEMON_HOST,
+    port: int = DEFAULT_DAEMON_PORT,
+) -> None:
+    """
+    Serve the daemon API until interrupted, advertising it to CLI invocations through the daemon file.
+    """
+    import uvicorn
+
+    secret = secrets.token_urlsafe(32)
+    server = uvicorn.Server(
+        uvicorn.Config(
+            create_app(client, secret), host=host, port=port, log_level="warning"
+        )
+    )
+    write_daemon_file(f"http://{host}:{port}", secret)
+    logging.info("Daemon listening on http://%s:%d", host, port)
+    try:
+        server.run()
+    finally:
+        remove_daemon_file(secret)
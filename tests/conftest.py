@@ -0,0 +1,70 @@
+import json
+from typing import Any, Callable, Dict, List, Tuple
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from cli.client import AppleMusicClient
+from cli.ratelimit import RetryPolicy
+
+Handler = Callable[[requests.PreparedRequest], Tuple[int, Any, Dict[str, str]]]
+
+
+class FakeAdapter(BaseAdapter):
+    """
+    Transport adapter that answers requests from in-process handlers instead of the network.
+
+    Handlers are registered per path and return (status, body, headers). Every request is recorded in `requests`.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.routes: Dict[str, Handler] = {}
+        self.requests: List[requests.PreparedRequest] = []
+
+    def route(self, path: str, handler: Handler) -> None:
+        self.routes[path] = handler
+
+    def json(self, path: str, body: Any, status: int = 200) -> None:
+        self.route(path, lambda request: (status, body, {}))
+
+    def send(self, request, **kwargs):  # type: ignore[no-untyped-def, override]
+        self.requests.append(request)
+        path = requests.utils.urlparse(request.url).path
+        handler = self.routes.get(path)
+        if handler is None:
+            status, body, headers = 404, {"errors": []}, {}
+        else:
+            status, body, headers = handler(request)
+
+        response = requests.Response()
+        response.status_code = status
+        response.url = request.url
+        response.request = request
+        response.headers.update(headers)
+        if isinstance(body, bytes):
+            response._content = body
+        else:
+            response._content = json.dumps(body).encode("utf-8")
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def fake_api() -> FakeAdapter:
+    return FakeAdapter()
+
+
+@pytest.fixture
+def client(fake_api: FakeAdapter) -> AppleMusicClient:
+    """
+    AppleMusicClient answered by fake_api. A failed request is retried once, without waiting.
+    """
+    client = AppleMusicClient(
+        "dev-token", "user-token", retry_policy=RetryPolicy(max_retries=1, base_delay=0)
+    )
+    client.session.mount("https://", fake_api)
+    return client
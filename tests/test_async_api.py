@@ -0,0 +1,172 @@
+import asyncio
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+import cli.export
+from cli.async_api import (
+    AsyncAppleMusicClient,
+    export_all_playlists_async,
+    iter_songs_in_playlist_async,
+)
+from cli.ratelimit import RetryPolicy
+
+httpx = pytest.importorskip("httpx")
+
+"""
+Async API Tests
+"""
+PLAYLISTS_PATH = "/v1/me/library/playlists"
+
+
+def library_handler(
+    track_count: int, page_size: int = 100, throttle_first=False, playlists=None
+):
+    throttled = []
+    playlists = playlists or {"p.test": "Mix"}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if throttle_first and not throttled:
+            throttled.append(request)
+            return httpx.Response(429, headers={"Retry-After": "0"}, json={})
+        if path == PLAYLISTS_PATH:
+            return httpx.Response(
+                200,
+                json={
+                    "data": [
+                        {"id": pid, "attributes": {"name": name}}
+                        for pid, name in playlists.items()
+                    ]
+                },
+            )
+        offset = int(request.url.params.get("offset", 0))
+        end = min(offset + page_size, track_count)
+        body: dict = {
+            "data": [{"attributes": {"name": f"Song {i}"}} for i in range(offset, end)],
+            "meta": {"total": track_count},
+        }
+        if end < track_count:
+            body["next"] = f"{path}?offset={end}"
+        return httpx.Response(200, json=body)
+
+    return handler
+
+
+def make_client(handler) -> AsyncAppleMusicClient:
+    return AsyncAppleMusicClient(
+        "dev-token",
+        "user-token",
+        retry_policy=RetryPolicy(base_delay=0),
+        transport=httpx.MockTransport(handler),
+    )
+
+
+# Test 1: Pages are prefetched concurrently and yielded in playlist order
+def test_iter_songs_async_keeps_order() -> None:
+    async def run() -> list:
+        async with make_client(library_handler(950)) as client:
+            pages = iter_songs_in_playlist_async(client, "p.test", prefetch=4)
+            return [song["name"] async for page in pages for song in page]
+
+    assert asyncio.run(run()) == [f"Song {i}" for i in range(950)]
+
+
+# Test 2: The async pipeline exports every playlist and writes a manifest
+def test_export_all_async(tmp_path: Path) -> None:
+    async def run():
+        async with make_client(library_handler(250, throttle_first=True)) as client:
+            return await export_all_playlists_async(client, str(tmp_path))
+
+    manifest = asyncio.run(run())
+
+    assert manifest == [
+        {
+            "id": "p.test",
+            "name": "Mix",
+            "file": "Mix (p.test).json",
+            "tracks": 250,
+            "status": "ok",
+        }
+    ]
+    assert len(json.loads((tmp_path / "Mix (p.test).json").read_text())) == 250
+
+
+# Test 3: A failed playlist listing returns None
+def test_export_async_failure(tmp_path: Path) -> None:
+    async def run():
+        def handler(request):
+            return httpx.Response(403, json={})
+
+        async with make_client(handler) as client:
+            return await export_all_playlists_async(client, str(tmp_path))
+
+    assert asyncio.run(run()) is None
+
+
+# Test 4: A playlist whose writer fails is recorded as failed; the others still finish
+def test_export_async_writer_failure(tmp_path: Path) -> None:
+    # A directory in place of the output file makes opening it fail.
+    (tmp_path / "Mix (p.test).json").mkdir()
+
+    async def run():
+        handler = library_handler(10, playlists={"p.test": "Mix", "p.ok": "Fine"})
+        async with make_client(handler) as client:
+            return await export_all_playlists_async(client, str(tmp_path))
+
+    manifest = asyncio.run(run())
+
+    assert [(entry["id"], entry["status"]) for entry in manifest] == [
+        ("p.test", "failed"),
+        ("p.ok", "ok"),
+    ]
+    assert (tmp_path / "manifest.json").exists()
+
+
+# Test 5: Exporting more playlists at once than the default executor has workers does not deadlock
+def test_export_async_more_playlists_than_workers(tmp_path: Path) -> None:
+    playlists = {f"p.{i}": f"Mix {i}" for i in range(6)}
+
+    async def run():
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=2)
+        )
+        handler = library_handler(250, playlists=playlists)
+        async with make_client(handler) as client:
+            return await export_all_playlists_async(
+                client, str(tmp_path), max_playlists=len(playlists)
+            )
+
+    manifest = asyncio.run(run())
+
+    assert [(entry["id"], entry["tracks"]) for entry in manifest] == [
+        (pid, 250) for pid in playlists
+    ]
+
+
+# Test 6: A database error in the shared SQLite export only fails its own playlist
+def test_export_async_sqlite_failure(tmp_path: Path, monkeypatch) -> None:
+    write_songs_to_sqlite = cli.export.write_songs_to_sqlite
+
+    def locked(rows, output_file, playlist_id, **kwargs):
+        if playlist_id == "p.test":
+            raise sqlite3.OperationalError("database is locked")
+        return write_songs_to_sqlite(rows, output_file, playlist_id, **kwargs)
+
+    monkeypatch.setattr(cli.export, "write_songs_to_sqlite", locked)
+
+    async def run():
+        handler = library_handler(10, playlists={"p.test": "Mix", "p.ok": "Fine"})
+        async with make_client(handler) as client:
+            return await export_all_playlists_async(client, str(tmp_path), "sqlite")
+
+    manifest = asyncio.run(run())
+
+    assert [(entry["id"], entry["status"]) for entry in manifest] == [
+        ("p.test", "failed"),
+        ("p.ok", "ok"),
+    ]
+    assert (tmp_path / "manifest.json").exists()
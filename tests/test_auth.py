@@ -1,10 +1,27 @@
+import os
+import socket
+import stat
+import threading
+import time
+import urllib.error
+import urllib.request
 from pathlib import Path
 from typing import Any
 
 import jwt
 import pytest
 
-from cli.auth import InvalidKeyIdException, InvalidTeamIdException, generate_jwt
+import cli.auth
+from cli.auth import (
+    AuthServerError,
+    AuthTimeoutError,
+    DeveloperTokenCache,
+    InvalidKeyIdException,
+    InvalidTeamIdException,
+    TokenHandoff,
+    generate_jwt,
+    start_auth_flow,
+)
 
 """
 JWT Tests
@@ -77,3 +94,146 @@ def test_invalid_team_id_length():
 def test_invalid_key_id_length():
     with pytest.raises(InvalidKeyIdException):
         generate_jwt(TEST_SECRET_KEY_FILE_PATH, TEST_TEAM_ID, "SHORT")
+
+
+"""
+Developer Token Cache Tests
+"""
+
+
+def make_cache(cache_path: Path, **kwargs: Any) -> DeveloperTokenCache:
+    return DeveloperTokenCache(
+        TEST_SECRET_KEY_FILE_PATH, TEST_TEAM_ID, TEST_KEY_ID, cache_path, **kwargs
+    )
+
+
+# Test 1: Tokens are reused from memory until they near expiry
+def test_token_cache_reuses_token(tmp_path: Path, monkeypatch) -> None:
+    cache = make_cache(tmp_path / "developer_token.json")
+    token = cache.get()
+
+    monkeypatch.setattr(cache, "_sign", lambda: pytest.fail("token was re-signed"))
+    assert cache.get() == token
+
+
+# Test 2: Tokens persist to disk and are shared between instances
+def test_token_cache_persists_to_disk(tmp_path: Path, monkeypatch) -> None:
+    cache_path = tmp_path / "developer_token.json"
+    token = make_cache(cache_path).get()
+
+    second = make_cache(cache_path)
+    monkeypatch.setattr(second, "_sign", lambda: pytest.fail("token was re-signed"))
+    assert second.get() == token
+
+
+# Test 3: Cached tokens for a different key are ignored
+def test_token_cache_ignores_other_keys(tmp_path: Path) -> None:
+    cache_path = tmp_path / "developer_token.json"
+    make_cache(cache_path).get()
+
+    other = DeveloperTokenCache(
+        TEST_SECRET_KEY_FILE_PATH, TEST_TEAM_ID, "YYYYYYYYYY", cache_path
+    )
+    assert jwt.get_unverified_header(other.get())["kid"] == "YYYYYYYYYY"
+
+
+# Test 4: Tokens inside the refresh margin are re-signed
+def test_token_cache_refreshes_before_expiry(tmp_path: Path) -> None:
+    cache = make_cache(tmp_path / "developer_token.json")
+    token = cache.get()
+
+    cache.refresh_margin = 25 * 60 * 60
+    assert cache.get() != token  # ES256 signatures are randomised
+
+
+# Test 5: The cache file is only ever readable by the current user, even replacing a world-readable one
+def test_token_cache_file_is_private(tmp_path: Path) -> None:
+    cache_path = tmp_path / "developer_token.json"
+    cache_path.write_text("{}")
+    cache_path.chmod(0o644)
+
+    umask = os.umask(0)
+    try:
+        make_cache(cache_path).get()
+    finally:
+        os.umask(umask)
+
+    assert stat.S_IMODE(cache_path.stat().st_mode) == 0o600
+    assert [path.name for path in tmp_path.iterdir()] == ["developer_token.json"]
+
+
+"""
+Auth Handoff Tests
+"""
+
+
+# Test 1: A delivered token wakes the waiting thread
+def test_handoff_delivers_token() -> None:
+    handoff = TokenHandoff()
+    threading.Timer(0.05, handoff.deliver, args=("user-token",)).start()
+
+    started = time.monotonic()
+    assert handoff.wait(timeout=5) == "user-token"
+    assert time.monotonic() - started < 1
+
+
+# Test 2: Waiting gives up after the timeout
+def test_handoff_times_out() -> None:
+    with pytest.raises(AuthTimeoutError):
+        TokenHandoff().wait(timeout=0.01)
+
+
+# Test 3: Closing the handoff without a token fails the wait
+def test_handoff_closed_without_token() -> None:
+    handoff = TokenHandoff()
+    handoff.close()
+
+    with pytest.raises(AuthServerError):
+        handoff.wait(timeout=5)
+
+
+# Test 4: The auth flow returns the token from /callback and shuts the server down
+def test_auth_flow_shuts_down_server(tmp_path: Path, monkeypatch) -> None:
+    import server.app
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    monkeypatch.setattr(cli.auth, "AUTH_SERVER_PORT", port)
+    monkeypatch.setattr(server.app, "TOKEN_PATH", tmp_path / "music_user_token")
+
+    def fake_browser(url: str) -> None:
+        def authorise() -> None:
+            request = urllib.request.Request(
+                f"http://127.0.0.1:{port}/callback",
+                data=b'{"token": "user-token"}',
+                headers={"Content-Type": "application/json"},
+            )
+            for _ in range(100):
+                try:
+                    urllib.request.urlopen(request, timeout=5).close()
+                    return
+                except urllib.error.URLError:
+                    time.sleep(0.05)
+
+        threading.Thread(target=authorise, daemon=True).start()
+
+    monkeypatch.setattr("webbrowser.open", fake_browser)
+
+    assert start_auth_flow() == "user-token"
+    assert (tmp_path / "music_user_token").read_text() == "user-token"
+    assert not any(thread.name == "auth-server" for thread in threading.enumerate())
+    with socket.socket() as rebind:
+        # Only a socket still listening on the port blocks this; closed connections in TIME_WAIT do not.
+        rebind.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        rebind.bind(("127.0.0.1", port))
+
+
+# Test 5: The login page is rendered from the packaged template with the developer token
+def test_login_page_renders_token() -> None:
+    from server.app import render_login_page
+
+    page = render_login_page("developer-token")
+
+    assert "developer-token" in page
+    assert "{{ DEV_TOKEN }}" not in page
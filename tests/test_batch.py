@@ -0,0 +1,143 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from cli.batch import Account, AccountManifestError, fair_map, load_accounts
+from cli.client import AppleMusicClient
+from cli.export import export_accounts
+from cli.ratelimit import RateLimiter, RetryPolicy
+
+"""
+Batch Export Tests
+"""
+PLAYLISTS_PATH = "/v1/me/library/playlists"
+LIBRARIES = {
+    "alice-token": [("p.a1", "Road Trip", 3), ("p.a2", "Focus", 2)],
+    "bob-token": [("p.b1", "Gym", 1), ("p.broken", "Broken", 0)],
+}
+
+
+def serve_libraries(fake_api) -> None:
+    """
+    Serve a different library for each Music-User-Token; the "dave-token" listing and p.broken's tracks fail.
+    """
+
+    def listing(request):
+        token = request.headers.get("Music-User-Token")
+        if token not in LIBRARIES:
+            return 403, {"errors": []}, {}
+        data = []
+        for pid, name, count in LIBRARIES[token]:
+            playlist: dict = {"id": pid, "attributes": {"name": name}}
+            if count:
+                playlist["relationships"] = {
+                    "tracks": {
+                        "data": [
+                            {"id": f"i.{i}", "attributes": {"name": f"{name} {i}"}}
+                            for i in range(count)
+                        ]
+                    }
+                }
+            data.append(playlist)
+        return 200, {"data": data}, {}
+
+    fake_api.route(PLAYLISTS_PATH, listing)
+    fake_api.json(f"{PLAYLISTS_PATH}/p.broken/tracks", {"errors": []}, status=403)
+
+
+# Test 1: Slots go to the queue with the fewest running calls, in round-robin order among equals
+def test_fair_map_interleaves_queues() -> None:
+    started = []
+
+    def job(queue: str, number: int) -> str:
+        started.append(f"{queue}{number}")
+        return f"{queue}{number}"
+
+    jobs = {
+        "a": [("a", i) for i in range(5)],
+        "b": [("b", i) for i in range(2)],
+        "c": [],
+    }
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        results = list(fair_map(executor, job, jobs, 1))
+
+    assert started == ["a0", "b0", "a1", "b1", "a2", "a3", "a4"]
+    assert results == [(name[0], name) for name in started]
+
+
+# Test 2: The manifest resolves paths against its directory and rejects malformed accounts
+def test_load_accounts(tmp_path: Path) -> None:
+    manifest = tmp_path / "accounts.json"
+    manifest.write_text(
+        json.dumps(
+            [
+                {"name": "alice", "token": "tokens/alice", "rate": 5},
+                {"name": "bob/2", "token": "/etc/bob", "output": "exports/bob"},
+            ]
+        )
+    )
+    assert load_accounts(manifest, "backup") == [
+        Account("alice", tmp_path / "tokens/alice", Path("backup/alice"), 5.0),
+        Account("bob/2", Path("/etc/bob"), tmp_path / "exports/bob", None),
+    ]
+
+    for accounts in (
+        [],
+        [{"token": "t"}],
+        [{"name": "a", "token": "t"}, {"name": "a", "token": "u"}],
+        [{"name": "a"}],
+        [{"name": "a", "token": "t", "rate": 0}],
+    ):
+        manifest.write_text(json.dumps(accounts))
+        with pytest.raises(AccountManifestError):
+            load_accounts(manifest)
+    with pytest.raises(AccountManifestError):
+        load_accounts(tmp_path / "missing.json")
+
+
+# Test 3: Every account is exported into its own directory and summarised; failures only affect their account
+def test_export_accounts(fake_api, tmp_path: Path) -> None:
+    serve_libraries(fake_api)
+    accounts = [
+        Account(name, tmp_path / name, tmp_path / "out" / name)
+        for name in ("alice", "bob", "carol", "dave")
+    ]
+    shared = RateLimiter(rate=100)
+    clients = {}
+    for name in ("alice", "bob", "dave"):
+        client = AppleMusicClient(
+            "dev-token",
+            f"{name}-token",
+            rate_limiter=RateLimiter(rate=50, parent=shared),
+            retry_policy=RetryPolicy(max_retries=1, base_delay=0),
+        )
+        client.session.mount("https://", fake_api)
+        clients[name] = client
+
+    summaries = export_accounts(clients, accounts, "json,csv", workers=2)
+
+    assert [
+        (s["name"], s["status"], s["playlists"], s["failed"], s["tracks"])
+        for s in summaries
+    ] == [
+        ("alice", "ok", 2, 0, 5),
+        ("bob", "partial", 2, 1, 1),
+        ("carol", "failed", 0, 0, 0),
+        ("dave", "failed", 0, 0, 0),
+    ]
+    alice = tmp_path / "out" / "alice"
+    manifest = json.loads((alice / "manifest.json").read_text())
+    assert [entry["id"] for entry in manifest] == ["p.a1", "p.a2"]
+    assert manifest[0]["files"] == ["Road Trip (p.a1).json", "Road Trip (p.a1).csv"]
+    songs = json.loads((alice / "Road Trip (p.a1).json").read_text())
+    assert [song["name"] for song in songs] == [
+        "Road Trip 0",
+        "Road Trip 1",
+        "Road Trip 2",
+    ]
+    bob = json.loads((tmp_path / "out" / "bob" / "manifest.json").read_text())
+    assert [entry["status"] for entry in bob] == ["ok", "failed"]
+    assert not (tmp_path / "out" / "carol").exists()
+    assert not (tmp_path / "out" / "dave" / "manifest.json").exists()
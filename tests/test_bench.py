@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from bench.mock_api import LARGE_PLAYLIST_ID, MockAppleMusicAPI, SyntheticLibrary
+from cli.async_api import AsyncAppleMusicClient, export_all_playlists_async
+from cli.client import AppleMusicClient
+from cli.export import get_all_playlists, get_songs_in_playlist
+from cli.ratelimit import RateLimiter, RetryPolicy
+
+"""
+Benchmark Mock API Tests
+"""
+
+
+def make_client(url: str) -> AppleMusicClient:
+    return AppleMusicClient(
+        "dev-token",
+        "user-token",
+        base_url=url,
+        rate_limiter=RateLimiter(rate=1000),
+        retry_policy=RetryPolicy(base_delay=0),
+    )
+
+
+# Test 1: The mock API pages the playlist listing through the next cursor
+def test_mock_api_pages_playlists() -> None:
+    with MockAppleMusicAPI(SyntheticLibrary(playlists=250)) as api:
+        playlists = get_all_playlists(make_client(api.url))
+
+    assert playlists is not None
+    assert len(playlists) == 251
+    assert playlists[-1]["id"] == LARGE_PLAYLIST_ID
+    assert api.requests == 3
+
+
+# Test 2: Throttled pages are retried and offset windows keep playlist order
+def test_mock_api_throttles_and_honours_offsets() -> None:
+    library = SyntheticLibrary(playlists=0, large_tracks=1050)
+    with MockAppleMusicAPI(library, throttle_every=4) as api:
+        songs = get_songs_in_playlist(make_client(api.url), LARGE_PLAYLIST_ID, 4)
+
+    assert songs is not None
+    assert [song["name"] for song in songs] == [f"Song {i}" for i in range(1050)]
+    assert api.throttled > 0
+
+
+# Test 3: Playlists requested with include=tracks carry their first page of tracks
+def test_mock_api_includes_tracks() -> None:
+    library = SyntheticLibrary(playlists=2, tracks=150, large_tracks=0)
+    with MockAppleMusicAPI(library) as api:
+        playlists = make_client(api.url).get_page(
+            "/v1/me/library/playlists", "playlists", include="tracks"
+        )
+
+    assert playlists is not None and playlists.related is not None
+    tracks = playlists.related["p.000001"]
+    assert [song["name"] for song in tracks.records] == [
+        f"Song {i}" for i in range(100)
+    ]
+    assert tracks.next == "/v1/me/library/playlists/p.000001/tracks?offset=100"
+    assert tracks.total == 150
+    assert playlists.related[LARGE_PLAYLIST_ID].records == []
+    assert api.requests == 1
+
+
+# Test 4: The async pipeline of the export_all_async scenario exports every playlist from the mock API
+def test_mock_api_serves_async_export(tmp_path) -> None:
+    pytest.importorskip("httpx")
+    library = SyntheticLibrary(playlists=3, tracks=150, large_tracks=250)
+
+    async def run(url: str):
+        async with AsyncAppleMusicClient(
+            "dev-token",
+            "user-token",
+            base_url=url,
+            rate_limiter=RateLimiter(rate=1000),
+            retry_policy=RetryPolicy(base_delay=0),
+        ) as client:
+            return await export_all_playlists_async(client, str(tmp_path), "jsonl")
+
+    with MockAppleMusicAPI(library) as api:
+        manifest = asyncio.run(run(api.url))
+
+    assert manifest is not None
+    assert [entry["tracks"] for entry in manifest] == [150, 150, 150, 250]
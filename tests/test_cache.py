@@ -0,0 +1,74 @@
+import os
+from pathlib import Path
+
+from cli.cache import CachedResponse, ResponseCache
+from cli.client import AppleMusicClient
+
+"""
+Response Cache Tests
+"""
+
+
+def make_client(fake_api, cache: ResponseCache, user_token: str = "user-token"):
+    client = AppleMusicClient("dev-token", user_token, cache=cache)
+    client.session.mount("https://", fake_api)
+    return client
+
+
+def serve_with_etag(fake_api, etag: str = '"v1"') -> None:
+    def handler(request):
+        if request.headers.get("If-None-Match") == etag:
+            return 304, b"", {"ETag": etag}
+        return 200, {"data": ["playlist"]}, {"ETag": etag}
+
+    fake_api.route("/v1/me/library/playlists", handler)
+
+
+# Test 1: Fresh entries are served without a request
+def test_fresh_entry_skips_request(fake_api, tmp_path: Path) -> None:
+    serve_with_etag(fake_api)
+    client = make_client(fake_api, ResponseCache(tmp_path, ttl=60))
+
+    first = client.get("/v1/me/library/playlists")
+    second = client.get("/v1/me/library/playlists")
+
+    assert first == second == {"data": ["playlist"]}
+    assert len(fake_api.requests) == 1
+
+
+# Test 2: Stale entries are revalidated with If-None-Match and reused on 304
+def test_stale_entry_is_revalidated(fake_api, tmp_path: Path) -> None:
+    serve_with_etag(fake_api)
+    client = make_client(fake_api, ResponseCache(tmp_path, ttl=0))
+
+    client.get("/v1/me/library/playlists")
+    assert client.get("/v1/me/library/playlists") == {"data": ["playlist"]}
+
+    assert len(fake_api.requests) == 2
+    assert fake_api.requests[1].headers["If-None-Match"] == '"v1"'
+
+
+# Test 3: Entries are not shared between user tokens
+def test_cache_is_keyed_by_user_token(fake_api, tmp_path: Path) -> None:
+    serve_with_etag(fake_api)
+    cache = ResponseCache(tmp_path, ttl=60)
+
+    make_client(fake_api, cache, "alice").get("/v1/me/library/playlists")
+    make_client(fake_api, cache, "bob").get("/v1/me/library/playlists")
+
+    assert len(fake_api.requests) == 2
+
+
+# Test 4: Least recently used entries are evicted over the size cap
+def test_lru_eviction(tmp_path: Path) -> None:
+    cache = ResponseCache(tmp_path, max_bytes=450)  # room for three entries
+    for index, key in enumerate(["a", "b", "c"]):
+        cache.put(key, CachedResponse("x" * 60))
+        os.utime(tmp_path / f"{key}.json", (index, index))
+
+    cache.get("a")  # "a" becomes the most recently used entry
+    cache.put("d", CachedResponse("x" * 60))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("d") is not None
@@ -0,0 +1,195 @@
+import csv
+import json
+import sqlite3
+from urllib.parse import parse_qs, urlparse
+
+from cli.checkpoint import ExportCheckpoint, checkpoint_path, complete_rows
+from cli.decoding import Page
+from cli.export import SONG_FIELDS, export_songs, output_files
+
+"""
+Export Checkpoint Tests
+"""
+PLAYLIST_PATH = "/v1/me/library/playlists/p.test"
+TRACKS_PATH = PLAYLIST_PATH + "/tracks"
+
+
+def serve_tracks(
+    fake_api, count: int, page_size: int, fail_at: set, malformed: set = frozenset()
+) -> None:
+    """
+    Serve a playlist of `count` tracks, failing the pages whose offset is in `fail_at`. The tracks whose position is in
+    `malformed` have no attributes, so the decoder skips them.
+    """
+
+    def track(i: int) -> dict:
+        if i in malformed:
+            return {"id": f"i.{i}", "attributes": None}
+        return {
+            "id": f"i.{i}",
+            "attributes": {"name": f'Song {i}, "live"', "genreNames": ["Rock"]},
+        }
+
+    def page(offset: int) -> dict:
+        body: dict = {
+            "data": [track(i) for i in range(offset, min(offset + page_size, count))],
+            "meta": {"total": count},
+        }
+        if offset + page_size < count:
+            body["next"] = f"{TRACKS_PATH}?offset={offset + page_size}"
+        return body
+
+    def handler(request):
+        offset = int(parse_qs(urlparse(request.url).query).get("offset", ["0"])[0])
+        if offset in fail_at:
+            return 403, {"errors": []}, {}
+        return 200, page(offset), {}
+
+    # SQLite exports fetch the playlist with its first page of tracks included.
+    detail = {
+        "id": "p.test",
+        "attributes": {"name": "Test"},
+        "relationships": {"tracks": page(0)},
+    }
+    fake_api.json(PLAYLIST_PATH, {"data": [detail]})
+    fake_api.route(TRACKS_PATH, handler)
+
+
+def playlist_positions(path) -> list:
+    connection = sqlite3.connect(path)
+    try:
+        return [
+            row[0]
+            for row in connection.execute(
+                "SELECT position FROM playlist_tracks WHERE playlist_id = 'p.test' ORDER BY position"
+            )
+        ]
+    finally:
+        connection.close()
+
+
+# Test 1: A failed page leaves a checkpoint; --resume fetches only the rest and appends to every format
+def test_resume_after_failed_page(fake_api, client, tmp_path) -> None:
+    fail_at = {200}
+    serve_tracks(fake_api, count=350, page_size=100, fail_at=fail_at)
+    output = str(tmp_path / "songs.json")
+    fmt = "json,jsonl,csv,sqlite"
+
+    assert export_songs(client, "p.test", fmt, output) is None
+    checkpoint = json.loads((tmp_path / "songs.json.checkpoint.json").read_text())
+    assert checkpoint["playlist_id"] == "p.test"
+    assert (checkpoint["rows"], checkpoint["offset"]) == (200, 200)
+
+    fail_at.clear()
+    fake_api.requests.clear()
+    assert export_songs(client, "p.test", fmt, output, resume=True) == 350
+    assert len(fake_api.requests) == 2
+    assert "offset=200" in fake_api.requests[0].url
+    assert not (tmp_path / "songs.json.checkpoint.json").exists()
+
+    names = [f'Song {i}, "live"' for i in range(350)]
+    assert [
+        song["name"] for song in json.loads((tmp_path / "songs.json").read_text())
+    ] == names
+    with (tmp_path / "songs.jsonl").open(encoding="utf-8") as file:
+        assert [json.loads(line)["name"] for line in file] == names
+    with (tmp_path / "songs.csv").open(newline="", encoding="utf-8") as file:
+        rows = list(csv.DictReader(file))
+    assert list(rows[0]) == list(SONG_FIELDS)
+    assert [row["name"] for row in rows] == names
+    assert playlist_positions(tmp_path / "songs.sqlite") == list(range(350))
+
+
+# Test 2: Resuming keeps only rows complete in every file and cuts partly written rows off
+def test_resume_truncates_partial_rows(fake_api, client, tmp_path) -> None:
+    serve_tracks(fake_api, count=10, page_size=10, fail_at=set())
+    outputs = output_files(str(tmp_path / "songs.csv"), ["csv", "json"])
+    assert export_songs(client, "p.test", "csv,json", str(tmp_path / "songs.csv")) == 10
+
+    # Simulate a crash: the CSV stops in the middle of its 7th row, and the checkpoint is at 8 rows.
+    csv_path, json_path = outputs["csv"], outputs["json"]
+    ends = complete_rows("csv", csv_path, 10)
+    with open(csv_path, "r+b") as file:
+        file.truncate(ends[6] - 5)
+    checkpoint = ExportCheckpoint("p.test", outputs, SONG_FIELDS)
+    checkpoint.boundaries = [(0, 0), (8, 8)]
+    checkpoint.save()
+
+    assert checkpoint.resume_point() == (6, 6)
+    assert len(complete_rows("csv", csv_path, 10)) == 6
+    assert len(complete_rows("json", json_path, 10)) == 6
+    assert (tmp_path / "songs.json").read_bytes().endswith(b"\n  }")
+
+    assert (
+        export_songs(
+            client, "p.test", "csv,json", str(tmp_path / "songs.csv"), resume=True
+        )
+        == 10
+    )
+    exported = json.loads((tmp_path / "songs.json").read_text())
+    assert [song["name"] for song in exported] == [
+        f'Song {i}, "live"' for i in range(10)
+    ]
+
+
+# Test 3: A checkpoint of another export is refused; a missing one starts over
+def test_resume_checks_checkpoint(fake_api, client, tmp_path, capsys) -> None:
+    serve_tracks(fake_api, count=5, page_size=5, fail_at=set())
+    output = str(tmp_path / "songs.json")
+    other = ExportCheckpoint("p.other", {"json": output})
+    other.save()
+
+    assert export_songs(client, "p.test", "json", output, resume=True) is None
+    assert "different export" in capsys.readouterr().out
+    assert len(fake_api.requests) == 0
+
+    checkpoint_path({"json": output}).unlink()
+    assert export_songs(client, "p.test", "json", output, resume=True) == 5
+    assert "starting from the beginning" in capsys.readouterr().out
+
+
+# Test 4: After a skipped entry, --resume continues from the API offset, not the number of rows written
+def test_resume_after_skipped_entry(fake_api, client, tmp_path) -> None:
+    fail_at = {200}
+    serve_tracks(fake_api, count=350, page_size=100, fail_at=fail_at, malformed={50})
+    output = str(tmp_path / "songs.json")
+
+    assert export_songs(client, "p.test", "json,sqlite", output) is None
+    checkpoint = json.loads((tmp_path / "songs.json.checkpoint.json").read_text())
+    assert (checkpoint["rows"], checkpoint["offset"]) == (199, 200)
+
+    fail_at.clear()
+    fake_api.requests.clear()
+    assert export_songs(client, "p.test", "json,sqlite", output, resume=True) == 349
+    assert "offset=200" in fake_api.requests[0].url
+
+    names = [f'Song {i}, "live"' for i in range(350) if i != 50]
+    assert [
+        song["name"] for song in json.loads((tmp_path / "songs.json").read_text())
+    ] == names
+    assert playlist_positions(tmp_path / "songs.sqlite") == list(range(349))
+
+
+# Test 5: Rows that reached the files are mapped back to API offsets; a page that skipped entries is refetched whole
+def test_resume_point_maps_rows_to_offsets(tmp_path) -> None:
+    outputs = {"jsonl": str(tmp_path / "songs.jsonl")}
+    checkpoint = ExportCheckpoint("p.test", outputs)
+    # Pages of 10 entries; the second one skipped two of them.
+    pages = [
+        Page([{"n": i} for i in range(10)], 10, None, None),
+        Page([{"n": i} for i in range(8)], 10, None, None),
+        Page([{"n": i} for i in range(10)], 10, None, None),
+        Page([{"n": i} for i in range(10)], 10, None, None),
+    ]
+    assert len(list(checkpoint.track(pages))) == 4
+    assert checkpoint.boundaries == [(0, 0), (10, 10), (18, 20), (38, 40)]
+
+    def resume_with(rows: int):
+        with open(outputs["jsonl"], "w", encoding="utf-8") as file:
+            file.writelines(json.dumps({"n": i}) + "\n" for i in range(rows))
+        return checkpoint.resume_point()
+
+    assert resume_with(38) == (38, 40)
+    assert resume_with(25) == (25, 27)
+    assert resume_with(15) == (10, 10)
+    assert resume_with(5) == (5, 5)
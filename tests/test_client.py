@@ -0,0 +1,163 @@
+import requests
+
+from cli.client import AppleMusicClient
+from cli.ratelimit import RateLimiter, RetryPolicy
+
+"""
+AppleMusicClient Tests
+"""
+
+
+def make_client(fake_api, **kwargs) -> AppleMusicClient:
+    client = AppleMusicClient("dev-token", "user-token", **kwargs)
+    client.session.mount("https://", fake_api)
+    return client
+
+
+# Test 1: Both tokens are sent on every request
+def test_client_sends_auth_headers(fake_api) -> None:
+    fake_api.json("/v1/me/library/playlists", {"data": []})
+    client = make_client(fake_api)
+
+    assert client.get("/v1/me/library/playlists") == {"data": []}
+
+    request = fake_api.requests[0]
+    assert request.headers["Authorization"] == "Bearer dev-token"
+    assert request.headers["Music-User-Token"] == "user-token"
+
+
+# Test 2: Requests share a single pooled session
+def test_client_reuses_session(fake_api) -> None:
+    fake_api.json("/v1/me/library/playlists", {"data": []})
+    client = make_client(fake_api)
+
+    client.get("/v1/me/library/playlists")
+    client.get("/v1/me/library/playlists")
+
+    assert len(fake_api.requests) == 2
+    assert client.session.get_adapter("https://api.music.apple.com") is fake_api
+
+
+# Test 3: Cursor paths and absolute URLs resolve against the base URL
+def test_url_for() -> None:
+    client = AppleMusicClient("dev-token", base_url="http://127.0.0.1:8000/")
+
+    assert client.url_for("/v1/test") == "http://127.0.0.1:8000/v1/test"
+    assert client.url_for("https://example.com/v1") == "https://example.com/v1"
+
+
+# Test 4: HTTP errors are reported and return None
+def test_client_http_error_returns_none(fake_api, capsys) -> None:
+    fake_api.json("/v1/me/library/playlists", {"errors": []}, status=403)
+    client = make_client(fake_api)
+
+    assert client.get("/v1/me/library/playlists") is None
+    assert "Forbidden" in capsys.readouterr().out
+
+
+# Test 5: Invalid JSON bodies return None
+def test_client_invalid_json_returns_none(fake_api) -> None:
+    fake_api.route("/v1/test", lambda request: (200, b"not json", {}))
+    client = make_client(fake_api)
+
+    assert client.get("/v1/test") is None
+
+
+"""
+Retry Tests
+"""
+
+
+def make_retrying_client(fake_api) -> AppleMusicClient:
+    return make_client(
+        fake_api,
+        rate_limiter=RateLimiter(rate=1000),
+        retry_policy=RetryPolicy(max_retries=3, base_delay=0),
+    )
+
+
+def fail_then_succeed(failures: list):
+    def handler(request):
+        if failures:
+            return failures.pop(0)
+        return 200, {"data": ["ok"]}, {}
+
+    return handler
+
+
+# Test 6: 429 responses are retried after Retry-After and slow the limiter down
+def test_client_retries_429(fake_api) -> None:
+    fake_api.route(
+        "/v1/test", fail_then_succeed([(429, {"errors": []}, {"Retry-After": "0"})])
+    )
+    client = make_retrying_client(fake_api)
+
+    assert client.get("/v1/test") == {"data": ["ok"]}
+    assert len(fake_api.requests) == 2
+    assert client.rate_limiter.rate < 1000
+
+
+# Test 7: 5xx responses are retried with backoff
+def test_client_retries_server_errors(fake_api) -> None:
+    fake_api.route(
+        "/v1/test",
+        fail_then_succeed([(500, {"errors": []}, {}), (503, {"errors": []}, {})]),
+    )
+    client = make_retrying_client(fake_api)
+
+    assert client.get("/v1/test") == {"data": ["ok"]}
+    assert len(fake_api.requests) == 3
+
+
+# Test 8: Connection resets are retried
+def test_client_retries_connection_errors(fake_api) -> None:
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            raise requests.exceptions.ConnectionError("Connection reset by peer")
+        return 200, {"data": ["ok"]}, {}
+
+    fake_api.route("/v1/test", handler)
+    client = make_retrying_client(fake_api)
+
+    assert client.get("/v1/test") == {"data": ["ok"]}
+    assert len(calls) == 2
+
+
+# Test 9: Retries give up after max_retries
+def test_client_gives_up_after_max_retries(fake_api, capsys) -> None:
+    fake_api.json("/v1/test", {"errors": []}, status=429)
+    client = make_retrying_client(fake_api)
+
+    assert client.get("/v1/test") is None
+    assert len(fake_api.requests) == 4
+    assert "Too Many Requests" in capsys.readouterr().out
+
+
+class FakeTokenProvider:
+    def __init__(self) -> None:
+        self.token = "expired"
+
+    def get(self) -> str:
+        return self.token
+
+    def refresh(self) -> str:
+        self.token = "fresh"
+        return self.token
+
+
+# Test 10: A 401 re-signs the developer token and retries once
+def test_client_refreshes_token_on_401(fake_api) -> None:
+    def handler(request):
+        if request.headers["Authorization"] == "Bearer fresh":
+            return 200, {"data": ["ok"]}, {}
+        return 401, {"errors": []}, {}
+
+    fake_api.route("/v1/test", handler)
+    client = AppleMusicClient(FakeTokenProvider(), "user-token")
+    client.session.mount("https://", fake_api)
+
+    assert client.get("/v1/test") == {"data": ["ok"]}
+    assert len(fake_api.requests) == 2
@@ -0,0 +1,152 @@
+import json
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, List
+
+import pytest
+import uvicorn
+
+import cli.daemon_client
+from cli.client import AppleMusicClient
+from cli.daemon_client import DaemonClient, DaemonError, find_daemon, write_daemon_file
+from cli.main import main
+from cli.playlist_index import PlaylistIndex
+from cli.ratelimit import RetryPolicy
+from server.daemon import create_app
+
+"""
+Daemon Tests
+"""
+PLAYLISTS_PATH = "/v1/me/library/playlists"
+SECRET = "daemon-secret"  # pragma: allowlist secret
+
+
+def serve_library(fake_api) -> None:
+    fake_api.json(
+        PLAYLISTS_PATH, {"data": [{"id": "p.a", "attributes": {"name": "Road Trip"}}]}
+    )
+    fake_api.json(f"{PLAYLISTS_PATH}/p.a", {"data": [{"id": "p.a"}]})
+    fake_api.json(
+        f"{PLAYLISTS_PATH}/p.a/tracks",
+        {"data": [{"attributes": {"name": "One"}}, {"attributes": {"name": "Two"}}]},
+    )
+
+
+@pytest.fixture
+def daemon(fake_api, tmp_path: Path, monkeypatch) -> Iterator[DaemonClient]:
+    client = AppleMusicClient(
+        "dev-token", "user-token", retry_policy=RetryPolicy(max_retries=1, base_delay=0)
+    )
+    client.session.mount("https://", fake_api)
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(
+        uvicorn.Config(
+            create_app(client, SECRET), host="127.0.0.1", port=port, log_level="error"
+        )
+    )
+    thread = threading.Thread(target=server.run)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    url = f"http://127.0.0.1:{port}"
+    monkeypatch.setattr(cli.daemon_client, "DAEMON_PATH", tmp_path / "daemon.json")
+    write_daemon_file(url, SECRET)
+    try:
+        yield DaemonClient(url, SECRET)
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+# Test 1: The daemon serves the playlist listing from its warm client
+def test_daemon_lists_playlists(fake_api, daemon: DaemonClient) -> None:
+    serve_library(fake_api)
+
+    playlists = daemon.request("GET", "/playlists")
+
+    assert [playlist["id"] for playlist in playlists] == ["p.a"]
+
+
+# Test 2: Requests without the daemon secret are rejected
+def test_daemon_rejects_wrong_secret(daemon: DaemonClient) -> None:
+    with pytest.raises(DaemonError, match="401"):
+        DaemonClient(daemon.url, "wrong").request("GET", "/playlists")
+
+
+# Test 3: find_daemon ignores stale daemon files
+def test_find_daemon_ignores_stale_file(tmp_path: Path) -> None:
+    path = tmp_path / "daemon.json"
+    write_daemon_file("http://127.0.0.1:9", SECRET, path)
+
+    assert find_daemon(path) is None
+    assert find_daemon(tmp_path / "missing.json") is None
+
+
+# Test 4: The CLI forwards exports to a running daemon without loading credentials
+def test_cli_forwards_export_to_daemon(
+    fake_api, daemon: DaemonClient, tmp_path: Path, monkeypatch
+) -> None:
+    serve_library(fake_api)
+    output = tmp_path / "road_trip.json"
+
+    def no_credentials():
+        raise AssertionError("credentials were loaded")
+
+    monkeypatch.setattr("cli.main.load_credentials", no_credentials)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["apple-music-cli", "export", "--playlistID", "p.a", "-o", str(output)],
+    )
+    main()
+
+    assert [song["name"] for song in json.loads(output.read_text())] == ["One", "Two"]
+
+
+# Test 5: A forwarded playlist listing updates the local playlist index
+def test_cli_forwarded_listing_updates_index(
+    fake_api, daemon: DaemonClient, tmp_path: Path, monkeypatch
+) -> None:
+    serve_library(fake_api)
+    index_path = tmp_path / "index.json"
+    monkeypatch.setattr("cli.main.PLAYLIST_INDEX_PATH", index_path)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["apple-music-cli", "all-playlists", "-o", str(tmp_path / "playlists.json")],
+    )
+    main()
+
+    assert PlaylistIndex(index_path).resolve("Road Trip") == "p.a"
+
+
+# Test 6: Commands overriding the cache or rate limit are not forwarded
+@pytest.mark.parametrize(
+    "option",
+    [["--no-cache"], ["--cache-dir", "cache"], ["--cache-ttl", "0"], ["--rate", "5"]],
+)
+def test_cli_runs_overridden_options_locally(
+    fake_api, daemon: DaemonClient, tmp_path: Path, monkeypatch, option: List[str]
+) -> None:
+    serve_library(fake_api)
+
+    def no_credentials():
+        raise RuntimeError("credentials were loaded")
+
+    monkeypatch.setattr("cli.main.load_credentials", no_credentials)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["apple-music-cli", "all-playlists", "-o", str(tmp_path / "out.json"), *option],
+    )
+    main()
+
+    assert fake_api.requests == []
+    assert not (tmp_path / "out.json").exists()
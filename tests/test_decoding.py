@@ -0,0 +1,229 @@
+import json
+
+import pytest
+
+from cli.client import AppleMusicClient
+from cli.decoding import BACKENDS, Page, available_backends, get_decoder
+from cli.export import iter_songs_in_playlist
+from cli.ratelimit import RetryPolicy
+
+"""
+JSON Decoding Tests
+"""
+SONGS_PAGE = json.dumps(
+    {
+        "data": [
+            {
+                "id": "i.1",
+                "type": "library-songs",
+                "attributes": {
+                    "name": "Song 1",
+                    "artistName": "Artist",
+                    "albumName": "Album",
+                    "genreNames": ["Rock", "Pop"],
+                    "releaseDate": "2020-01-01",
+                    "durationInMillis": 1000,
+                    "playParams": {"id": "i.1", "kind": "song", "catalogId": "101"},
+                },
+            },
+            {"id": "i.2", "type": "library-songs"},
+            {"id": "i.3", "type": "library-songs", "attributes": {"name": "Song 3"}},
+        ],
+        "next": "/v1/me/library/playlists/p.test/tracks?offset=3",
+        "meta": {"total": 7},
+    }
+).encode()
+
+PLAYLISTS_PAGE = json.dumps(
+    {
+        "data": [
+            {
+                "id": "p.1",
+                "attributes": {
+                    "name": "Road Trip",
+                    "dateAdded": "2021-03-04T10:00:00Z",
+                },
+            },
+            {"id": "p.2", "attributes": {"name": "Broken", "dateAdded": "yesterday"}},
+            {"id": "p.3"},
+        ]
+    }
+).encode()
+
+
+# Test 1: Every installed backend decodes pages into the same records
+def test_backends_agree() -> None:
+    expected = get_decoder("json")
+    for backend in available_backends():
+        decoder = get_decoder(backend)
+        songs = decoder.page(SONGS_PAGE, "songs", catalog_ids=True)
+        assert songs == expected.page(SONGS_PAGE, "songs", catalog_ids=True)
+        assert songs is not None
+        assert songs.size == 3
+        assert songs.next == "/v1/me/library/playlists/p.test/tracks?offset=3"
+        assert songs.total == 7
+        assert [dict(song) for song in songs.records] == [
+            {
+                "name": "Song 1",
+                "artistName": "Artist",
+                "albumName": "Album",
+                "genreNames": ["Rock", "Pop"],
+                "releaseDate": "2020-01-01",
+            },
+            {
+                "name": "Song 3",
+                "artistName": None,
+                "albumName": None,
+                "genreNames": [],
+                "releaseDate": None,
+            },
+        ]
+        assert [song.catalog_id for song in songs.records] == ["101", None]
+
+        playlists = decoder.page(PLAYLISTS_PAGE, "playlists")
+        assert playlists == expected.page(PLAYLISTS_PAGE, "playlists")
+        assert playlists == Page(
+            [
+                {"name": "Road Trip", "id": "p.1", "dateAdded": "04-03-2021"},
+                {"name": "Broken", "id": "p.2", "dateAdded": None},
+                {"name": None, "id": "p.3", "dateAdded": None},
+            ],
+            3,
+            None,
+            None,
+        )
+
+
+# Test 2: Pages that do not match the schema still decode; malformed ones are rejected
+def test_unexpected_pages(capsys) -> None:
+    odd = json.dumps(
+        {"data": [{"attributes": {"name": 5, "genreNames": "Rock"}}], "meta": {}}
+    ).encode()
+    for backend in available_backends():
+        decoder = get_decoder(backend)
+        page = decoder.page(odd, "songs")
+        assert page is not None
+        assert page.records[0]["name"] == 5
+        assert page.total is None
+
+        assert decoder.page(b'{"data": {}}', "songs") is None
+        assert "Unexpected response format" in capsys.readouterr().out
+        with pytest.raises(ValueError):
+            decoder.page(b'{"data": [', "songs")
+
+    with pytest.raises(ValueError):
+        get_decoder("simdjson")
+
+
+# Test 3: A client with the standard library decoder pages through a playlist
+def test_client_decoder(fake_api) -> None:
+    fake_api.json(
+        "/v1/me/library/playlists/p.test/tracks",
+        json.loads(SONGS_PAGE) | {"next": None},
+    )
+    client = AppleMusicClient(
+        "dev-token",
+        "user-token",
+        retry_policy=RetryPolicy(max_retries=1, base_delay=0),
+        decoder=get_decoder("json"),
+    )
+    client.session.mount("https://", fake_api)
+
+    songs = list(iter_songs_in_playlist(client, "p.test"))
+    assert [song["name"] for page in songs for song in page] == ["Song 1", "Song 3"]
+
+
+# Test 4: Library song pages keep their library IDs and ID pages decode to IDs only
+def test_library_kinds() -> None:
+    ids_page = json.dumps(
+        {"data": [{"id": "i.1", "attributes": {"name": "Song 1"}}, {"id": "i.2"}]}
+    ).encode()
+    playlists = json.dumps(
+        {
+            "data": [
+                {
+                    "id": "p.1",
+                    "relationships": {"tracks": json.loads(ids_page) | {"next": "/n"}},
+                }
+            ]
+        }
+    ).encode()
+    for backend in available_backends():
+        decoder = get_decoder(backend)
+        songs = decoder.page(SONGS_PAGE, "library-songs", catalog_ids=True)
+        assert songs is not None
+        assert [library_id for library_id, _ in songs.records] == ["i.1", "i.3"]
+        assert songs.records[0][1].catalog_id == "101"
+
+        assert decoder.page(ids_page, "ids") == Page(["i.1", "i.2"], 2, None, None)
+        page = decoder.page(
+            playlists, "playlists", include="tracks", include_kind="ids"
+        )
+        assert page is not None and page.related is not None
+        assert page.related["p.1"] == Page(["i.1", "i.2"], 2, "/n", None)
+        with pytest.raises(ValueError):
+            decoder.page(ids_page, "albums")
+
+
+# Test 5: Songs whose attributes are missing or malformed are skipped by every backend, and a malformed meta has no
+# total
+def test_backends_skip_malformed_songs() -> None:
+    songs = [
+        {"id": "i.1", "attributes": None},
+        {"id": "i.2"},
+        {"id": "i.3", "attributes": "name"},
+        "i.4",
+        {"id": "i.5", "attributes": {"name": "Kept", "genreNames": []}},
+    ]
+    body = json.dumps({"data": songs, "meta": {"total": 5}}).encode()
+    included = json.dumps(
+        {"data": [{"id": "p.1", "relationships": {"tracks": {"data": songs}}}]}
+    ).encode()
+    malformed = json.dumps({"data": songs, "meta": [5]}).encode()
+    for backend in available_backends():
+        decoder = get_decoder(backend)
+        page = decoder.page(body, "songs")
+        assert page is not None
+        assert [dict(song) for song in page.records] == [
+            {
+                "name": "Kept",
+                "artistName": None,
+                "albumName": None,
+                "genreNames": [],
+                "releaseDate": None,
+            }
+        ]
+        assert (page.size, page.total) == (5, 5)
+
+        library = decoder.page(body, "library-songs")
+        assert library is not None
+        assert [library_id for library_id, _ in library.records] == ["i.5"]
+
+        playlists = decoder.page(included, "playlists", include="tracks")
+        assert playlists is not None and playlists.related is not None
+        assert playlists.related["p.1"].records == page.records
+
+        odd = decoder.page(malformed, "songs")
+        assert odd is not None and odd.total is None
+
+
+# Test 6: Songs holding none of the requested attributes of a sparse fieldset are still exported
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_backend_keeps_songs_without_requested_attributes(backend: str) -> None:
+    if backend not in available_backends():
+        pytest.skip(f"{backend} is not installed")
+    # fields[library-songs]=releaseDate: the second song has no release date, the third no requested attribute set.
+    songs = [
+        {"id": "i.1", "attributes": {"releaseDate": "2020-01-01"}},
+        {"id": "i.2", "attributes": {}},
+        {"id": "i.3", "attributes": {"releaseDate": None}},
+    ]
+    body = json.dumps({"data": songs}).encode()
+    decoder = get_decoder(backend)
+
+    page = decoder.page(body, "songs")
+    library = decoder.page(body, "library-songs")
+
+    assert page is not None and library is not None
+    assert [song["releaseDate"] for song in page.records] == ["2020-01-01", None, None]
+    assert [library_id for library_id, _ in library.records] == ["i.1", "i.2", "i.3"]
@@ -0,0 +1,129 @@
+import csv
+from urllib.parse import parse_qs, urlparse
+
+from cli.enrich import CatalogCache, CatalogEnricher
+from cli.export import ENRICHED_SONG_FIELDS, export_songs
+from cli.records import Track
+
+"""
+Catalog Enrichment Tests
+"""
+CATALOG_PATH = "/v1/catalog/us/songs"
+TRACKS_PATH = "/v1/me/library/playlists/p.test/tracks"
+
+
+def serve_catalog(fake_api, missing: set = frozenset()) -> list:
+    """
+    Answer catalog requests for every ID except `missing`, and return the list of ID batches requested.
+    """
+    batches: list = []
+
+    def handler(request):
+        ids = parse_qs(urlparse(request.url).query)["ids"][0].split(",")
+        batches.append(ids)
+        data = [
+            {
+                "id": i,
+                "attributes": {
+                    "isrc": f"ISRC{i}",
+                    "durationInMillis": int(i),
+                    "composerName": "Composer",
+                },
+            }
+            for i in ids
+            if i not in missing
+        ]
+        return 200, {"data": data}, {}
+
+    fake_api.route(CATALOG_PATH, handler)
+    return batches
+
+
+def make_tracks(catalog_ids) -> list:
+    return [Track(f"Song {i}", catalog_id=str(i)) for i in catalog_ids]
+
+
+# Test 1: Catalog IDs are fetched in full batches and songs keep their order
+def test_enrich_batches_ids(fake_api, client) -> None:
+    batches = serve_catalog(fake_api)
+
+    with CatalogEnricher(client, batch_size=300) as enricher:
+        songs = list(enricher.enrich(make_tracks(range(1, 651))))
+
+    assert sorted(len(batch) for batch in batches) == [50, 300, 300]
+    assert [song["name"] for song in songs] == [f"Song {i}" for i in range(1, 651)]
+    assert songs[0]["catalogId"] == "1"
+    assert songs[0]["isrc"] == "ISRC1"
+    assert songs[0]["durationInMillis"] == 1
+    assert songs[0]["composerName"] == "Composer"
+
+
+# Test 2: IDs shared by several playlists, or repeated in one, are fetched once
+def test_enrich_deduplicates_across_streams(fake_api, client) -> None:
+    batches = serve_catalog(fake_api, missing={"7"})
+
+    with CatalogEnricher(client, batch_size=4) as enricher:
+        first = list(enricher.enrich(make_tracks([1, 2, 3, 1, 2, 7])))
+        second = list(enricher.enrich(make_tracks([2, 3, 4, 5])))
+        untracked = list(enricher.enrich([Track("Local file")]))
+
+    requested = [i for batch in batches for i in batch]
+    assert sorted(requested) == ["1", "2", "3", "4", "5", "7"]
+    assert [song["isrc"] for song in first] == [
+        "ISRC1",
+        "ISRC2",
+        "ISRC3",
+        "ISRC1",
+        "ISRC2",
+        None,
+    ]
+    assert [song["isrc"] for song in second] == ["ISRC2", "ISRC3", "ISRC4", "ISRC5"]
+    assert untracked[0]["catalogId"] is None
+
+
+# Test 3: Fetched songs, including ones missing from the catalog, are served from the cache on the next run
+def test_enrich_uses_cache(fake_api, client, tmp_path) -> None:
+    batches = serve_catalog(fake_api, missing={"3"})
+
+    with CatalogCache(tmp_path / "catalog.db") as cache:
+        with CatalogEnricher(client, cache=cache) as enricher:
+            list(enricher.enrich(make_tracks([1, 2, 3])))
+        with CatalogEnricher(client, cache=cache) as enricher:
+            songs = list(enricher.enrich(make_tracks([1, 2, 3])))
+
+    assert len(batches) == 1
+    assert [song["isrc"] for song in songs] == ["ISRC1", "ISRC2", None]
+    assert enricher.requests == 0
+
+
+# Test 4: export --enrich writes the catalog fields taken from the tracks' playParams
+def test_export_songs_enriched(fake_api, client, tmp_path) -> None:
+    batches = serve_catalog(fake_api)
+    fake_api.json(
+        TRACKS_PATH,
+        {
+            "data": [
+                {
+                    "id": f"i.{i}",
+                    "attributes": {
+                        "name": f"Song {i}",
+                        "playParams": {"id": f"i.{i}", "catalogId": str(100 + i)},
+                    },
+                }
+                for i in range(3)
+            ]
+        },
+    )
+    output = tmp_path / "songs.csv"
+
+    with CatalogEnricher(client) as enricher:
+        count = export_songs(client, "p.test", "csv", str(output), enricher=enricher)
+
+    assert count == 3
+    assert batches == [["100", "101", "102"]]
+    with output.open(newline="", encoding="utf-8") as file:
+        rows = list(csv.DictReader(file))
+    assert list(rows[0]) == list(ENRICHED_SONG_FIELDS)
+    assert rows[2]["catalogId"] == "102"
+    assert rows[2]["isrc"] == "ISRC102"
+    assert rows[2]["durationInMillis"] == "102"
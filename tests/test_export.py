@@ -0,0 +1,334 @@
+import gzip
+import json
+import sqlite3
+from urllib.parse import parse_qs, urlparse
+
+import cli.export
+from cli.export import (
+    export_all_playlists,
+    export_songs,
+    get_all_playlists,
+    get_songs_in_playlist,
+    iter_songs_in_playlist,
+    parse_fields,
+)
+
+"""
+Playlist Track Pagination Tests
+"""
+TRACKS_PATH = "/v1/me/library/playlists/p.test/tracks"
+
+
+def make_track(index: int) -> dict:
+    return {
+        "id": f"i.{index}",
+        "attributes": {
+            "name": f"Song {index}",
+            "artistName": "Artist",
+            "albumName": "Album",
+            "genreNames": ["Rock"],
+            "releaseDate": "1984-06-04",
+        },
+    }
+
+
+def serve_tracks(fake_api, count: int, page_size: int, with_total: bool = True):
+    def handler(request):
+        query = parse_qs(urlparse(request.url).query)
+        offset = int(query.get("offset", ["0"])[0])
+        limit = int(query.get("limit", [str(page_size)])[0])
+        body: dict = {
+            "data": [make_track(i) for i in range(offset, min(offset + limit, count))]
+        }
+        if offset + limit < count:
+            body["next"] = f"{TRACKS_PATH}?offset={offset + limit}"
+        if with_total:
+            body["meta"] = {"total": count}
+        return 200, body, {}
+
+    fake_api.route(TRACKS_PATH, handler)
+
+
+# Test 1: Sequential mode follows the next cursor
+def test_songs_follow_next_cursor(fake_api, client) -> None:
+    serve_tracks(fake_api, count=250, page_size=100)
+
+    songs = get_songs_in_playlist(client, "p.test")
+
+    assert songs is not None
+    assert [song["name"] for song in songs] == [f"Song {i}" for i in range(250)]
+    assert len(fake_api.requests) == 3
+
+
+# Test 2: Concurrent mode fetches offset windows and keeps playlist order
+def test_songs_concurrent_keeps_order(fake_api, client) -> None:
+    serve_tracks(fake_api, count=1000, page_size=100)
+
+    songs = get_songs_in_playlist(client, "p.test", concurrency=8)
+
+    assert songs is not None
+    assert [song["name"] for song in songs] == [f"Song {i}" for i in range(1000)]
+    assert len(fake_api.requests) == 10
+
+
+# Test 3: Pages are yielded one at a time, in order, with a bounded prefetch window
+def test_iter_songs_yields_pages_in_order(fake_api, client) -> None:
+    serve_tracks(fake_api, count=1000, page_size=100)
+
+    pages = iter_songs_in_playlist(client, "p.test", concurrency=2)
+
+    first = next(pages)
+    assert [song["name"] for song in first][:2] == ["Song 0", "Song 1"]
+    rest = [song["name"] for page in pages for song in page]
+    assert rest == [f"Song {i}" for i in range(100, 1000)]
+
+
+# Test 4: Concurrent mode falls back to the cursor when the total is unknown
+def test_songs_concurrent_without_total(fake_api, client) -> None:
+    serve_tracks(fake_api, count=250, page_size=100, with_total=False)
+
+    songs = get_songs_in_playlist(client, "p.test", concurrency=8)
+
+    assert songs is not None
+    assert len(songs) == 250
+    offsets = [parse_qs(urlparse(r.url).query).get("offset") for r in fake_api.requests]
+    assert offsets == [None, ["100"], ["200"]]
+
+
+# Test 5: A failed page fails the whole export
+def test_songs_failed_page_returns_none(fake_api, client) -> None:
+    fake_api.json(TRACKS_PATH, {"errors": []}, status=403)
+
+    assert get_songs_in_playlist(client, "p.test") is None
+
+
+# Test 6: Every page is requested at the maximum size with a sparse fieldset
+def test_songs_request_sparse_fieldsets(fake_api, client) -> None:
+    serve_tracks(fake_api, count=250, page_size=100)
+
+    pages = iter_songs_in_playlist(
+        client, "p.test", concurrency=2, fields=["name", "albumName"]
+    )
+    songs = [song for page in pages for song in page]
+
+    assert len(songs) == 250
+    for request in fake_api.requests:
+        query = parse_qs(urlparse(request.url).query)
+        assert query["limit"] == ["100"]
+        assert query["fields[library-songs]"] == ["name,albumName"]
+
+
+"""
+Playlist Listing and export-all Tests
+"""
+PLAYLISTS_PATH = "/v1/me/library/playlists"
+
+
+def serve_playlists(fake_api) -> None:
+    def handler(request):
+        query = parse_qs(urlparse(request.url).query)
+        if "offset" not in query:
+            body = {
+                "data": [
+                    {"id": "p.test", "attributes": {"name": "Road Trip"}},
+                    {"id": "p.empty", "attributes": {"name": "Empty"}},
+                ],
+                "next": f"{PLAYLISTS_PATH}?offset=2",
+            }
+        else:
+            body = {"data": [{"id": "p.broken", "attributes": {"name": "Broken"}}]}
+        return 200, body, {}
+
+    fake_api.route(PLAYLISTS_PATH, handler)
+    fake_api.json(f"{PLAYLISTS_PATH}/p.empty/tracks", {"data": []})
+    fake_api.json(f"{PLAYLISTS_PATH}/p.broken/tracks", {"errors": []}, status=500)
+
+
+# Test 1: The playlist listing follows the next cursor
+def test_all_playlists_follow_next_cursor(fake_api, client) -> None:
+    serve_playlists(fake_api)
+
+    playlists = get_all_playlists(client)
+
+    assert playlists is not None
+    assert [playlist["id"] for playlist in playlists] == [
+        "p.test",
+        "p.empty",
+        "p.broken",
+    ]
+
+
+# Test 2: export-all writes one file per playlist plus a manifest
+def test_export_all_playlists(fake_api, client, tmp_path) -> None:
+    serve_playlists(fake_api)
+    serve_tracks(fake_api, count=150, page_size=100)
+
+    manifest = export_all_playlists(client, str(tmp_path), workers=3)
+
+    assert manifest is not None
+    by_id = {entry["id"]: entry for entry in manifest}
+    assert by_id["p.test"] == {
+        "id": "p.test",
+        "name": "Road Trip",
+        "file": "Road Trip (p.test).json",
+        "tracks": 150,
+        "status": "ok",
+    }
+    assert by_id["p.empty"]["status"] == "ok"
+    assert by_id["p.broken"]["status"] == "failed"
+
+    exported = json.loads((tmp_path / "Road Trip (p.test).json").read_text())
+    assert len(exported) == 150
+    assert json.loads((tmp_path / "manifest.json").read_text()) == manifest
+
+
+# Test 3: Several formats are written from one fetch of the playlist
+def test_export_songs_fans_out_formats(fake_api, client, tmp_path) -> None:
+    serve_tracks(fake_api, count=250, page_size=100)
+
+    count = export_songs(
+        client,
+        "p.test",
+        "json,csv,jsonl",
+        str(tmp_path / "songs.json"),
+        compression="gzip",
+    )
+
+    assert count == 250
+    assert len(fake_api.requests) == 3
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "songs.csv.gz",
+        "songs.json.gz",
+        "songs.jsonl.gz",
+    ]
+    exported = json.loads(gzip.decompress((tmp_path / "songs.json.gz").read_bytes()))
+    assert [song["name"] for song in exported] == [f"Song {i}" for i in range(250)]
+
+
+# Test 4: --fields selects the exported columns and only those attributes are requested
+def test_export_songs_selects_fields(fake_api, client, tmp_path) -> None:
+    serve_tracks(fake_api, count=3, page_size=100)
+
+    count = export_songs(
+        client,
+        "p.test",
+        "json,csv",
+        str(tmp_path / "songs"),
+        fields=parse_fields("artistname,NAME"),
+    )
+
+    assert count == 3
+    query = parse_qs(urlparse(fake_api.requests[0].url).query)
+    assert query["fields[library-songs]"] == ["artistName,name"]
+    exported = json.loads((tmp_path / "songs.json").read_text())
+    assert exported[0] == {"artistName": "Artist", "name": "Song 0"}
+    header = (tmp_path / "songs.csv").read_text().splitlines()[0]
+    assert header == "artistName,name"
+    assert parse_fields("name,isrc") is None
+
+
+# Test 5: Tracks included in the listing are not requested again; only the pages after them are
+def test_export_all_uses_included_tracks(fake_api, client, tmp_path) -> None:
+    serve_tracks(fake_api, count=150, page_size=100)
+    included = {
+        "data": [make_track(i) for i in range(100)],
+        "next": f"{TRACKS_PATH}?offset=100",
+        "meta": {"total": 150},
+    }
+    fake_api.json(
+        PLAYLISTS_PATH,
+        {
+            "data": [
+                {
+                    "id": "p.test",
+                    "attributes": {"name": "Road Trip"},
+                    "relationships": {"tracks": included},
+                }
+            ]
+        },
+    )
+
+    manifest = export_all_playlists(client, str(tmp_path))
+
+    assert manifest is not None
+    assert manifest[0]["tracks"] == 150
+    assert [urlparse(request.url).path for request in fake_api.requests] == [
+        PLAYLISTS_PATH,
+        TRACKS_PATH,
+    ]
+    assert parse_qs(urlparse(fake_api.requests[0].url).query)["include"] == ["tracks"]
+    assert "offset=100" in fake_api.requests[1].url
+    exported = json.loads((tmp_path / "Road Trip (p.test).json").read_text())
+    assert [song["name"] for song in exported] == [f"Song {i}" for i in range(150)]
+
+
+# Test 6: A SQLite export gets the playlist's name with its first page of tracks
+def test_export_sqlite_includes_playlist(fake_api, client, tmp_path) -> None:
+    serve_tracks(fake_api, count=3, page_size=100)
+    fake_api.json(
+        f"{PLAYLISTS_PATH}/p.test",
+        {
+            "data": [
+                {
+                    "id": "p.test",
+                    "attributes": {"name": "Road Trip"},
+                    "relationships": {
+                        "tracks": {"data": [make_track(i) for i in range(3)]}
+                    },
+                }
+            ]
+        },
+    )
+
+    output = tmp_path / "songs.sqlite"
+    assert export_songs(client, "p.test", "sqlite", str(output)) == 3
+    assert len(fake_api.requests) == 1
+    connection = sqlite3.connect(output)
+    try:
+        assert connection.execute("SELECT name FROM playlists").fetchall() == [
+            ("Road Trip",)
+        ]
+    finally:
+        connection.close()
+
+
+# Test 7: A playlist whose file cannot be written fails on its own; export-all still writes the manifest
+def test_export_all_writer_failure(fake_api, client, tmp_path) -> None:
+    serve_playlists(fake_api)
+    serve_tracks(fake_api, count=10, page_size=100)
+    # A directory in place of the output file makes opening it fail.
+    (tmp_path / "Road Trip (p.test).json").mkdir()
+
+    manifest = export_all_playlists(client, str(tmp_path), workers=2)
+
+    assert manifest is not None
+    assert [(entry["id"], entry["status"]) for entry in manifest] == [
+        ("p.test", "failed"),
+        ("p.empty", "ok"),
+        ("p.broken", "failed"),
+    ]
+    assert (tmp_path / "manifest.json").exists()
+
+
+# Test 8: A database error in the shared SQLite export only fails its own playlist
+def test_export_all_sqlite_failure(fake_api, client, tmp_path, monkeypatch) -> None:
+    serve_playlists(fake_api)
+    serve_tracks(fake_api, count=10, page_size=100)
+    write_songs_to_sqlite = cli.export.write_songs_to_sqlite
+
+    def locked(rows, output_file, playlist_id, **kwargs):
+        if playlist_id == "p.test":
+            raise sqlite3.OperationalError("database is locked")
+        return write_songs_to_sqlite(rows, output_file, playlist_id, **kwargs)
+
+    monkeypatch.setattr(cli.export, "write_songs_to_sqlite", locked)
+
+    manifest = export_all_playlists(client, str(tmp_path), "sqlite", workers=2)
+
+    assert manifest is not None
+    assert [(entry["id"], entry["status"]) for entry in manifest] == [
+        ("p.test", "failed"),
+        ("p.empty", "ok"),
+        ("p.broken", "failed"),
+    ]
+    assert (tmp_path / "manifest.json").exists()
@@ -0,0 +1,144 @@
+import csv
+import gzip
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+from cli.file_output import (
+    write_fanout,
+    write_songs_to_csv,
+    write_songs_to_json,
+    write_songs_to_jsonl,
+    zstd_available,
+)
+
+"""
+Streaming Writer Tests
+"""
+SONGS = [
+    {
+        "name": "Born in the U.S.A.",
+        "artistName": "Bruce Springsteen",
+        "genreNames": ["Rock"],
+    },
+    {
+        "name": "Dancing in the Dark",
+        "artistName": "Bruce Springsteen",
+        "genreNames": [],
+    },
+]
+
+
+# Test 1: The streamed JSON array matches json.dumps(indent=2)
+def test_json_stream_matches_dumps(tmp_path: Path) -> None:
+    output = tmp_path / "songs.json"
+
+    assert write_songs_to_json(iter(SONGS), str(output)) == 2
+    assert output.read_text() == json.dumps(SONGS, indent=2, ensure_ascii=False)
+
+
+# Test 2: An empty stream is written as an empty array
+def test_json_stream_empty(tmp_path: Path) -> None:
+    output = tmp_path / "nested" / "songs.json"
+
+    assert write_songs_to_json(iter([]), str(output)) == 0
+    assert json.loads(output.read_text()) == []
+
+
+# Test 3: JSON Lines holds one object per line
+def test_jsonl_stream(tmp_path: Path) -> None:
+    output = tmp_path / "songs.jsonl"
+
+    write_songs_to_jsonl(iter(SONGS), str(output))
+
+    lines = output.read_text().splitlines()
+    assert [json.loads(line) for line in lines] == SONGS
+
+
+# Test 4: A fixed header is written even when there are no rows
+def test_csv_fixed_header(tmp_path: Path) -> None:
+    output = tmp_path / "songs.csv"
+
+    assert write_songs_to_csv(iter([]), str(output), ["name", "artistName"]) == 0
+    assert output.read_text().strip() == "name,artistName"
+
+
+# Test 5: Without a fixed header the first row's keys are used
+def test_csv_header_from_first_row(tmp_path: Path) -> None:
+    output = tmp_path / "songs.csv"
+
+    write_songs_to_csv(iter(SONGS), str(output))
+
+    with output.open(newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert [row["name"] for row in rows] == [song["name"] for song in SONGS]
+
+
+"""
+Compression and Fan-out Tests
+"""
+
+
+# Test 1: .gz outputs are gzip-compressed as they are written
+def test_gzip_output(tmp_path: Path) -> None:
+    output = tmp_path / "songs.json.gz"
+
+    write_songs_to_json(iter(SONGS), str(output))
+
+    assert json.loads(gzip.decompress(output.read_bytes())) == SONGS
+
+
+# Test 2: .zst outputs are zstd-compressed as they are written
+@pytest.mark.skipif(not zstd_available(), reason="zstandard is not installed")
+def test_zstd_output(tmp_path: Path) -> None:
+    import zstandard
+
+    output = tmp_path / "songs.jsonl.zst"
+
+    write_songs_to_jsonl(iter(SONGS), str(output))
+
+    with zstandard.ZstdDecompressor().stream_reader(output.open("rb")) as reader:
+        lines = io.TextIOWrapper(reader, encoding="utf-8").read().splitlines()
+    assert [json.loads(line) for line in lines] == SONGS
+
+
+# Test 3: One pass over the rows feeds every writer
+def test_fanout_writes_every_format(tmp_path: Path) -> None:
+    consumed = []
+
+    def rows():
+        for song in SONGS * 300:
+            consumed.append(song)
+            yield song
+
+    counts = write_fanout(
+        rows(),
+        [
+            lambda songs: write_songs_to_json(songs, str(tmp_path / "songs.json")),
+            lambda songs: write_songs_to_csv(songs, str(tmp_path / "songs.csv.gz")),
+        ],
+    )
+
+    assert counts == [600, 600]
+    assert len(consumed) == 600
+    assert json.loads((tmp_path / "songs.json").read_text()) == SONGS * 300
+    with gzip.open(tmp_path / "songs.csv.gz", "rt", newline="") as file:
+        assert len(list(csv.DictReader(file))) == 600
+
+
+# Test 4: A failing writer does not stall the stream or the other writers
+def test_fanout_writer_error(tmp_path: Path) -> None:
+    def broken(songs):
+        next(iter(songs))
+        raise OSError("disk full")
+
+    output = tmp_path / "songs.jsonl"
+    with pytest.raises(OSError, match="disk full"):
+        write_fanout(
+            iter(SONGS * 2000),
+            [lambda songs: write_songs_to_jsonl(songs, str(output)), broken],
+        )
+
+    assert len(output.read_text().splitlines()) == 4000
@@ -0,0 +1,161 @@
+import sqlite3
+import sys
+from urllib.parse import parse_qs, urlparse
+
+import cli.client
+from cli.client import AppleMusicClient
+from cli.config import Credentials
+from cli.export import export_library
+from cli.main import main
+
+"""
+Library Export Tests
+"""
+PLAYLISTS_PATH = "/v1/me/library/playlists"
+LIBRARY_SONGS_PATH = "/v1/me/library/songs"
+
+
+def make_song(index: int) -> dict:
+    return {
+        "id": f"i.{index}",
+        "attributes": {
+            "name": f"Song {index}",
+            "artistName": "Artist",
+            "genreNames": ["Rock", "Pop"],
+        },
+    }
+
+
+def serve_library(fake_api, songs: int, page_size: int) -> None:
+    def handler(request):
+        offset = int(parse_qs(urlparse(request.url).query).get("offset", ["0"])[0])
+        body: dict = {
+            "data": [
+                make_song(i) for i in range(offset, min(offset + page_size, songs))
+            ],
+            "meta": {"total": songs},
+        }
+        if offset + page_size < songs:
+            body["next"] = f"{LIBRARY_SONGS_PATH}?offset={offset + page_size}"
+        return 200, body, {}
+
+    fake_api.route(LIBRARY_SONGS_PATH, handler)
+
+
+# Test 1: Songs are fetched once and playlists are joined to them by track ID
+def test_export_library_joins_memberships(fake_api, client, tmp_path) -> None:
+    serve_library(fake_api, songs=5, page_size=2)
+    fake_api.json(
+        PLAYLISTS_PATH,
+        {
+            "data": [
+                {
+                    "id": "p.all",
+                    "attributes": {"name": "Everything"},
+                    "relationships": {
+                        "tracks": {
+                            "data": [{"id": f"i.{i}"} for i in (4, 3, 2)],
+                            "next": f"{PLAYLISTS_PATH}/p.all/tracks?offset=3",
+                        }
+                    },
+                },
+                {"id": "p.some", "attributes": {"name": "Some"}},
+            ]
+        },
+    )
+    fake_api.json(
+        f"{PLAYLISTS_PATH}/p.all/tracks",
+        {"data": [{"id": "i.1"}, {"id": "i.0"}, {"id": "i.gone"}]},
+    )
+    fake_api.json(
+        f"{PLAYLISTS_PATH}/p.some/tracks", {"data": [{"id": "i.1"}, {"id": "i.3"}]}
+    )
+    database = str(tmp_path / "library.sqlite")
+
+    summary = export_library(client, database, workers=2)
+
+    assert summary is not None
+    assert summary["songs"] == 5
+    assert summary["missing"] == 1
+    assert [(e["id"], e["tracks"], e["status"]) for e in summary["playlists"]] == [
+        ("p.all", 6, "ok"),
+        ("p.some", 2, "ok"),
+    ]
+    listing = parse_qs(urlparse(fake_api.requests[3].url).query)
+    assert listing["include"] == ["tracks"]
+    assert listing["fields[library-songs]"] == ["name"]
+    assert len(fake_api.requests) == 6
+
+    connection = sqlite3.connect(database)
+    try:
+        assert connection.execute("SELECT count(*) FROM tracks").fetchone() == (5,)
+        assert connection.execute("SELECT count(*) FROM track_genres").fetchone() == (
+            10,
+        )
+        rows = connection.execute(
+            "SELECT p.name, pt.position, t.name FROM playlist_tracks pt "
+            "JOIN playlists p ON p.id = pt.playlist_id JOIN tracks t ON t.id = pt.track_id "
+            "ORDER BY p.name, pt.position"
+        ).fetchall()
+    finally:
+        connection.close()
+    assert rows == [
+        ("Everything", 0, "Song 4"),
+        ("Everything", 1, "Song 3"),
+        ("Everything", 2, "Song 2"),
+        ("Everything", 3, "Song 1"),
+        ("Everything", 4, "Song 0"),
+        ("Some", 0, "Song 1"),
+        ("Some", 1, "Song 3"),
+    ]
+
+
+# Test 2: A failed playlist is reported; a failed library crawl aborts the export
+def test_export_library_failures(fake_api, client, tmp_path) -> None:
+    serve_library(fake_api, songs=2, page_size=2)
+    fake_api.json(PLAYLISTS_PATH, {"data": [{"id": "p.broken"}]})
+    fake_api.json(f"{PLAYLISTS_PATH}/p.broken/tracks", {"errors": []}, status=403)
+    database = str(tmp_path / "library.sqlite")
+
+    summary = export_library(client, database)
+    assert summary is not None
+    assert summary["playlists"][0]["status"] == "failed"
+
+    fake_api.json(LIBRARY_SONGS_PATH, {"errors": []}, status=403)
+    assert export_library(client, database) is None
+
+
+# Test 3: The command writes a SQLite database when only -o is given
+def test_library_export_command(fake_api, tmp_path, monkeypatch) -> None:
+    serve_library(fake_api, songs=3, page_size=2)
+    fake_api.json(PLAYLISTS_PATH, {"data": [{"id": "p.some"}]})
+    fake_api.json(f"{PLAYLISTS_PATH}/p.some/tracks", {"data": [{"id": "i.2"}]})
+
+    class FakeClient(AppleMusicClient):
+        def __init__(self, *args, **kwargs) -> None:
+            super().__init__(*args, **kwargs)
+            self.session.mount("https://", fake_api)
+
+    monkeypatch.setattr(cli.client, "AppleMusicClient", FakeClient)
+    monkeypatch.setattr(
+        "cli.main.load_credentials", lambda: Credentials("team", "key", "key.p8")
+    )
+    monkeypatch.setattr("cli.main.DeveloperTokenCache", lambda *_: "dev-token")
+    monkeypatch.setattr("cli.main.authorise", lambda: "user-token")
+    monkeypatch.setattr("cli.main.PLAYLIST_INDEX_PATH", tmp_path / "playlists.json")
+    database = tmp_path / "backup.sqlite"
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["apple-music-cli", "library-export", "-o", str(database), "--no-cache"],
+    )
+    main()
+
+    connection = sqlite3.connect(database)
+    try:
+        assert connection.execute("SELECT count(*) FROM tracks").fetchone() == (3,)
+        assert connection.execute(
+            "SELECT count(*) FROM playlist_tracks"
+        ).fetchone() == (1,)
+    finally:
+        connection.close()
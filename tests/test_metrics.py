@@ -0,0 +1,92 @@
+import json
+from pathlib import Path
+
+from cli.client import AppleMusicClient
+from cli.export import export_songs
+from cli.metrics import Metrics, endpoint_for
+from cli.ratelimit import RetryPolicy
+
+"""
+Request Instrumentation Tests
+"""
+TRACKS_PATH = "/v1/me/library/playlists/p.test/tracks"
+
+
+def make_client(fake_api, metrics: Metrics) -> AppleMusicClient:
+    client = AppleMusicClient(
+        "dev-token",
+        "user-token",
+        retry_policy=RetryPolicy(max_retries=2, base_delay=0),
+        metrics=metrics,
+    )
+    client.session.mount("https://", fake_api)
+    return client
+
+
+# Test 1: Resource IDs are collapsed so requests group per endpoint
+def test_endpoint_for_collapses_ids() -> None:
+    assert (
+        endpoint_for("https://api.music.apple.com" + TRACKS_PATH + "?offset=100")
+        == "/v1/me/library/playlists/{id}/tracks"
+    )
+    assert (
+        endpoint_for("/v1/catalog/us/songs/1440857781") == "/v1/catalog/us/songs/{id}"
+    )
+
+
+# Test 2: Every attempt is recorded with its status, size and retry number
+def test_client_records_requests_and_retries(fake_api) -> None:
+    responses = iter([(500, {}, {}), (200, {"data": []}, {})])
+    fake_api.route("/v1/me/library/playlists", lambda request: next(responses))
+    metrics = Metrics()
+
+    make_client(fake_api, metrics).get("/v1/me/library/playlists")
+
+    summary = metrics.summary()
+    endpoint = summary["endpoints"]["/v1/me/library/playlists"]
+    assert summary["requests"] == 2
+    assert summary["retries"] == 1
+    assert endpoint["statuses"] == {"500": 1, "200": 1}
+    assert endpoint["pages"] == 1
+    assert endpoint["bytes"] == len(b"{}") + len(b'{"data": []}')
+    assert set(endpoint["latency_ms"]) == {"p50", "p95", "p99"}
+
+
+# Test 3: Exports split time between network, decoding and writing, and produce a Chrome trace
+def test_export_records_write_time_and_trace(fake_api, tmp_path: Path) -> None:
+    fake_api.json(TRACKS_PATH, {"data": [{"attributes": {"name": "One"}}]})
+    metrics = Metrics()
+
+    export_songs(
+        make_client(fake_api, metrics), "p.test", "csv", str(tmp_path / "out.csv")
+    )
+
+    seconds = metrics.summary()["seconds"]
+    assert set(seconds) == {"network", "decode", "write"}
+    assert seconds["write"] > 0
+
+    metrics.write_trace(str(tmp_path / "trace.json"))
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert {event["cat"] for event in events if event["ph"] == "X"} == {
+        "network",
+        "decode",
+        "write",
+    }
+
+
+# Test 4: Write time excludes the time spent waiting for rows
+def test_measure_consumer_excludes_waiting() -> None:
+    ticks = iter(range(100))
+    metrics = Metrics(clock=lambda: float(next(ticks)))
+
+    def slow_rows():
+        next(ticks)  # fetching each row takes one extra tick
+        yield 1
+        next(ticks)
+        yield 2
+
+    assert metrics.measure_consumer("write", "out", sum, slow_rows()) == 3
+
+    (span,) = metrics.spans
+    assert span.duration == 9
+    assert span.busy == 4  # 5 of the 9 ticks were spent inside next()
@@ -0,0 +1,93 @@
+import time
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from cli.export import resolve_playlist_name
+from cli.playlist_index import AmbiguousPlaylistName, PlaylistIndex, is_playlist_id
+
+"""
+Playlist Index Tests
+"""
+PLAYLISTS_PATH = "/v1/me/library/playlists"
+LIBRARY = [
+    {"id": "p.road", "name": "Road Trip"},
+    {"id": "p.roadx", "name": "road trip"},
+    {"id": "p.rock", "name": "Rock Classics"},
+    {"id": "p.rockx", "name": "Rock  Anthems"},
+    {"id": "p.jazz", "name": "Late Night Jazz"},
+]
+
+
+def serve_playlists(fake_api, page_size: int = 2) -> None:
+    def handler(request):
+        offset = int(parse_qs(urlparse(request.url).query).get("offset", ["0"])[0])
+        body: dict = {
+            "data": [
+                {"id": p["id"], "attributes": {"name": p["name"]}}
+                for p in LIBRARY[offset : offset + page_size]
+            ]
+        }
+        if offset + page_size < len(LIBRARY):
+            body["next"] = f"{PLAYLISTS_PATH}?offset={offset + page_size}"
+        return 200, body, {}
+
+    fake_api.route(PLAYLISTS_PATH, handler)
+
+
+# Test 1: Exact names win over case-insensitive ones, which win over prefixes
+def test_index_lookup_precedence(tmp_path: Path) -> None:
+    index = PlaylistIndex(tmp_path / "playlists.json")
+    index.update(LIBRARY, complete=True)
+
+    assert index.resolve("Road Trip") == "p.road"
+    assert index.resolve("road trip") == "p.roadx"
+    assert index.resolve("late night JAZZ") == "p.jazz"
+    assert index.resolve("rock anthems") == "p.rockx"
+    assert index.resolve("Late") == "p.jazz"
+    assert index.resolve("Metal") is None
+    with pytest.raises(AmbiguousPlaylistName) as excinfo:
+        index.resolve("ROAD TRIP")
+    assert [m["id"] for m in excinfo.value.matches] == ["p.road", "p.roadx"]
+    with pytest.raises(AmbiguousPlaylistName):
+        index.resolve("rock")
+    assert is_playlist_id("p.b16GBvbHoRkkKo4")
+    assert not is_playlist_id("Road Trip")
+
+
+# Test 2: The index persists, partial updates merge and complete listings prune and restart the window
+def test_index_persists_and_expires(tmp_path: Path) -> None:
+    path = tmp_path / "playlists.json"
+    PlaylistIndex(path).update(LIBRARY, complete=True)
+
+    index = PlaylistIndex(path, ttl=60)
+    assert not index.is_stale()
+    assert index.resolve("Late Night Jazz") == "p.jazz"
+
+    index.update([{"id": "p.new", "name": "Brand New"}])
+    index.update([{"id": "p.jazz", "name": "Late Night Jazz"}], complete=True)
+    reloaded = PlaylistIndex(path, ttl=60)
+    assert reloaded.names == {"p.jazz": "Late Night Jazz"}
+
+    reloaded.refreshed_at = time.time() - 61
+    assert reloaded.is_stale()
+
+
+# Test 3: A fresh index resolves names without requests; misses list the library page by page
+def test_resolve_playlist_name(fake_api, client, tmp_path: Path) -> None:
+    serve_playlists(fake_api)
+    index = PlaylistIndex(tmp_path / "playlists.json")
+
+    # Empty (stale) index: the listing stops at the page holding the name.
+    assert resolve_playlist_name(client, index, "rock classics") == "p.rock"
+    assert len(fake_api.requests) == 2
+    assert index.is_stale()
+
+    # Unknown name: the whole library is listed and the index becomes fresh.
+    assert resolve_playlist_name(client, index, "Late") == "p.jazz"
+    assert len(fake_api.requests) == 5
+    assert not index.is_stale()
+
+    assert resolve_playlist_name(client, index, "Road Trip") == "p.road"
+    assert len(fake_api.requests) == 5
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from cli.ratelimit import RateLimiter, RetryPolicy, parse_retry_after
+
+"""
+Rate Limiter Tests
+"""
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+# Test 1: Requests within the burst are not delayed
+def test_burst_is_not_delayed() -> None:
+    clock = FakeClock()
+    limiter = RateLimiter(rate=10, burst=5, clock=clock, sleep=clock.sleep)
+
+    for _ in range(5):
+        limiter.acquire()
+
+    assert clock.now == 0.0
+
+
+# Test 2: Requests beyond the burst are spaced at the refill rate
+def test_requests_are_spaced_at_rate() -> None:
+    clock = FakeClock()
+    limiter = RateLimiter(rate=10, burst=1, clock=clock, sleep=clock.sleep)
+
+    for _ in range(11):
+        limiter.acquire()
+
+    assert abs(clock.now - 1.0) < 1e-9
+
+
+# Test 3: A 429 halves the rate and pauses the bucket; successes recover it
+def test_throttle_and_recover() -> None:
+    clock = FakeClock()
+    limiter = RateLimiter(rate=10, burst=1, recovery=5, clock=clock, sleep=clock.sleep)
+
+    limiter.throttle(2.0)
+    assert limiter.rate == 5
+    assert limiter.reserve() >= 2.0
+
+    limiter.succeed()
+    limiter.succeed()
+    assert limiter.rate == 10
+
+
+# Test 4: The rate never drops below min_rate
+def test_throttle_respects_min_rate() -> None:
+    limiter = RateLimiter(rate=4, min_rate=1)
+
+    for _ in range(10):
+        limiter.throttle(0)
+
+    assert limiter.rate == 1
+
+
+# Test 5: Limiters sharing a parent are held to the parent's rate as well as their own, and pass 429s on to it
+def test_parent_budget() -> None:
+    clock = FakeClock()
+    shared = RateLimiter(rate=10, burst=1, clock=clock, sleep=clock.sleep)
+    first = RateLimiter(rate=100, clock=clock, sleep=clock.sleep, parent=shared)
+    second = RateLimiter(rate=100, clock=clock, sleep=clock.sleep, parent=shared)
+
+    for _ in range(5):
+        first.acquire()
+        second.acquire()
+    assert abs(clock.now - 0.9) < 1e-9
+
+    slow = RateLimiter(rate=1, burst=1, clock=clock, sleep=clock.sleep, parent=shared)
+    assert slow.reserve() < 1.0
+    assert slow.reserve() >= 1.0
+
+    first.throttle(2.0)
+    assert first.rate == 50
+    assert shared.rate == 5
+    assert second.reserve() >= 2.0
+
+
+"""
+Retry Tests
+"""
+
+
+# Test 6: Backoff delays are jittered and capped
+def test_retry_policy_delay_is_capped() -> None:
+    policy = RetryPolicy(base_delay=1, max_delay=4)
+
+    for attempt in range(10):
+        assert 0 <= policy.delay(attempt) <= min(4, 2**attempt)
+
+
+# Test 7: Retry-After accepts delay-seconds and HTTP dates
+def test_parse_retry_after() -> None:
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+
+    assert parse_retry_after("5") == 5.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert 25 < (parse_retry_after(format_datetime(retry_at, usegmt=True)) or 0) <= 30
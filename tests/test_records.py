@@ -0,0 +1,76 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from cli.decoding import parse_songs
+from cli.export import SONG_FIELDS
+from cli.file_output import write_songs_to_csv, write_songs_to_json
+from cli.records import Playlist, Track, select
+
+"""
+Record Tests
+"""
+ATTRIBUTES = {
+    "name": "Born in the U.S.A.",
+    "artistName": "Bruce Springsteen",
+    "albumName": "Born in the U.S.A.",
+    "genreNames": ["Rock", "Music"],
+    "releaseDate": "1984-06-04",
+}
+
+
+# Test 1: Tracks read like the song dictionaries they replace
+def test_track_matches_song_dict() -> None:
+    track = Track.from_attributes(ATTRIBUTES)
+
+    assert track == ATTRIBUTES
+    assert track["genreNames"] == ["Rock", "Music"]
+    assert list(track) == list(SONG_FIELDS)
+    assert track.as_dict() == ATTRIBUTES
+    assert not hasattr(track, "__dict__")
+    with pytest.raises(KeyError):
+        track["durationInMillis"]
+
+
+# Test 2: Repeated artist, album and genre values are stored once
+def test_track_strings_are_interned() -> None:
+    # Decode separately so each page holds its own copies of the strings, as API pages do.
+    pages = [json.loads(json.dumps([{"attributes": ATTRIBUTES}])) for _ in range(2)]
+
+    first, second = (parse_songs(page)[0] for page in pages)
+
+    assert first.artist_name is second.artist_name
+    assert first.album_name is second.album_name
+    assert first.genre_names is second.genre_names
+
+
+# Test 3: Writers produce the same files from records as from dictionaries
+def test_writers_accept_records(tmp_path: Path) -> None:
+    tracks = [Track.from_attributes(ATTRIBUTES), Track("Untitled")]
+    dicts = [track.as_dict() for track in tracks]
+
+    for writer, suffix in ((write_songs_to_json, "json"), (write_songs_to_csv, "csv")):
+        writer(iter(tracks), str(tmp_path / f"records.{suffix}"))
+        writer(iter(dicts), str(tmp_path / f"dicts.{suffix}"))
+        assert (tmp_path / f"records.{suffix}").read_bytes() == (
+            tmp_path / f"dicts.{suffix}"
+        ).read_bytes()
+
+
+# Test 4: Playlists expose name, id and dateAdded
+def test_playlist_record() -> None:
+    playlist = Playlist("Road Trip", "p.test", "04-06-1984")
+
+    assert playlist == {"name": "Road Trip", "id": "p.test", "dateAdded": "04-06-1984"}
+    assert playlist.get("lastModified") is None
+
+
+# Test 5: Missing keys select as None from records and dictionaries alike; CSV rows keep ""
+def test_select_missing_keys() -> None:
+    keys = ["name", "isrc"]
+    track = Track.from_attributes(ATTRIBUTES)
+
+    assert select(track, keys) == select(ATTRIBUTES, keys)
+    assert select(track, keys) == {"name": "Born in the U.S.A.", "isrc": None}
+    assert track.row(keys) == ["Born in the U.S.A.", ""]
@@ -0,0 +1,76 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from cli.file_output import write_songs_to_sqlite
+from cli.search import SearchDatabaseError, search_tracks
+
+"""
+SQLite Export and Search Tests
+"""
+
+
+def song(name: str, artist: str, album: str, genres: list) -> dict:
+    return {
+        "name": name,
+        "artistName": artist,
+        "albumName": album,
+        "genreNames": genres,
+        "releaseDate": "1984-06-04",
+    }
+
+
+BORN = song("Born in the U.S.A.", "Bruce Springsteen", "Born in the U.S.A.", ["Rock"])
+DANCING = song("Dancing Queen", "ABBA", "Arrival", ["Pop", "Disco"])
+
+
+@pytest.fixture
+def export_db(tmp_path: Path) -> str:
+    db_path = str(tmp_path / "library.sqlite")
+    write_songs_to_sqlite(iter([BORN, DANCING]), db_path, "p.road", "Road Trip")
+    write_songs_to_sqlite(iter([BORN]), db_path, "p.boss", "The Boss")
+    return db_path
+
+
+# Test 1: Tracks shared between playlists are stored once
+def test_sqlite_tracks_are_normalised(export_db: str) -> None:
+    connection = sqlite3.connect(export_db)
+
+    assert connection.execute("SELECT count(*) FROM tracks").fetchone() == (2,)
+    assert connection.execute("SELECT count(*) FROM playlist_tracks").fetchone() == (3,)
+    assert connection.execute(
+        "SELECT genre FROM track_genres ORDER BY genre"
+    ).fetchall() == [("Disco",), ("Pop",), ("Rock",)]
+
+
+# Test 2: Re-exporting a playlist replaces its membership
+def test_sqlite_reexport_replaces_membership(export_db: str) -> None:
+    write_songs_to_sqlite(iter([DANCING]), export_db, "p.road", "Road Trip")
+
+    connection = sqlite3.connect(export_db)
+    rows = connection.execute(
+        "SELECT position FROM playlist_tracks WHERE playlist_id = 'p.road'"
+    ).fetchall()
+    assert rows == [(0,)]
+
+
+# Test 3: Search matches word prefixes and lists the containing playlists
+def test_search_by_artist_prefix(export_db: str) -> None:
+    results = search_tracks(export_db, "springst")
+
+    assert len(results) == 1
+    assert results[0]["name"] == "Born in the U.S.A."
+    assert sorted(results[0]["playlists"]) == ["Road Trip", "The Boss"]
+
+
+# Test 4: FTS syntax in the query is treated as plain text
+def test_search_quotes_query(export_db: str) -> None:
+    assert search_tracks(export_db, 'queen" OR') == []
+    assert search_tracks(export_db, "dancing queen")[0]["artistName"] == "ABBA"
+
+
+# Test 5: Missing databases raise SearchDatabaseError
+def test_search_missing_database(tmp_path: Path) -> None:
+    with pytest.raises(SearchDatabaseError):
+        search_tracks(str(tmp_path / "missing.sqlite"), "abba")
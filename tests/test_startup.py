@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+
+"""
+Startup Budget Tests
+"""
+# Modules that only the commands talking to the API (or the auth server) may import.
+HEAVY_MODULES = (
+    "asyncio",
+    "cryptography",
+    "dotenv",
+    "fastapi",
+    "httpx",
+    "jwt",
+    "requests",
+    "urllib3",
+    "uvicorn",
+)
+# Cumulative `python -X importtime` budget for importing cli.main, in microseconds.
+STARTUP_BUDGET_US = 150_000
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    env = {k: v for k, v in os.environ.items() if not k.startswith("APPLE_MUSIC_")}
+    return subprocess.run(
+        [sys.executable, *args], capture_output=True, text=True, env=env, check=True
+    )
+
+
+# Test 1: Importing the CLI does not pull in the HTTP, JWT or server stacks
+def test_cli_import_is_lazy() -> None:
+    result = run_python(
+        "-c",
+        "import sys, cli.main; print(' '.join(sys.modules))",
+    )
+
+    loaded = set(result.stdout.split())
+    assert [module for module in HEAVY_MODULES if module in loaded] == []
+
+
+# Test 2: Importing the CLI stays within the startup budget
+def test_cli_import_time_budget() -> None:
+    timings = []
+    for _ in range(3):
+        result = run_python("-X", "importtime", "-c", "import cli.main")
+        line = next(
+            line for line in result.stderr.splitlines() if line.endswith("| cli.main")
+        )
+        timings.append(int(line.split("|")[1]))
+
+    assert min(timings) < STARTUP_BUDGET_US
+
+
+# Test 3: --help works without credentials
+def test_help_without_credentials() -> None:
+    result = run_python("-m", "cli.main", "--help")
+
+    assert "usage: apple-music-cli" in result.stdout
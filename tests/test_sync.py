@@ -0,0 +1,99 @@
+import json
+from pathlib import Path
+from urllib.parse import urlparse
+
+from cli.client import AppleMusicClient
+from cli.export import sync_playlists
+from cli.state import SyncState
+
+"""
+Incremental Sync Tests
+"""
+PLAYLISTS_PATH = "/v1/me/library/playlists"
+
+
+class FakeLibrary:
+    def __init__(self, fake_api) -> None:
+        self.playlists: dict = {}
+        fake_api.route(PLAYLISTS_PATH, self._listing)
+        self.fake_api = fake_api
+
+    def set(self, pid: str, modified: str, songs: list) -> None:
+        self.playlists[pid] = (modified, songs)
+        tracks = [{"attributes": {"name": name}} for name in songs]
+        self.fake_api.json(f"{PLAYLISTS_PATH}/{pid}/tracks", {"data": tracks})
+
+    def _listing(self, request):
+        data = [
+            {"id": pid, "attributes": {"name": pid, "lastModifiedDate": modified}}
+            for pid, (modified, _) in self.playlists.items()
+        ]
+        return 200, {"data": data}, {}
+
+    def track_requests(self) -> int:
+        return sum(
+            1
+            for r in self.fake_api.requests
+            if urlparse(r.url).path.endswith("/tracks")
+        )
+
+
+def run_sync(fake_api, tmp_path: Path) -> dict:
+    client = AppleMusicClient("dev-token", "user-token")
+    client.session.mount("https://", fake_api)
+    with SyncState(tmp_path / "sync.db") as state:
+        summary = sync_playlists(client, state, str(tmp_path / "diffs"))
+    assert summary is not None
+    return {entry["id"]: entry for entry in summary}
+
+
+# Test 1: The first sync records every playlist as new
+def test_first_sync_records_playlists(fake_api, tmp_path: Path) -> None:
+    library = FakeLibrary(fake_api)
+    library.set("p.a", "2026-01-01", ["One", "Two"])
+
+    summary = run_sync(fake_api, tmp_path)
+
+    assert summary["p.a"]["status"] == "new"
+    assert summary["p.a"]["added"] == 2
+
+
+# Test 2: Playlists with an unchanged lastModifiedDate are not re-fetched
+def test_unchanged_playlists_are_skipped(fake_api, tmp_path: Path) -> None:
+    library = FakeLibrary(fake_api)
+    library.set("p.a", "2026-01-01", ["One", "Two"])
+    run_sync(fake_api, tmp_path)
+
+    summary = run_sync(fake_api, tmp_path)
+
+    assert summary["p.a"]["status"] == "unchanged"
+    assert library.track_requests() == 1
+
+
+# Test 3: Changed playlists are diffed against the previous sync
+def test_changed_playlists_write_diff(fake_api, tmp_path: Path) -> None:
+    library = FakeLibrary(fake_api)
+    library.set("p.a", "2026-01-01", ["One", "Two", "Two"])
+    run_sync(fake_api, tmp_path)
+
+    library.set("p.a", "2026-02-01", ["Two", "Three"])
+    summary = run_sync(fake_api, tmp_path)
+
+    assert summary["p.a"]["status"] == "changed"
+    diff = json.loads((tmp_path / "diffs" / summary["p.a"]["file"]).read_text())
+    assert [song["name"] for song in diff["added"]] == ["Three"]
+    assert [song["name"] for song in diff["removed"]] == ["One", "Two"]
+
+
+# Test 4: Playlists removed from the library are dropped from the state
+def test_deleted_playlists(fake_api, tmp_path: Path) -> None:
+    library = FakeLibrary(fake_api)
+    library.set("p.a", "2026-01-01", ["One"])
+    run_sync(fake_api, tmp_path)
+
+    del library.playlists["p.a"]
+    summary = run_sync(fake_api, tmp_path)
+
+    assert summary["p.a"]["status"] == "deleted"
+    with SyncState(tmp_path / "sync.db") as state:
+        assert state.playlist("p.a") is None